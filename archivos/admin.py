@@ -2,10 +2,23 @@ from django.contrib import admin
 
 # Register your models here.
 
-from .models import Archivo
+from .models import Archivo, TrabajoImportacion, ErrorImportacion
 
 @admin.register(Archivo)
 class ArchivoAdmin(admin.ModelAdmin):
     list_display = ('id_archivo', 'nombre_archivo', 'fecha_carga', 'estado_validacion', 'ruta', 'id_usuario', 'id_estado')
     search_fields = ('nombre_archivo', 'estado_validacion')
-    list_filter = ('estado_validacion', 'fecha_carga')
\ No newline at end of file
+    list_filter = ('estado_validacion', 'fecha_carga')
+
+@admin.register(TrabajoImportacion)
+class TrabajoImportacionAdmin(admin.ModelAdmin):
+    list_display = ('id_trabajo', 'id_archivo', 'tipo', 'estado', 'filas_procesadas', 'registros_validos', 'registros_invalidos', 'worker', 'fecha_creacion', 'fecha_fin')
+    search_fields = ('id_archivo__nombre_archivo',)
+    list_filter = ('estado', 'tipo')
+
+@admin.register(ErrorImportacion)
+class ErrorImportacionAdmin(admin.ModelAdmin):
+    list_display = ('id_error', 'id_archivo', 'fila', 'columna', 'codigo', 'mensaje')
+    list_filter = ('codigo',)
+    raw_id_fields = ('id_archivo',)
+    # (Sin 'search_fields' sobre el mensaje: la tabla puede tener millones de filas)
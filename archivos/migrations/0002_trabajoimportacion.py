@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:41
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archivos', '0001_initial'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoImportacion',
+            fields=[
+                ('id_trabajo', models.AutoField(primary_key=True, serialize=False)),
+                ('tipo', models.CharField(choices=[('factores', 'Carga Masiva (Factores)'), ('montos', 'Carga Masiva (Montos)')], max_length=10)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('Procesando', 'Procesando'), ('Completado', 'Completado'), ('Error', 'Error')], default='Pendiente', max_length=10)),
+                ('filas_procesadas', models.IntegerField(default=0)),
+                ('registros_validos', models.IntegerField(default=0)),
+                ('registros_invalidos', models.IntegerField(default=0)),
+                ('mensaje', models.TextField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=100, null=True)),
+                ('fecha_creacion', models.DateTimeField(blank=True, null=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('id_archivo', models.ForeignKey(db_column='id_archivo', on_delete=django.db.models.deletion.DO_NOTHING, to='archivos.archivo')),
+                ('id_usuario', models.ForeignKey(blank=True, db_column='id_usuario', null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='usuarios.usuario')),
+            ],
+            options={
+                'db_table': 'trabajo_importacion',
+                'indexes': [models.Index(fields=['estado', 'id_trabajo'], name='trabajo_imp_estado_idx')],
+            },
+        ),
+    ]
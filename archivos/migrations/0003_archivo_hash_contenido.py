@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    'archivo' no la administra Django (managed=False): la columna y su
+    índice se crean con SQL y el estado del modelo se actualiza aparte.
+    """
+
+    dependencies = [
+        ('archivos', '0002_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                'ALTER TABLE archivo ADD COLUMN hash_contenido CHAR(64) NULL',
+                'CREATE INDEX archivo_hash_contenido_idx ON archivo (hash_contenido)',
+            ],
+            reverse_sql=[
+                'DROP INDEX archivo_hash_contenido_idx ON archivo',
+                'ALTER TABLE archivo DROP COLUMN hash_contenido',
+            ],
+            state_operations=[
+                migrations.AddField(
+                    model_name='archivo',
+                    name='hash_contenido',
+                    field=models.CharField(blank=True, db_index=True, max_length=64, null=True),
+                ),
+            ],
+        ),
+    ]
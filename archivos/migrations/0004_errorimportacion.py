@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('archivos', '0003_archivo_hash_contenido'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ErrorImportacion',
+            fields=[
+                ('id_error', models.AutoField(primary_key=True, serialize=False)),
+                ('fila', models.IntegerField()),
+                ('columna', models.CharField(blank=True, max_length=100, null=True)),
+                ('codigo', models.CharField(choices=[('cabeceras', 'Cabeceras faltantes'), ('fecha', 'Fecha inválida'), ('decimal', 'Número inválido'), ('campo_requerido', 'Campo requerido'), ('suma_factores', 'Suma de factores > 1'), ('bbdd', 'Error al guardar'), ('fila_invalida', 'Fila inválida')], max_length=30)),
+                ('mensaje', models.TextField()),
+                ('id_archivo', models.ForeignKey(db_column='id_archivo', on_delete=django.db.models.deletion.DO_NOTHING, to='archivos.archivo')),
+            ],
+            options={
+                'db_table': 'error_importacion',
+                'indexes': [models.Index(fields=['id_archivo', 'fila', 'id_error'], name='error_imp_archivo_fila_idx')],
+            },
+        ),
+    ]
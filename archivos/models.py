@@ -16,10 +16,106 @@ class Archivo(models.Model):
     ruta = models.CharField(max_length=255, blank=True, null=True)
     id_usuario = models.ForeignKey('usuarios.Usuario', models.DO_NOTHING, db_column='id_usuario', blank=True, null=True)
     id_estado = models.ForeignKey('usuarios.Estado', models.DO_NOTHING, db_column='id_estado')
+    # SHA-256 del contenido: un reintento del mismo archivo no se vuelve a procesar
+    # (columna agregada con la migración 0003, la tabla no la administra Django)
+    hash_contenido = models.CharField(max_length=64, blank=True, null=True, db_index=True)
 
     class Meta:
         managed = False
         db_table = 'archivo'
 
     def __str__(self):
-        return self.nombre_archivo
\ No newline at end of file
+        return self.nombre_archivo
+
+# ==========================================================
+#  TRABAJOS DE IMPORTACIÓN EN SEGUNDO PLANO (ImportJob)
+# ==========================================================
+class TrabajoImportacion(models.Model):
+    """
+    Cola (en BBDD) de cargas masivas que procesa el comando
+    'manage.py procesar_importaciones' fuera de la petición HTTP.
+    Esta tabla SÍ la administra Django (managed=True).
+    """
+    ESTADO_PENDIENTE = 'Pendiente'
+    ESTADO_PROCESANDO = 'Procesando'
+    ESTADO_COMPLETADO = 'Completado'
+    ESTADO_ERROR = 'Error'
+    ESTADO_CHOICES = (
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    )
+
+    TIPO_FACTORES = 'factores'
+    TIPO_MONTOS = 'montos'
+    TIPO_CHOICES = (
+        (TIPO_FACTORES, 'Carga Masiva (Factores)'),
+        (TIPO_MONTOS, 'Carga Masiva (Montos)'),
+    )
+
+    id_trabajo = models.AutoField(primary_key=True)
+    id_archivo = models.ForeignKey(Archivo, models.DO_NOTHING, db_column='id_archivo')
+    id_usuario = models.ForeignKey('usuarios.Usuario', models.DO_NOTHING, db_column='id_usuario', blank=True, null=True)
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+
+    # --- Contadores de avance ---
+    filas_procesadas = models.IntegerField(default=0)
+    registros_validos = models.IntegerField(default=0)
+    registros_invalidos = models.IntegerField(default=0)
+    mensaje = models.TextField(blank=True, null=True)
+
+    worker = models.CharField(max_length=100, blank=True, null=True) # Quién lo tomó (host:pid)
+    fecha_creacion = models.DateTimeField(blank=True, null=True)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    # Último aviso de vida del worker (al reclamarlo y en cada avance): si queda
+    # viejo, el worker murió y el trabajo se vuelve a encolar (ver 'calificaciones/trabajos.py')
+    fecha_latido = models.DateTimeField(blank=True, null=True)
+    intentos = models.IntegerField(default=0) # Veces que un worker lo reclamó
+
+    class Meta:
+        db_table = 'trabajo_importacion'
+        indexes = [
+            # Los workers buscan el Pendiente más antiguo
+            models.Index(fields=['estado', 'id_trabajo'], name='trabajo_imp_estado_idx'),
+        ]
+
+    def __str__(self):
+        return f"Trabajo {self.id_trabajo} ({self.tipo}) - {self.estado}"
+
+
+# ==========================================================
+#  ERRORES FILA A FILA DE UNA IMPORTACIÓN
+# ==========================================================
+class ErrorImportacion(models.Model):
+    """
+    Un error de una fila del CSV (línea, columna, código y mensaje).
+    Reemplaza la lista de errores que antes se concatenaba en 'Log.detalle':
+    el Log de la importación queda solo con el resumen.
+    Esta tabla SÍ la administra Django (managed=True).
+    """
+    CODIGO_CHOICES = (
+        ('cabeceras', 'Cabeceras faltantes'),
+        ('fecha', 'Fecha inválida'),
+        ('decimal', 'Número inválido'),
+        ('campo_requerido', 'Campo requerido'),
+        ('suma_factores', 'Suma de factores > 1'),
+        ('bbdd', 'Error al guardar'),
+        ('fila_invalida', 'Fila inválida'),
+    )
+
+    id_error = models.AutoField(primary_key=True)
+    id_archivo = models.ForeignKey(Archivo, models.DO_NOTHING, db_column='id_archivo')
+    fila = models.IntegerField() # Número de línea en el CSV (la cabecera es la 1)
+    columna = models.CharField(max_length=100, blank=True, null=True)
+    codigo = models.CharField(max_length=30, choices=CODIGO_CHOICES)
+    mensaje = models.TextField()
+
+    class Meta:
+        db_table = 'error_importacion'
+        indexes = [
+            # Los errores se recorren por Archivo, en el orden del CSV
+            models.Index(fields=['id_archivo', 'fila', 'id_error'], name='error_imp_archivo_fila_idx'),
+        ]
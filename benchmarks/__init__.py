@@ -0,0 +1,58 @@
+"""
+Benchmarks de la Carga Masiva (y de la Exportación y la API).
+
+Se ejecutan contra la BBDD configurada en el .env (usar una BBDD local,
+NUNCA la de producción), por ejemplo:
+
+    python -m benchmarks.tamano_lote --filas 20000 --tamanos 1,100,1000,5000
+    python -m benchmarks.carga_masiva --filas 100000 --salida resultados.json
+    python -m benchmarks.exportacion --anio 2025
+    python -m benchmarks.serializacion --filas 5000
+
+Los CSV sintéticos salen de 'benchmarks.generador'.
+"""
+import os
+
+
+def configurar_django():
+    """Inicializa Django para poder usar los modelos desde un script."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mantenedor_nuam.settings')
+    import django
+    django.setup()
+
+
+def borrar_carga(archivo):
+    """Elimina todo lo insertado por una corrida del benchmark."""
+    from calificaciones.models import Calificacion, Calificaciontributaria, Factortributario, CalificacionPivote
+    from archivos.models import ErrorImportacion, TrabajoImportacion
+    from auditoria.models import Log
+
+    ids = Calificacion.objects_all.filter(id_archivo=archivo).values('id_calificacion')
+    Log.objects.filter(id_calificacion__in=ids).delete()
+    CalificacionPivote.objects.filter(id_calificacion__in=ids).delete()
+    Factortributario.objects.filter(id_calificacion_tributaria__id_calificacion__in=ids).delete()
+    Calificaciontributaria.objects.filter(id_calificacion__in=ids).delete()
+    Calificacion.objects_all.filter(id_archivo=archivo).delete()
+    ErrorImportacion.objects.filter(id_archivo=archivo).delete()
+    TrabajoImportacion.objects.filter(id_archivo=archivo).delete()
+    # Log IMPORT con el resumen (no apunta a una calificación: se busca por el nombre)
+    Log.objects.filter(
+        accion='IMPORT', id_calificacion=None, id_usuario=archivo.id_usuario_id,
+        detalle__contains=archivo.nombre_archivo
+    ).delete()
+    archivo.delete()
+
+
+def borrar_catalogos(prefijo):
+    """
+    Elimina los Instrumentos y Mercados sintéticos ('<prefijo>-INST-n',
+    '<prefijo>-MERC-n') que ya no usa ninguna calificación.
+    """
+    from calificaciones.models import Calificacion
+    from instrumentos.models import Instrumento, Mercado
+
+    # (Sin los NULL: un 'NOT IN' con un NULL no excluye nada... ni borra nada)
+    en_uso = Calificacion.objects_all.filter(id_instrumento__isnull=False).values('id_instrumento')
+    Instrumento.objects.filter(nombre__startswith=f'{prefijo}-INST-').exclude(pk__in=en_uso).delete()
+    en_uso = Calificacion.objects_all.filter(id_mercado__isnull=False).values('id_mercado')
+    Mercado.objects.filter(nombre__startswith=f'{prefijo}-MERC-').exclude(pk__in=en_uso).delete()
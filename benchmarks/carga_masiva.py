@@ -0,0 +1,183 @@
+"""
+Rendimiento de punta a punta de las dos Cargas Masivas: sube un CSV
+sintético a 'calificacion_carga_masiva_view' y 'calificacion_carga_montos_view'
+con el cliente de pruebas de Django (formulario, lectura, validación,
+escritura y Log incluidos), contra la BBDD local.
+
+    python -m benchmarks.carga_masiva --filas 100000 --tasa-error 0.01 --salida resultados.json
+
+Por cada tipo informa filas/segundo, consultas SQL por fila y el pico de
+memoria (RSS) del proceso. Cada tipo se mide en un proceso nuevo, para que
+el pico de uno no se arrastre al siguiente. El JSON incluye el commit
+actual, para comparar corridas entre commits.
+
+La carga se procesa en la misma petición (IMPORTACION_EN_SEGUNDO_PLANO=False)
+y al final se borra todo lo que insertó.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+from . import configurar_django, borrar_carga, borrar_catalogos
+from .generador import escribir_csv
+
+VISTAS = {
+    'factores': 'calificaciones:carga_masiva',
+    'montos': 'calificaciones:carga_masiva_montos',
+}
+
+
+def _rss_max_mb():
+    # (En Linux 'ru_maxrss' viene en KB; en macOS, en bytes)
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ContadorConsultas:
+    """
+    Cuenta las consultas SQL (con 'execute_wrapper'). No las guarda como
+    'CaptureQueriesContext': el SQL de un bulk_create de 1000 filas pesa
+    y alteraría el pico de memoria que se quiere medir.
+    """
+
+    def __init__(self):
+        self.consultas = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.consultas += 1
+        return execute(sql, params, many, context)
+
+
+def medir_vista(tipo, filas, opciones, correo):
+    """
+    Genera el CSV, lo sube a la vista del 'tipo' y devuelve las métricas.
+    (Se ejecuta en un proceso aparte: ver 'main')
+    """
+    configurar_django()
+    from django.db import connection
+    from django.test import Client, override_settings
+    from django.urls import reverse
+    from archivos.models import Archivo, ErrorImportacion
+    from calificaciones.models import Calificacion
+    from usuarios.models import Usuario
+
+    usuario = Usuario.objects.select_related('id_rol').get(correo=correo)
+    nombre_archivo = f"benchmark_{tipo}_{opciones['semilla']}.csv"
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, nombre_archivo)
+        with open(ruta, 'w', encoding='utf-8', newline='') as destino:
+            escribir_csv(tipo, destino, filas, **opciones)
+        tamano_mb = round(os.path.getsize(ruta) / (1024 * 1024), 1)
+
+        with override_settings(IMPORTACION_EN_SEGUNDO_PLANO=False, ALLOWED_HOSTS=['testserver']):
+            # Sesión como la que deja el login (ver 'usuarios.views')
+            cliente = Client()
+            sesion = cliente.session
+            sesion['id_usuario'] = usuario.id_usuario
+            sesion['nombre_usuario'] = usuario.nombre
+            sesion['rol_id'] = usuario.id_rol_id
+            sesion['rol_nombre'] = usuario.id_rol.nombre if usuario.id_rol else 'Desconocido'
+            sesion.save()
+
+            rss_inicial_mb = _rss_max_mb()
+            contador = ContadorConsultas()
+            with open(ruta, 'rb') as archivo_csv, connection.execute_wrapper(contador):
+                inicio = time.perf_counter()
+                respuesta = cliente.post(reverse(VISTAS[tipo]), {'archivo_csv': archivo_csv})
+                segundos = time.perf_counter() - inicio
+            rss_max_mb = _rss_max_mb()
+
+    archivo = Archivo.objects.filter(id_usuario=usuario, nombre_archivo=nombre_archivo).order_by('-id_archivo').first()
+    resultado = {
+        'tipo': tipo,
+        'filas': filas,
+        'tamano_archivo_mb': tamano_mb,
+        'status_code': respuesta.status_code,
+        'estado_archivo': archivo.estado_validacion if archivo else None,
+        'calificaciones_guardadas': Calificacion.objects_all.filter(id_archivo=archivo).count() if archivo else 0,
+        'errores_por_fila': ErrorImportacion.objects.filter(id_archivo=archivo).count() if archivo else 0,
+        'segundos': round(segundos, 3),
+        'filas_por_segundo': round(filas / segundos, 1) if segundos else None,
+        'consultas': contador.consultas,
+        'consultas_por_fila': round(contador.consultas / filas, 4) if filas else None,
+        'rss_inicial_mb': rss_inicial_mb,
+        'rss_max_mb': rss_max_mb,
+    }
+    if archivo:
+        borrar_carga(archivo)
+    borrar_catalogos(opciones['prefijo'])
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tipos', default='factores,montos',
+                        help='Cargas a medir, separadas por coma (factores, montos).')
+    parser.add_argument('--filas', type=int, default=10000)
+    parser.add_argument('--instrumentos', type=int, default=50,
+                        help='Instrumentos distintos en el archivo.')
+    parser.add_argument('--mercados', type=int, default=5,
+                        help='Mercados distintos en el archivo.')
+    parser.add_argument('--tasa-error', type=float, default=0.0, dest='tasa_error',
+                        help='Fracción de filas con un error (0 a 1).')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--prefijo', default='BENCH',
+                        help='Prefijo de Secuencia, Instrumento y Mercado.')
+    parser.add_argument('--correo', default='admin@mail.com',
+                        help='Usuario (correo) que sube los archivos. Debe ser Corredor o Administrador.')
+    parser.add_argument('--salida', help='Archivo JSON con los resultados (además de imprimirlos).')
+    args = parser.parse_args()
+
+    tipos = [t.strip() for t in args.tipos.split(',') if t.strip()]
+    for tipo in tipos:
+        if tipo not in VISTAS:
+            parser.error(f"Tipo desconocido '{tipo}'.")
+
+    opciones = dict(instrumentos=args.instrumentos, mercados=args.mercados,
+                    tasa_error=args.tasa_error, semilla=args.semilla, prefijo=args.prefijo)
+
+    resultados = []
+    for tipo in tipos:
+        # Un proceso nuevo por tipo: el RSS máximo es el de esa carga
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as pool:
+            resultado = pool.submit(medir_vista, tipo, args.filas, opciones, args.correo).result()
+        resultados.append(resultado)
+        print(f"{tipo:>9}: {resultado['filas_por_segundo']} filas/s, "
+              f"{resultado['consultas_por_fila']} consultas/fila, {resultado['rss_max_mb']} MB RSS máx.")
+
+    informe = {
+        'commit': _commit_actual(),
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'settings': os.environ.get('DJANGO_SETTINGS_MODULE', 'mantenedor_nuam.settings'),
+        'parametros': dict(opciones, filas=args.filas, correo=args.correo),
+        'resultados': resultados,
+    }
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as salida:
+            json.dump(informe, salida, indent=2, ensure_ascii=False)
+    else:
+        print(json.dumps(informe, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
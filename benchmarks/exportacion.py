@@ -0,0 +1,78 @@
+"""
+Tamaño y tiempos de la Exportación en cada formato (CSV, CSV.gz y Parquet):
+cuánto tarda en escribirse, cuánto pesa y cuánto tarda en volver a leerse
+con los tipos correctos (factores como Decimal), sobre las calificaciones
+activas de la BBDD local.
+
+    python -m benchmarks.exportacion --anio 2025 --repeticiones 3
+
+No escribe nada en la BBDD. El formato Parquet se mide solo si está
+instalado 'pyarrow'.
+"""
+import argparse
+import csv
+import gzip
+import io
+import time
+from decimal import Decimal
+
+
+def leer_csv(datos):
+    """Lee el CSV como lo haría un análisis: cada factor a Decimal."""
+    lector = csv.reader(io.StringIO(datos.decode('utf-8-sig')), delimiter=';')
+    next(lector) # (Cabecera)
+    return sum(1 for fila in lector if [Decimal(valor) for valor in fila[9:]])
+
+
+def leer_parquet(datos):
+    import pyarrow.parquet
+    return pyarrow.parquet.read_table(io.BytesIO(datos)).num_rows
+
+
+def lectores():
+    return {
+        'csv': leer_csv,
+        'csv.gz': lambda datos: leer_csv(gzip.decompress(datos)),
+        'parquet': leer_parquet,
+    }
+
+
+def medir(qs, formato, repeticiones):
+    from calificaciones.exportacion import exportar
+
+    escritura, lectura = [], []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        datos = b''.join(exportar(qs, formato))
+        escritura.append(time.perf_counter() - inicio)
+
+        inicio = time.perf_counter()
+        filas = lectores()[formato](datos)
+        lectura.append(time.perf_counter() - inicio)
+    return len(datos), min(escritura), min(lectura), filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--anio', default=None, help='Solo las calificaciones de ese año.')
+    parser.add_argument('--repeticiones', type=int, default=3,
+                        help='Se informa el mejor tiempo de N corridas.')
+    args = parser.parse_args()
+
+    from . import configurar_django
+    configurar_django()
+    from calificaciones.models import CalificacionPivote
+    from calificaciones.exportacion import FORMATOS
+
+    qs = CalificacionPivote.objects.filter(activo=True)
+    if args.anio:
+        qs = qs.filter(anio=args.anio)
+
+    print(f"{'formato':>8} {'filas':>8} {'MB':>8} {'escribir s':>11} {'leer s':>8}")
+    for formato in FORMATOS:
+        tamano, escritura, lectura, filas = medir(qs, formato, args.repeticiones)
+        print(f'{formato:>8} {filas:>8} {tamano / 2**20:>8.2f} {escritura:>11.2f} {lectura:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Generador de CSV sintéticos para la Carga Masiva (Factores y Montos DJ1948).
+
+Las filas son reproducibles (misma semilla = mismo archivo) y usan
+exactamente las cabeceras que exigen las vistas ('Factor 8'..'Factor 37'
+y 'Monto_08'..'Monto_37'). Se puede elegir:
+- la cantidad de filas,
+- cuántos Instrumentos y Mercados distintos aparecen,
+- la fracción de filas con error (fecha, número o suma de factores > 1).
+
+    python -m benchmarks.generador factores --filas 100000 --salida factores.csv
+    python -m benchmarks.generador montos --filas 100000 --tasa-error 0.01 > montos.csv
+
+(Este módulo NO inicializa Django: solo usa las cabeceras de 'validacion')
+"""
+import argparse
+import csv
+import random
+import sys
+
+from calificaciones.validacion import (
+    CABECERAS_BASE, CABECERAS_FACTORES_CSV, CABECERAS_FACTORES_BASE_CSV, CABECERAS_MONTOS_CSV
+)
+
+
+# Errores que se inyectan (cada fila con error tiene uno solo, elegido al azar)
+ERRORES_FACTORES = ('fecha', 'decimal', 'suma_factores')
+ERRORES_MONTOS = ('fecha', 'decimal')
+
+
+def _fila_base(azar, n, opciones, formato_fecha):
+    dia, mes = azar.randint(1, 28), azar.randint(1, 12)
+    return {
+        'Ejercicio': str(opciones['anio']),
+        'Mercado': f"{opciones['prefijo']}-MERC-{azar.randint(1, opciones['mercados'])}",
+        'Instrumento': f"{opciones['prefijo']}-INST-{azar.randint(1, opciones['instrumentos'])}",
+        'Fecha': formato_fecha.format(dia=dia, mes=mes, anio=opciones['anio']),
+        # (La secuencia es única por fila: cada fila es una calificación nueva)
+        'Secuencia': f"{opciones['prefijo']}-{n}",
+        'Numero de dividendo': str(azar.randint(1, 10)),
+        'Tipo sociedad': azar.choice(('SA', 'SpA', 'Ltda')),
+        'Valor Historico': f'{azar.uniform(1, 10000):.2f}',
+    }
+
+
+def _opciones(instrumentos, mercados, tasa_error, prefijo, anio):
+    if instrumentos < 1 or mercados < 1:
+        raise ValueError('Debe haber al menos 1 instrumento y 1 mercado.')
+    if not 0 <= tasa_error <= 1:
+        raise ValueError('La tasa de error debe estar entre 0 y 1.')
+    return {'instrumentos': instrumentos, 'mercados': mercados, 'prefijo': prefijo, 'anio': anio}
+
+
+# ==========================================================
+#  FILAS DEL CSV DE FACTORES
+# ==========================================================
+def generar_filas_factores(cantidad, instrumentos=50, mercados=5, tasa_error=0.0,
+                           semilla=42, prefijo='BENCH', anio=2025):
+    """
+    Filas (tipo DictReader) del CSV de Factores. Las válidas tienen la
+    suma de los factores 8-19 menor que 1; fecha en DD-MM-AAAA.
+    """
+    opciones = _opciones(instrumentos, mercados, tasa_error, prefijo, anio)
+    azar = random.Random(semilla)
+    for n in range(cantidad):
+        fila = _fila_base(azar, n, opciones, '{dia:02d}-{mes:02d}-{anio}')
+        for cabecera in CABECERAS_FACTORES_CSV:
+            # (12 factores base de hasta 0.08: la suma nunca pasa de 0.96)
+            fila[cabecera] = f'{azar.uniform(0, 0.08):.8f}'
+
+        if azar.random() < tasa_error:
+            error = azar.choice(ERRORES_FACTORES)
+            if error == 'fecha':
+                fila['Fecha'] = f'{anio}/13/45'
+            elif error == 'decimal':
+                fila[azar.choice(CABECERAS_FACTORES_CSV)] = 'N/A'
+            else:
+                # (Se guarda como 'Invalido', no se descarta)
+                fila[CABECERAS_FACTORES_BASE_CSV[0]] = '0.99000000'
+                fila[CABECERAS_FACTORES_BASE_CSV[1]] = '0.50000000'
+        yield fila
+
+
+# ==========================================================
+#  FILAS DEL CSV DE MONTOS (DJ1948)
+# ==========================================================
+def generar_filas_montos(cantidad, instrumentos=50, mercados=5, tasa_error=0.0,
+                         semilla=42, prefijo='BENCH', anio=2025):
+    """
+    Filas (tipo DictReader) del CSV de Montos; fecha en AAAA-MM-DD.
+    Los montos 8-33 son pesos enteros y los 34-37 (directos) son factores.
+    """
+    opciones = _opciones(instrumentos, mercados, tasa_error, prefijo, anio)
+    azar = random.Random(semilla)
+    for n in range(cantidad):
+        fila = _fila_base(azar, n, opciones, '{anio}-{mes:02d}-{dia:02d}')
+        for i, cabecera in enumerate(CABECERAS_MONTOS_CSV, start=8):
+            if i < 34:
+                fila[cabecera] = str(azar.randint(0, 5_000_000))
+            else:
+                fila[cabecera] = f'{azar.uniform(0, 0.5):.8f}'
+
+        if azar.random() < tasa_error:
+            if azar.choice(ERRORES_MONTOS) == 'fecha':
+                fila['Fecha'] = f'45-13-{anio}'
+            else:
+                fila[azar.choice(CABECERAS_MONTOS_CSV)] = 'N/A'
+        yield fila
+
+
+TIPOS = {
+    'factores': (CABECERAS_BASE + CABECERAS_FACTORES_CSV, generar_filas_factores),
+    'montos': (CABECERAS_BASE + CABECERAS_MONTOS_CSV, generar_filas_montos),
+}
+
+
+def escribir_csv(tipo, destino, cantidad, **opciones):
+    """
+    Escribe el CSV completo (cabecera + filas) en 'destino', un archivo de
+    texto abierto con newline=''. Las filas se generan de a una.
+    """
+    cabeceras, generar_filas = TIPOS[tipo]
+    writer = csv.DictWriter(destino, fieldnames=cabeceras)
+    writer.writeheader()
+    writer.writerows(generar_filas(cantidad, **opciones))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tipo', choices=sorted(TIPOS))
+    parser.add_argument('--filas', type=int, default=10000)
+    parser.add_argument('--instrumentos', type=int, default=50,
+                        help='Instrumentos distintos en el archivo.')
+    parser.add_argument('--mercados', type=int, default=5,
+                        help='Mercados distintos en el archivo.')
+    parser.add_argument('--tasa-error', type=float, default=0.0, dest='tasa_error',
+                        help='Fracción de filas con un error (0 a 1).')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--prefijo', default='BENCH',
+                        help='Prefijo de Secuencia, Instrumento y Mercado.')
+    parser.add_argument('--salida', help='Archivo de salida (por defecto, la salida estándar).')
+    args = parser.parse_args()
+
+    opciones = dict(instrumentos=args.instrumentos, mercados=args.mercados,
+                    tasa_error=args.tasa_error, semilla=args.semilla, prefijo=args.prefijo)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8', newline='') as destino:
+            escribir_csv(args.tipo, destino, args.filas, **opciones)
+    else:
+        escribir_csv(args.tipo, sys.stdout, args.filas, **opciones)
+
+
+if __name__ == '__main__':
+    main()
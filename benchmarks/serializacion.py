@@ -0,0 +1,77 @@
+"""
+Tiempo de serialización de la API (milisegundos por cada 1000 filas) con
+cada salida: la anidada de modelos ('CalificacionSerializer'), la anidada
+desde la tabla pivote (la por defecto de la API) y la plana, con los
+factores como mapa, como columnas y con solo algunos campos (?fields=).
+
+    python -m benchmarks.serializacion --filas 5000 --repeticiones 5
+
+Las filas se leen de la BBDD local una vez, antes de medir: solo se mide
+la serialización. No escribe nada en la BBDD.
+"""
+import argparse
+import time
+
+
+def medir(serializar, repeticiones):
+    """El mejor tiempo (segundos) de 'repeticiones' llamadas a serializar()."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        serializar()
+        tiempos.append(time.perf_counter() - inicio)
+    return min(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=1000, help='Calificaciones a serializar.')
+    parser.add_argument('--repeticiones', type=int, default=5,
+                        help='Se informa el mejor tiempo de N corridas.')
+    args = parser.parse_args()
+
+    from . import configurar_django
+    configurar_django()
+    from django.db.models import Prefetch
+    from calificaciones.models import Calificacion, Calificaciontributaria, CalificacionPivote
+    from calificaciones.consultas import valores_calificaciones, fila_calificacion
+    from calificaciones.serializers import (
+        CalificacionSerializer, CalificacionPivoteSerializer, CalificacionPlanaSerializer
+    )
+
+    pivote = CalificacionPivote.objects.filter(activo=True).order_by('-fecha_registro', '-pk')
+    filas = [fila_calificacion(tupla) for tupla in valores_calificaciones(pivote)[:args.filas]]
+    if not filas:
+        print('No hay calificaciones activas en la BBDD.')
+        return
+    # (Los mismos registros, como modelos con sus relaciones ya cargadas)
+    modelos = list(
+        Calificacion.objects.filter(pk__in=[fila.pk for fila in filas])
+        .select_related('id_usuario', 'id_instrumento', 'id_mercado', 'id_estado', 'id_archivo')
+        .prefetch_related(Prefetch(
+            'calificaciontributaria_set',
+            queryset=Calificaciontributaria.objects.prefetch_related('factortributario_set')
+        ))
+    )
+
+    salidas = {
+        'modelos (anidada)': lambda: CalificacionSerializer(modelos, many=True).data,
+        'pivote (anidada)': lambda: CalificacionPivoteSerializer(filas, many=True).data,
+        'plana, mapa': lambda: CalificacionPlanaSerializer(filas, many=True, context={'factores': 'mapa'}).data,
+        'plana, columnas': lambda: CalificacionPlanaSerializer(filas, many=True, context={'factores': 'columnas'}).data,
+        'plana, ?fields=': lambda: CalificacionPlanaSerializer(
+            filas, many=True, context={'fields': ['id_calificacion', 'mercado', 'instrumento', 'fecha_pago', 'factores']}
+        ).data,
+    }
+
+    print(f"{'salida':>18} {'filas':>7} {'ms / 1000 filas':>16}")
+    for nombre, serializar in salidas.items():
+        if nombre.startswith('modelos') and not modelos:
+            continue
+        segundos = medir(serializar, args.repeticiones)
+        cantidad = len(modelos) if nombre.startswith('modelos') else len(filas)
+        print(f'{nombre:>18} {cantidad:>7} {segundos * 1000 * 1000 / cantidad:>16.1f}')
+
+
+if __name__ == '__main__':
+    main()
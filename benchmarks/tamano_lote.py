@@ -0,0 +1,72 @@
+"""
+Filas/segundo de la Carga Masiva (Factores) según el tamaño de lote
+(filas por transacción, IMPORTACION_TAMANO_LOTE).
+
+    python -m benchmarks.tamano_lote --filas 20000 --tamanos 1,100,1000,5000 --tasa-error 0.01
+
+Cada corrida crea su propio 'Archivo' y al final borra todo lo que insertó.
+"""
+import argparse
+import time
+
+from . import configurar_django, borrar_carga
+from .generador import generar_filas_factores
+
+
+def medir(filas, tamano_lote, tasa_error, usuario, estado_valido, estado_invalido, procesos=1):
+    from django.utils import timezone
+    from archivos.models import Archivo
+    from calificaciones.importacion import CargaMasiva, validar_fila_factores
+
+    archivo = Archivo.objects.create(
+        nombre_archivo=f'benchmark_lote_{tamano_lote}.csv',
+        fecha_carga=timezone.now(),
+        estado_validacion='Pendiente',
+        id_usuario=usuario,
+        id_estado=estado_valido
+    )
+    carga = CargaMasiva(
+        archivo=archivo,
+        usuario=usuario,
+        estado_valido=estado_valido,
+        estado_invalido=estado_invalido,
+        validar_fila=validar_fila_factores,
+        tamano_lote=tamano_lote,
+        procesos=procesos
+    )
+    inicio = time.perf_counter()
+    carga.procesar(generar_filas_factores(filas, tasa_error=tasa_error))
+    segundos = time.perf_counter() - inicio
+
+    borrar_carga(archivo)
+    return segundos, carga
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--filas', type=int, default=10000)
+    parser.add_argument('--tamanos', default='1,100,500,1000,5000',
+                        help='Tamaños de lote a comparar, separados por coma.')
+    parser.add_argument('--tasa-error', type=float, default=0.0, dest='tasa_error',
+                        help='Fracción de filas con un error (0 a 1).')
+    parser.add_argument('--correo', default='admin@mail.com',
+                        help='Usuario (correo) que figura como autor de la carga.')
+    parser.add_argument('--procesos', type=int, default=1,
+                        help='Procesos de validación en paralelo (IMPORTACION_PROCESOS).')
+    args = parser.parse_args()
+
+    configurar_django()
+    from usuarios.models import Usuario, Estado
+
+    usuario = Usuario.objects.get(correo=args.correo)
+    estado_valido = Estado.objects.get(nombre='Activo')
+    estado_invalido = Estado.objects.get(nombre='Invalido')
+
+    print(f"{'lote':>8} {'filas':>8} {'segundos':>10} {'filas/s':>10} {'inválidas':>10}")
+    for tamano in [int(t) for t in args.tamanos.split(',')]:
+        segundos, carga = medir(args.filas, tamano, args.tasa_error, usuario, estado_valido, estado_invalido, args.procesos)
+        print(f'{tamano:>8} {args.filas:>8} {segundos:>10.2f} {args.filas / segundos:>10.0f} {carga.registros_invalidos:>10}')
+
+
+if __name__ == '__main__':
+    main()
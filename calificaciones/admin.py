@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Calificacion, Calificaciontributaria, Factortributario
+from .models import Calificacion, Calificaciontributaria, Factortributario, TrabajoExportacion
+from .pivote import actualizar_pivote
 
 # --- IMPORTACIONES ADICIONALES ---
 from auditoria.models import Log  # Importamos el modelo Log
@@ -32,8 +33,10 @@ def desactivar_calificaciones(modeladmin, request, queryset):
     # 1. Obtenemos el usuario de nuestra app
     usuario_app = get_usuario_app(request.user)
     
-    # 2. Actualizamos el campo 'activo' a False
+    # 2. Actualizamos el campo 'activo' a False (y la tabla pivote)
+    ids = list(queryset.values_list('id_calificacion', flat=True))
     count = queryset.update(activo=False)
+    actualizar_pivote(ids)
     
     # 3. Registramos en el Log (si encontramos al usuario)
     if usuario_app:
@@ -105,16 +108,70 @@ class CalificacionAdmin(admin.ModelAdmin):
             id_usuario=usuario_app, 
             id_calificacion=obj
         )
+
+    def save_related(self, request, form, formsets, change):
+        # (Después de 'save_model': la fila pivote queda con lo último guardado)
+        super().save_related(request, form, formsets, change)
+        actualizar_pivote([form.instance.id_calificacion])
+
+    # Borrado físico: la fila pivote se borra y queda la baja para la API de cambios
+    def delete_model(self, request, obj):
+        id_calificacion = obj.id_calificacion
+        super().delete_model(request, obj)
+        actualizar_pivote([id_calificacion])
+
+    def delete_queryset(self, request, queryset):
+        ids = list(queryset.values_list('id_calificacion', flat=True))
+        super().delete_queryset(request, queryset)
+        actualizar_pivote(ids)
         
 
+# --- TABLA PIVOTE: lo que se edita aquí también debe llegar a 'calificacion_pivote' ---
+class SincronizaPivoteMixin:
+    """
+    Para los admins de Calificaciontributaria y Factortributario: tras
+    guardar o borrar, recalcula la fila pivote de la calificación afectada.
+    'campo_calificacion' dice dónde está su ID en el objeto (con puntos,
+    si hay que pasar por una relación).
+    """
+    campo_calificacion = 'id_calificacion_id'
+
+    def id_calificacion_de(self, obj):
+        valor = obj
+        for campo in self.campo_calificacion.split('.'):
+            valor = getattr(valor, campo)
+        return valor
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        actualizar_pivote([self.id_calificacion_de(obj)])
+
+    def delete_model(self, request, obj):
+        id_calificacion = self.id_calificacion_de(obj)
+        super().delete_model(request, obj)
+        actualizar_pivote([id_calificacion])
+
+    def delete_queryset(self, request, queryset):
+        ids = [self.id_calificacion_de(obj) for obj in queryset]
+        super().delete_queryset(request, queryset)
+        actualizar_pivote(ids)
+
+
 @admin.register(Calificaciontributaria)
-class CalificaciontributariaAdmin(admin.ModelAdmin):
+class CalificaciontributariaAdmin(SincronizaPivoteMixin, admin.ModelAdmin):
     list_display = ('id_calificacion_tributaria', 'id_calificacion', 'secuencia_evento', 'evento_capital', 'anio', 'valor_historico', 'descripcion', 'ingreso_por_montos')
     search_fields = ('secuencia_evento', 'evento_capital')
     list_filter = ('anio',)
 
 @admin.register(Factortributario)
-class FactortributarioAdmin(admin.ModelAdmin):
+class FactortributarioAdmin(SincronizaPivoteMixin, admin.ModelAdmin):
     list_display = ('id_factor', 'id_calificacion_tributaria', 'codigo_factor', 'descripcion_factor', 'valor_factor')
     search_fields = ('codigo_factor', 'descripcion_factor')
-    list_filter = ()
\ No newline at end of file
+    list_filter = ()
+    campo_calificacion = 'id_calificacion_tributaria.id_calificacion_id'
+
+@admin.register(TrabajoExportacion)
+class TrabajoExportacionAdmin(admin.ModelAdmin):
+    list_display = ('id_trabajo', 'id_usuario', 'formato', 'estado', 'filas', 'version_datos', 'worker', 'fecha_creacion', 'fecha_fin', 'fecha_expiracion')
+    list_filter = ('estado', 'formato')
+    raw_id_fields = ('id_usuario',)
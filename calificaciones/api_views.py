@@ -1,25 +1,49 @@
-from rest_framework import viewsets, mixins
+from rest_framework import viewsets, mixins, serializers, status
+from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+from django.conf import settings
 from django.db.models import Q
 from django.shortcuts import get_object_or_404
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils import timezone
-from decimal import Decimal, ROUND_HALF_UP
+from django.utils.decorators import method_decorator
+from django.http import StreamingHttpResponse
+import json
 
 # Modelos
-from .models import Calificacion, Calificaciontributaria, Factortributario
-from instrumentos.models import Instrumento, Mercado
+from .models import Calificacion, Calificaciontributaria, Factortributario, CalificacionPivote, CalificacionEliminada
+from .pivote import actualizar_pivote, fila_pivote, guardar_pivote
+from .importacion import bulk_create_con_ids, TAMANO_LOTE
+from .parsers import ParserLoteJSON, ParserNDJSON
+from .consultas import valores_calificaciones, fila_calificacion, filtrar_pivote
+from .paginacion import PaginacionCursorAPI
+from .cambios import cambios, leer_token, token_cambio, secuencia_actual, TokenInvalido
+from .versiones import condicional_por_version, TABLA_PIVOTE
+from instrumentos.resolver import ResolverCatalogos
 from usuarios.models import Estado
 
 # Serializers
-from .serializers import CalificacionSerializer, CalificacionCreateSerializer
+from .serializers import (
+    CalificacionPivoteSerializer, CalificacionPlanaSerializer, CalificacionCreateSerializer, FiltroCalificacionesSerializer
+)
 
-# Listas de Factores (para la lógica de cálculo)
-from .forms import FACTORES_BASE_UI, FACTORES_CALCULADOS_UI, FACTORES_DIRECTOS_UI
+# Motor de factores (regla Montos -> Factores)
+from .factores import DESCRIPCIONES, factores_desde_campos
 
 # ==========================================================
 #  API VIEWSET (LECTURA Y ESCRITURA)
 # ==========================================================
+def _identidad_api(request):
+    # Lo que ve cada usuario depende de su rol (y de él, si es Corredor),
+    # y el mismo URL puede pedirse en JSON o en la API navegable
+    return (request.user.id_usuario, request.user.id_rol_id, request.accepted_media_type)
+
+
+# GET condicional: 304 si los datos no cambiaron (sin consultar la tabla pivote)
+@method_decorator(condicional_por_version([TABLA_PIVOTE], identidad=_identidad_api), name='list')
+@method_decorator(condicional_por_version([TABLA_PIVOTE], identidad=_identidad_api), name='retrieve')
 class CalificacionViewSet(
     mixins.CreateModelMixin,  # Permite POST (Crear)
     mixins.RetrieveModelMixin, # Permite GET /<id>/ (Detalle)
@@ -28,48 +52,83 @@ class CalificacionViewSet(
 ):
     """
     API endpoint para Calificaciones (CU13-15).
-    - GET (Listar): Muestra calificaciones (con lógica de privacidad).
+    - GET (Listar): Muestra calificaciones (con lógica de privacidad),
+      filtrables con ?mercado=, ?instrumento=, ?anio=, ?estado=, ?origen= y
+      rangos ?fecha_pago_desde= / _hasta y ?fecha_registro_desde= / _hasta.
     - GET (Detalle): Muestra una calificación.
+      (Anidada por defecto; plana con ?factores=mapa|columnas y/o ?fields=)
     - POST (Crear): Permite a un sistema externo crear una calificación.
+    - POST bulk/ (Crear por lotes): Muchas calificaciones en una petición.
+    - GET changes/?since= (Sincronizar): Lo que cambió desde la última vez.
     """
     permission_classes = [IsAuthenticated] # Requiere token JWT
 
+    # Por cursor (-fecha_registro, -id), con ?page_size= y sin COUNT(*)
+    pagination_class = PaginacionCursorAPI
+    construir_fila = staticmethod(fila_calificacion) # (Tuplas de 'valores_calificaciones' -> FilaCalificacion)
+
     def get_serializer_class(self):
         """
         Usa un serializer diferente para 'Crear' (POST) 
         que para 'Leer' (GET).
         """
-        if self.action == 'create':
+        if self.action in ('create', 'bulk'):
             return CalificacionCreateSerializer # El serializer plano (input)
-        return CalificacionSerializer # El serializer anidado (output)
+        if self.action == 'changes' or self._salida_plana():
+            return CalificacionPlanaSerializer # Salida plana (?factores= / ?fields=)
+        return CalificacionPivoteSerializer # El serializer anidado (output), desde la tabla pivote
+
+    def _salida_plana(self):
+        # La salida anidada sigue siendo la por defecto (clientes existentes)
+        if self.action == 'changes':
+            return True
+        params = self.request.query_params
+        return params.get('factores', 'anidado') != 'anidado' or 'fields' in params
+
+    def get_serializer_context(self):
+        """
+        Opciones de la salida plana: ?factores=mapa|columnas y
+        ?fields=id_calificacion,mercado,F08 (ver 'CalificacionPlanaSerializer').
+        """
+        contexto = super().get_serializer_context()
+        if self.action in ('list', 'retrieve', 'changes') and self._salida_plana():
+            params = self.request.query_params
+            contexto['factores'] = params.get('factores')
+            if 'fields' in params:
+                contexto['fields'] = [nombre.strip() for nombre in params['fields'].split(',') if nombre.strip()]
+        return contexto
 
     def get_queryset(self):
         """
         --- LÓGICA DE 'LOCALIDAD' (PRIVACIDAD) USANDO JWT ---
         Filtra los resultados basado en el rol del usuario del token.
         """
+        # Tabla pivote: los factores ya vienen en columnas (una sola consulta)
+        qs = self._visibles(CalificacionPivote.objects.filter(activo=True))
+
+        # Filtros de la lista (?mercado=&anio=&fecha_pago_desde=...), en SQL
+        if self.action == 'list':
+            filtros = FiltroCalificacionesSerializer(data=self.request.query_params)
+            filtros.is_valid(raise_exception=True)
+            # (Sin usuario: con 'origen=manual' se ven todas las manuales que permite el rol)
+            qs = filtrar_pivote(qs, filtros.validated_data, id_usuario_actual=None)
+
+        # Tuplas planas (ver 'CalificacionPivoteSerializer'), sin instanciar modelos
+        return valores_calificaciones(qs.order_by('-fecha_registro'))
+
+    def _visibles(self, qs_base, campo_usuario='id_usuario'):
+        """'qs_base' con solo lo que puede ver el usuario del token."""
         # 'self.request.user' ES nuestro objeto 'Usuario' 
         usuario = self.request.user 
-        
-        qs_base = Calificacion.objects.select_related(
-            'id_instrumento', 'id_mercado', 'id_usuario', 'id_estado'
-        ).prefetch_related(
-            'calificaciontributaria_set__factortributario_set'
-        )
-        
+
         # Los roles 'Administrador' o 'Auditor' ven todo
         if usuario.id_rol.nombre in ['Administrador', 'Auditor']:
-            qs = qs_base.all()
-        else:
-            # Un 'Corredor' solo ve sus cargas manuales o las de 'Archivo'
-            qs = qs_base.filter(
-                Q(id_usuario=usuario) | 
-                Q(id_usuario__isnull=True)
-            )
-        
-
-        
-        return qs.order_by('-fecha_registro')
+            return qs_base.all()
+        # Un 'Corredor' solo ve sus cargas manuales o las de 'Archivo'
+        return qs_base.filter(
+            Q(**{campo_usuario: usuario.id_usuario}) | 
+            Q(**{f'{campo_usuario}__isnull': True})
+        )
 
     @transaction.atomic
     def perform_create(self, serializer):
@@ -85,13 +144,10 @@ class CalificacionViewSet(
         # --- LÓGICA DE GUARDADO (Copiada de 'calificacion_create_view') ---
         try:
             estado_activo = get_object_or_404(Estado, nombre='Activo')
-            instrumento, _ = Instrumento.objects.get_or_create(
-                nombre=data['instrumento_nombre'],
-                defaults={'tipo': 'Desconocido', 'moneda': 'N/A'}
-            )
-            mercado, _ = Mercado.objects.get_or_create(
-                nombre=data['mercado_nombre'],
-                defaults={'pais': 'N/A'}
+            resolver = ResolverCatalogos()
+            resolver.precargar(
+                instrumentos=[data['instrumento_nombre']],
+                mercados=[data['mercado_nombre']]
             )
 
             # 1. Crear 'Calificacion' (Padre)
@@ -99,8 +155,8 @@ class CalificacionViewSet(
             nueva_calificacion = Calificacion.objects.create(
                 fecha_pago=data['fecha_pago'],
                 id_usuario=None, # ¡La API crea registros de "Bolsa"!
-                id_instrumento=instrumento,
-                id_mercado=mercado,
+                id_instrumento_id=resolver.id_instrumento(data['instrumento_nombre']),
+                id_mercado_id=resolver.id_mercado(data['mercado_nombre']),
                 id_archivo=None, # Opcional: podríamos crear un 'Archivo' aquí
                 id_estado=estado_activo,
                 fecha_registro=timezone.now(),
@@ -118,51 +174,208 @@ class CalificacionViewSet(
                 ingreso_por_montos=data['ingreso_por_montos']
             )
 
-            # 3. Lógica de Cálculo (Montos vs. Factores)
-            valores_finales = {} # { 'F08': Decimal(0.5), ... }
-            
-            if data['ingreso_por_montos']:
-                suma_total_montos = Decimal('0.0')
-                for campo in FACTORES_BASE_UI: # 'factor_08', 'factor_09'...
-                    suma_total_montos += data.get(campo, Decimal('0.0'))
-                
-                precision = Decimal('0.00000001')
-                if suma_total_montos > 0:
-                    for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                        monto = data.get(campo, Decimal('0.0'))
-                        factor_calc = (monto / suma_total_montos).quantize(precision, rounding=ROUND_HALF_UP)
-                        codigo_db = f"F{campo.split('_')[-1].zfill(2)}"
-                        valores_finales[codigo_db] = factor_calc
-                else:
-                    for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                        codigo_db = f"F{campo.split('_')[-1].zfill(2)}"
-                        valores_finales[codigo_db] = Decimal('0.0')
-                
-                for campo in FACTORES_DIRECTOS_UI:
-                    codigo_db = f"F{campo.split('_')[-1].zfill(2)}"
-                    valores_finales[codigo_db] = data.get(campo, Decimal('0.0'))
-            
-            else:
-                # Ingreso directo de Factores
-                todos_los_factores = FACTORES_BASE_UI + FACTORES_CALCULADOS_UI + FACTORES_DIRECTOS_UI
-                for campo in todos_los_factores:
-                    codigo_db = f"F{campo.split('_')[-1].zfill(2)}"
-                    valores_finales[codigo_db] = data.get(campo, Decimal('0.0'))
-            
+            # 3. Lógica de Cálculo (Montos vs. Factores), con el motor de factores
+            valores_finales = factores_desde_campos(data, data['ingreso_por_montos']) # { 'F08': Decimal(0.5), ... }
+
             # 4. Crear 'Factortributario' (Nietos)
-            factores_para_crear = []
-            for codigo_db, valor_factor in valores_finales.items():
-                if valor_factor != Decimal('0.0'):
-                    factores_para_crear.append(
-                        Factortributario(
-                            id_calificacion_tributaria=nueva_calif_trib,
-                            codigo_factor=codigo_db,
-                            descripcion_factor=f"Factor-{codigo_db[1:]}",
-                            valor_factor=valor_factor
-                        )
-                    )
+            factores_para_crear = [
+                Factortributario(
+                    id_calificacion_tributaria=nueva_calif_trib,
+                    codigo_factor=codigo_db,
+                    descripcion_factor=DESCRIPCIONES[codigo_db], # 'Factor-08'
+                    valor_factor=valor_factor
+                )
+                for codigo_db, valor_factor in valores_finales.items()
+            ]
             if factores_para_crear:
                 Factortributario.objects.bulk_create(factores_para_crear)
+            actualizar_pivote([nueva_calificacion.id_calificacion])
             
         except Exception as e:
-            raise serializers.ValidationError(f"Error al guardar: {e}")
\ No newline at end of file
+            raise serializers.ValidationError(f"Error al guardar: {e}")
+    # ------------------------------------------------------
+    #  CREACIÓN POR LOTES (POST /api/v1/calificaciones/bulk/)
+    # ------------------------------------------------------
+    @action(detail=False, methods=['post'], parser_classes=[ParserLoteJSON, ParserNDJSON])
+    def bulk(self, request):
+        """
+        Crea muchas calificaciones en una petición: un arreglo JSON (o un
+        cuerpo NDJSON, 'application/x-ndjson') con los mismos objetos que
+        el POST de a una. Se validan todos y los válidos se guardan con
+        unos pocos 'bulk_create' por lote, en vez de una transacción por
+        calificación. Los inválidos no impiden guardar el resto.
+
+        Responde un resultado por objeto, en el orden recibido ('indice'):
+        201 si se crearon todos, 400 si ninguno y 207 si fue parcial.
+        Un lote de más de API_MAX_LOTE objetos se rechaza (413) mientras
+        se lee, sin cargarlo completo (ver 'calificaciones/parsers.py').
+        """
+        items = request.data
+
+        # 1. Validación (un solo serializer para todo el lote, como hace 'many=True',
+        # pero sin perder los válidos cuando alguno falla)
+        validador = self.get_serializer()
+        resultados, validos = [None] * len(items), []
+        for indice, item in enumerate(items):
+            try:
+                validos.append((indice, validador.run_validation(item)))
+            except serializers.ValidationError as e:
+                resultados[indice] = {'indice': indice, 'estado': 'error', 'errores': e.detail}
+
+        # 2. Escritura por lotes (ver '_crear_por_lotes')
+        if validos:
+            for indice, id_calificacion in _crear_por_lotes(validos, resultados):
+                resultados[indice] = {'indice': indice, 'estado': 'creado', 'id_calificacion': id_calificacion}
+
+        creados = sum(1 for r in resultados if r['estado'] == 'creado')
+        if creados == len(items):
+            codigo = status.HTTP_201_CREATED
+        elif creados == 0:
+            codigo = status.HTTP_400_BAD_REQUEST
+        else:
+            codigo = status.HTTP_207_MULTI_STATUS
+        return Response(
+            {'creados': creados, 'errores': len(items) - creados, 'resultados': resultados},
+            status=codigo
+        )
+
+
+    # ------------------------------------------------------
+    #  CAMBIOS DESDE UN TOKEN (GET /api/v1/calificaciones/changes/?since=)
+    # ------------------------------------------------------
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Sincronización incremental: las altas, cambios y bajas desde el
+        token '?since=' (sin token, todo), en orden, como NDJSON (un objeto
+        JSON por línea, a medida que se leen). Cada línea trae su 'token'
+        (para retomar si la respuesta se corta) y la última, el token
+        'siguiente' para la próxima sincronización. Las altas y cambios
+        traen la calificación plana ('datos', acepta ?factores= y ?fields=).
+        (Un Corredor no recibe la baja de lo que deja de ver porque otro
+        usuario tomó posesión: solo la de lo que se borra.)
+        """
+        try:
+            desde = leer_token(request.query_params.get('since'))
+        except TokenInvalido:
+            raise serializers.ValidationError({'since': 'Token inválido.'})
+        serializador = self.get_serializer()
+
+        # Todo lo confirmado hasta ahora (lo que se escriba mientras tanto, en la próxima)
+        hasta = secuencia_actual()
+        pivote = self._visibles(CalificacionPivote.objects.all())
+        eliminadas = self._visibles(CalificacionEliminada.objects.all())
+
+        def lineas():
+            for tipo, secuencia, pk, fila in cambios(pivote, eliminadas, desde, hasta):
+                linea = {'tipo': tipo, 'token': token_cambio(secuencia, pk), 'id_calificacion': pk}
+                if fila is not None:
+                    linea['datos'] = serializador.to_representation(fila)
+                yield json.dumps(linea, cls=JSONEncoder, ensure_ascii=False) + '\n'
+            yield json.dumps({'siguiente': token_cambio(max(hasta, desde[0]))}) + '\n'
+
+        return StreamingHttpResponse(lineas(), content_type='application/x-ndjson')
+
+def _crear_por_lotes(validos, resultados):
+    """
+    Guarda los (indice, datos validados) de a IMPORTACION_TAMANO_LOTE, cada
+    lote en una transacción. Si un lote falla en la BBDD se divide en
+    mitades hasta aislar los culpables (que quedan como error en
+    'resultados'), igual que la Carga Masiva. Entrega (indice, id_calificacion).
+    """
+    estado_activo = get_object_or_404(Estado, nombre='Activo')
+
+    # Instrumento/Mercado por nombre: dos consultas para todo el lote
+    # (fuera de las transacciones, para que un rollback no deje IDs inválidos)
+    resolver = ResolverCatalogos()
+    resolver.precargar(
+        instrumentos={datos['instrumento_nombre'] for _, datos in validos},
+        mercados={datos['mercado_nombre'] for _, datos in validos},
+    )
+
+    tamano = getattr(settings, 'IMPORTACION_TAMANO_LOTE', TAMANO_LOTE)
+    pendientes = [validos[inicio:inicio + tamano] for inicio in range(0, len(validos), tamano)]
+    while pendientes:
+        lote = pendientes.pop(0)
+        try:
+            with transaction.atomic():
+                calificaciones = _insertar_lote(lote, resolver, estado_activo)
+        except Exception as e:
+            if len(lote) == 1:
+                indice = lote[0][0]
+                resultados[indice] = {'indice': indice, 'estado': 'error',
+                                      'errores': {'non_field_errors': [f'Error al guardar: {e}']}}
+                continue
+            mitad = len(lote) // 2
+            pendientes[:0] = [lote[:mitad], lote[mitad:]]
+            continue
+        for (indice, _), calif in zip(lote, calificaciones):
+            yield indice, calif.id_calificacion
+
+
+def _insertar_lote(lote, resolver, estado_activo):
+    """
+    Los mismos registros que 'perform_create' (Calificacion de "Bolsa",
+    Calificaciontributaria, Factortributario y su fila pivote), con un
+    'bulk_create' por tabla. Debe llamarse dentro de una transacción.
+    """
+    fecha_registro = timezone.now()
+    calificaciones = [
+        Calificacion(
+            fecha_pago=datos['fecha_pago'],
+            id_usuario=None, # ¡La API crea registros de "Bolsa"!
+            id_instrumento_id=resolver.id_instrumento(datos['instrumento_nombre']),
+            id_mercado_id=resolver.id_mercado(datos['mercado_nombre']),
+            id_archivo=None,
+            id_estado=estado_activo,
+            fecha_registro=fecha_registro,
+            activo=True
+        )
+        for _, datos in lote
+    ]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Calificacion.objects_all.bulk_create(calificaciones)
+    else:
+        # (MySQL no devuelve las PK de un INSERT múltiple, y las de "Bolsa"
+        # no tienen una clave que solo escriba esta petición: releerlas
+        # traería también las que otra petición inserta a la vez. Se
+        # insertan de a una, en la transacción del lote)
+        for calif in calificaciones:
+            calif.save(force_insert=True)
+
+    tributarias = [
+        Calificaciontributaria(
+            id_calificacion=calif,
+            secuencia_evento=datos['secuencia_evento'],
+            evento_capital=datos.get('evento_capital', ''),
+            anio=datos['anio'],
+            valor_historico=datos['valor_historico'],
+            descripcion=datos.get('descripcion', 'Carga vía API'),
+            ingreso_por_montos=datos['ingreso_por_montos']
+        )
+        for calif, (_, datos) in zip(calificaciones, lote)
+    ]
+    bulk_create_con_ids(
+        Calificaciontributaria.objects, tributarias,
+        id_calificacion__in=[c.id_calificacion for c in calificaciones]
+    )
+
+    # Motor de factores (Montos -> Factores), igual que el POST de a una
+    factores = [factores_desde_campos(datos, datos['ingreso_por_montos']) for _, datos in lote]
+    Factortributario.objects.bulk_create([
+        Factortributario(
+            id_calificacion_tributaria_id=trib.id_calificacion_tributaria,
+            codigo_factor=codigo_db,
+            descripcion_factor=DESCRIPCIONES[codigo_db],
+            valor_factor=valor_factor
+        )
+        for trib, valores in zip(tributarias, factores)
+        for codigo_db, valor_factor in valores.items()
+    ])
+
+    # Tabla pivote, con lo que ya está en memoria
+    guardar_pivote(
+        (fila_pivote(calif, trib, valores) for calif, trib, valores in zip(calificaciones, tributarias, factores)),
+        nuevas=True
+    )
+    return calificaciones
@@ -0,0 +1,211 @@
+import codecs
+import json
+
+# Motor de factores (camino rápido de texto a texto)
+from .factores import CAMPOS, N_FACTORES, calcular_factores_texto
+
+
+# ==========================================================
+#  CALCULADORA DE FACTORES POR LOTES (sin tocar la BBDD)
+# ==========================================================
+# Las filas se leen del cuerpo de la petición a medida que llegan (un
+# arreglo JSON o NDJSON, una fila por línea) y se calculan de a
+# 'TAMANO_TROZO': ni la entrada ni la respuesta se arman completas en memoria.
+TAMANO_TROZO = 1000
+TAMANO_LECTURA = 64 * 1024 # Bytes que se leen del cuerpo por vez
+
+TIPOS_NDJSON = ('application/x-ndjson', 'application/jsonl', 'application/ndjson')
+
+
+class CuerpoInvalido(ValueError):
+    """El cuerpo no es un arreglo JSON (se detecta antes de responder)."""
+
+
+def _decodificador():
+    # Los decimales llegan como texto ('0.1' y no 0.1000000000000000055...)
+    return json.JSONDecoder(parse_float=str)
+
+
+def leer_arreglo_json(flujo):
+    """
+    Elementos de un arreglo JSON ('[fila, fila, ...]') leídos por trozos
+    desde 'flujo' (ej. el request). Lanza 'CuerpoInvalido' si no empieza
+    con '[' y ValueError si se corta o es inválido más adelante.
+    """
+    decodificador = _decodificador()
+    utf8 = codecs.getincrementaldecoder('utf-8-sig')()
+    texto, pos, fin_flujo = '', 0, False
+
+    def leer_mas():
+        nonlocal texto, pos, fin_flujo
+        trozo = flujo.read(TAMANO_LECTURA)
+        fin_flujo = not trozo
+        texto = texto[pos:] + utf8.decode(trozo, final=fin_flujo)
+        pos = 0
+
+    def siguiente_caracter():
+        """Salta los espacios; devuelve el próximo carácter ('' al final)."""
+        nonlocal pos
+        while True:
+            while pos < len(texto) and texto[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(texto) or fin_flujo:
+                return texto[pos:pos + 1]
+            leer_mas()
+
+    if siguiente_caracter() != '[':
+        raise CuerpoInvalido('El cuerpo debe ser un arreglo JSON de filas.')
+    pos += 1
+
+    primero = True
+    while True:
+        caracter = siguiente_caracter()
+        if caracter == ']':
+            return
+        if not primero:
+            if caracter != ',':
+                raise ValueError(f"JSON inválido: se esperaba ',' o ']' y llegó '{caracter}'.")
+            pos += 1
+            caracter = siguiente_caracter()
+        if caracter not in ('{', '['):
+            raise ValueError('JSON inválido: cada fila debe ser un objeto o una lista.')
+
+        # Una fila completa; si quedó cortada entre dos lecturas, se lee más
+        while True:
+            try:
+                fila, pos = decodificador.raw_decode(texto, pos)
+                break
+            except json.JSONDecodeError as e_json:
+                if fin_flujo:
+                    raise ValueError(f'JSON inválido: {e_json}')
+                leer_mas()
+        primero = False
+        yield fila
+
+
+def leer_ndjson(flujo):
+    """Una fila por línea (NDJSON). Las líneas inválidas llegan como ValueError."""
+    decodificador = _decodificador()
+    for linea in flujo:
+        linea = linea.decode('utf-8-sig').strip()
+        if not linea:
+            yield None # (Línea vacía: se cuenta, pero no es una fila)
+            continue
+        try:
+            yield decodificador.decode(linea)
+        except ValueError as e_json:
+            yield ValueError(f'JSON inválido: {e_json}')
+
+
+def _montos_de_fila(fila):
+    """
+    El vector de 30 montos (F08..F37) de una fila: un objeto con los
+    campos 'factor_08'..'factor_37' (los que falten valen 0, como en la
+    calculadora de una fila) o una lista de 30 valores en ese orden.
+    """
+    if isinstance(fila, ValueError):
+        raise fila
+    if isinstance(fila, dict):
+        return [fila.get(campo) for campo in CAMPOS]
+    if isinstance(fila, list):
+        if len(fila) != N_FACTORES:
+            raise ValueError(f'Se esperaban {N_FACTORES} montos y llegaron {len(fila)}.')
+        return fila
+    raise ValueError('Cada fila debe ser un objeto o una lista.')
+
+
+def calcular_por_trozos(filas, max_filas):
+    """
+    Calcula las filas de a 'TAMANO_TROZO' y entrega cada trozo como una
+    lista de (numero_fila, factores, error): 'factores' es la lista de
+    30 textos, o None si la fila tiene un 'error'.
+
+    Una fila inválida no detiene el lote: solo ese trozo se recalcula
+    fila a fila para saber cuál fue. Si hay más de 'max_filas' filas,
+    la última entrada es un error y se deja de leer.
+    """
+    numeradas = enumerate(filas, start=1)
+    while True:
+        trozo, error_lectura = [], None
+        try:
+            for numero, fila in numeradas:
+                trozo.append((numero, fila))
+                if len(trozo) == TAMANO_TROZO:
+                    break
+        except ValueError as e_lectura:
+            # (El JSON se cortó: se calculan las filas ya leídas y luego se informa)
+            error_lectura = e_lectura
+
+        excedidas = trozo and trozo[-1][0] > max_filas
+        if excedidas:
+            trozo = [(n, fila) for n, fila in trozo if n <= max_filas]
+        if trozo:
+            yield _calcular_trozo(trozo)
+        if excedidas:
+            yield [(max_filas + 1, None, f'Se permiten hasta {max_filas} filas por petición.')]
+            return
+        if error_lectura is not None:
+            raise error_lectura
+        if len(trozo) < TAMANO_TROZO:
+            return
+
+
+def _calcular_trozo(trozo):
+    trozo = [(n, fila) for n, fila in trozo if fila is not None]
+    try:
+        montos = [_montos_de_fila(fila) for _, fila in trozo]
+        return [(n, factores, None) for (n, _), factores in zip(trozo, calcular_factores_texto(montos))]
+    except ValueError:
+        pass
+
+    resultados = []
+    for n, fila in trozo:
+        try:
+            resultados.append((n, calcular_factores_texto([_montos_de_fila(fila)])[0], None))
+        except ValueError as e_fila:
+            resultados.append((n, None, str(e_fila)))
+    return resultados
+
+
+# ==========================================================
+#  RESPUESTAS (por partes, para StreamingHttpResponse)
+# ==========================================================
+def respuesta_json(trozos):
+    """
+    '{"campos": [...], "factores": [[...], null, ...], "errores": [...]}'
+    'factores' va en el orden de las filas (null si la fila tiene error) y
+    'errores' trae {"fila", "error"}. Si el JSON se corta a mitad de camino
+    queda como un error con "fila": null y la respuesta se cierra bien.
+    """
+    yield '{"campos": %s, "factores": [' % json.dumps(CAMPOS)
+    errores = []
+    separador = ''
+    try:
+        for trozo in trozos:
+            partes = []
+            for numero, factores, error in trozo:
+                if error:
+                    errores.append({'fila': numero, 'error': error})
+                partes.append('null' if factores is None else json.dumps(factores))
+            if partes:
+                yield separador + ','.join(partes)
+                separador = ','
+    except ValueError as e_lectura:
+        errores.append({'fila': None, 'error': str(e_lectura)})
+    yield '], "errores": %s}' % json.dumps(errores)
+
+
+def respuesta_ndjson(trozos):
+    """Una línea por fila: {"fila": n, "factores": [...]} o {"fila": n, "error": "..."}."""
+    try:
+        for trozo in trozos:
+            lineas = []
+            for numero, factores, error in trozo:
+                if error:
+                    lineas.append(json.dumps({'fila': numero, 'error': error}))
+                else:
+                    lineas.append(json.dumps({'fila': numero, 'factores': factores}))
+            if lineas:
+                yield '\n'.join(lineas) + '\n'
+    except ValueError as e_lectura:
+        yield json.dumps({'fila': None, 'error': str(e_lectura)}) + '\n'
@@ -0,0 +1,106 @@
+import heapq
+
+from django.db.models import Q
+
+from .consultas import valores_calificaciones, fila_calificacion, FilaCalificacion
+from .versiones import version_actual, TABLA_PIVOTE
+
+
+# ==========================================================
+#  CAMBIOS DESDE UNA SECUENCIA (sincronización incremental)
+# ==========================================================
+# Cada escritura de la tabla pivote marca sus filas con la nueva versión de
+# la tabla ('secuencia_cambio', ver 'calificaciones/pivote.py'), y las
+# calificaciones borradas de verdad dejan su marca en 'CalificacionEliminada'.
+# Así, quien copia los datos pide solo lo escrito después de la última
+# secuencia que vio, en orden (secuencia, id), y no todo otra vez.
+#
+# El token es 'S' (todo lo posterior a la secuencia S) o 'S.ID' (lo
+# posterior a la calificación ID de la secuencia S: para retomar una
+# respuesta cortada a la mitad). Sin token se entrega todo.
+TAMANO_TROZO = 2000
+
+ALTA, CAMBIO, BAJA = 'alta', 'cambio', 'baja'
+
+
+class TokenInvalido(ValueError):
+    """El token de '?since=' no se pudo leer."""
+
+
+def leer_token(token):
+    """'S' o 'S.ID' -> (S, ID o None). Sin token: (-1, None), o sea, desde el principio."""
+    if not token:
+        return (-1, None)
+    secuencia, _, pk = token.partition('.')
+    try:
+        return (int(secuencia), int(pk) if pk else None)
+    except ValueError:
+        raise TokenInvalido(token)
+
+
+def token_cambio(secuencia, pk=None):
+    return str(secuencia) if pk is None else f'{secuencia}.{pk}'
+
+
+def _posteriores(desde):
+    """Filtro de (secuencia_cambio, pk) > 'desde' (con ID None = el mayor de su secuencia)."""
+    secuencia, pk = desde
+    if pk is None:
+        return Q(secuencia_cambio__gt=secuencia)
+    return Q(secuencia_cambio__gt=secuencia) | Q(secuencia_cambio=secuencia, pk__gt=pk)
+
+
+def _por_trozos(qs, desde, hasta, tamano, clave):
+    """
+    Recorre 'qs' (de tuplas) en orden (secuencia_cambio, pk), de 'desde'
+    (excluido) a la secuencia 'hasta' (incluida), de a 'tamano' filas por
+    clave: cada consulta trae solo un trozo (como la Exportación).
+    Entrega (secuencia, pk, tupla), con 'clave(tupla)' = (secuencia, pk).
+    """
+    qs = qs.filter(secuencia_cambio__lte=hasta).order_by('secuencia_cambio', 'pk')
+    while True:
+        trozo = list(qs.filter(_posteriores(desde))[:tamano])
+        for tupla in trozo:
+            yield clave(tupla) + (tupla,)
+        if len(trozo) < tamano:
+            return
+        desde = clave(trozo[-1])
+
+
+_SECUENCIA = FilaCalificacion._fields.index('secuencia_cambio')
+
+
+def cambios(pivote, eliminadas, desde, hasta, tamano=TAMANO_TROZO):
+    """
+    Los cambios entre 'desde' (excluido) y la secuencia 'hasta' (incluida),
+    en orden (secuencia, id): tuplas (tipo, secuencia, id, fila), con
+    'fila' la FilaCalificacion de las altas y los cambios (None en las bajas).
+    'pivote' (de CalificacionPivote, activas e inactivas) y 'eliminadas' (de
+    CalificacionEliminada) ya vienen filtrados por lo que el usuario puede ver.
+    """
+    filas = _por_trozos(
+        valores_calificaciones(pivote), desde, hasta, tamano,
+        clave=lambda tupla: (tupla[_SECUENCIA], tupla[0]),
+    )
+    bajas = _por_trozos(
+        eliminadas.values_list('secuencia_cambio', 'pk'), desde, hasta, tamano,
+        clave=lambda tupla: tupla,
+    )
+    # (Con ID None el token apunta al final de su secuencia)
+    limite_alta = (desde[0], float('inf') if desde[1] is None else desde[1])
+    for secuencia, pk, tupla in heapq.merge(filas, bajas, key=lambda cambio: cambio[:2]):
+        if len(tupla) == 2: # (Borrada de verdad)
+            yield BAJA, secuencia, pk, None
+            continue
+        fila = fila_calificacion(tupla)
+        if not fila.activo:
+            yield BAJA, secuencia, pk, None
+        elif (fila.secuencia_alta, pk) > limite_alta:
+            yield ALTA, secuencia, pk, fila
+        else:
+            yield CAMBIO, secuencia, pk, fila
+
+
+def secuencia_actual():
+    """Hasta dónde llega una respuesta: la versión confirmada de la tabla pivote."""
+    return version_actual(TABLA_PIVOTE)
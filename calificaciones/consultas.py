@@ -0,0 +1,136 @@
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Case, F, Max, Q, When
+from django.utils import timezone
+
+from .models import Factortributario, COLUMNAS_FACTORES
+from instrumentos.models import Instrumento, Mercado
+from usuarios.models import Estado
+
+
+# ==========================================================
+#  CAPA DE CONSULTAS: FILAS PLANAS SIN INSTANCIAR MODELOS
+# ==========================================================
+# La Lista, la Exportación y la API recorren miles de calificaciones: en vez
+# de crear una instancia de modelo (y de cada relación) por fila, piden a la
+# BBDD tuplas con 'values_list' y las leen como 'FilaCalificacion'.
+
+# Nombres de Instrumento, Mercado, Estado, Usuario y Archivo (en la misma consulta)
+_ANOTACIONES = {
+    'nombre_instrumento': F('id_instrumento__nombre'),
+    'nombre_mercado': F('id_mercado__nombre'),
+    'nombre_estado': F('id_estado__nombre'),
+    'nombre_usuario': F('id_usuario__nombre'),
+    'correo_usuario': F('id_usuario__correo'),
+    'nombre_archivo': F('id_archivo__nombre_archivo'),
+}
+
+# Columnas de la tabla pivote que se leen (los 30 factores van al final)
+_CAMPOS = (
+    'pk', 'id_usuario_id', 'id_calificacion_tributaria_id',
+    'fecha_pago', 'fecha_registro', 'activo', 'origen',
+    'anio', 'secuencia_evento', 'evento_capital', 'valor_historico',
+    'descripcion', 'ingreso_por_montos', 'secuencia_cambio', 'secuencia_alta',
+) + tuple(_ANOTACIONES)
+
+# Una fila de la Lista/Exportación/API: las columnas de arriba + 'factores',
+# la tupla de los 30 valores F08..F37 (None si la calificación no lo tiene)
+FilaCalificacion = namedtuple('FilaCalificacion', _CAMPOS + ('factores',))
+_N_CAMPOS = len(_CAMPOS)
+
+
+def valores_calificaciones(qs):
+    """
+    'qs' (de CalificacionPivote, ya filtrado) como tuplas planas: una
+    consulta, sin instancias de modelo. Cada tupla se lee con 'fila_calificacion'.
+    """
+    return qs.annotate(**_ANOTACIONES).values_list(*_CAMPOS, *COLUMNAS_FACTORES.values())
+
+
+def fila_calificacion(tupla):
+    """La tupla de 'valores_calificaciones' como FilaCalificacion."""
+    return FilaCalificacion._make(tupla[:_N_CAMPOS] + (tupla[_N_CAMPOS:],))
+
+
+def filtrar_pivote(qs, filtros, id_usuario_actual):
+    """
+    Aplica los filtros de 'CalificacionFilterForm' (como los entrega
+    'filtros()') o de la API sobre la tabla pivote. Lo usan la Lista, la
+    Exportación, los trabajos de exportación y la API.
+
+    Mercado, Instrumento y Estado pueden venir por ID o por nombre (el
+    nombre se resuelve en la misma consulta), y las fechas como 'AAAA-MM-DD'
+    (ambos extremos incluidos). Con 'id_usuario_actual', el origen 'manual'
+    son solo las cargas manuales de ese usuario.
+    """
+    for filtro, columna, modelo in _FILTROS_CATALOGO:
+        if filtros.get(filtro):
+            qs = qs.filter(_por_catalogo(columna, modelo, filtros[filtro]))
+    if filtros.get('anio'):
+        qs = qs.filter(anio=filtros['anio'])
+    if filtros.get('origen') == 'manual':
+        qs = qs.filter(origen='manual')
+        if id_usuario_actual is not None:
+            qs = qs.filter(id_usuario_id=id_usuario_actual)
+    elif filtros.get('origen') in ('archivo', 'bolsa'):
+        qs = qs.filter(origen=filtros['origen'])
+
+    # Rangos de fechas (sobre la columna, sin funciones: usan los índices)
+    if filtros.get('fecha_pago_desde'):
+        qs = qs.filter(fecha_pago__gte=_fecha(filtros['fecha_pago_desde']))
+    if filtros.get('fecha_pago_hasta'):
+        qs = qs.filter(fecha_pago__lte=_fecha(filtros['fecha_pago_hasta']))
+    if filtros.get('fecha_registro_desde'):
+        qs = qs.filter(fecha_registro__gte=_inicio_del_dia(_fecha(filtros['fecha_registro_desde'])))
+    if filtros.get('fecha_registro_hasta'):
+        qs = qs.filter(fecha_registro__lt=_inicio_del_dia(_fecha(filtros['fecha_registro_hasta']) + timedelta(days=1)))
+    return qs
+
+
+# (filtro, columna de la tabla pivote, catálogo donde se busca el nombre)
+_FILTROS_CATALOGO = (
+    ('mercado', 'id_mercado', Mercado),
+    ('instrumento', 'id_instrumento', Instrumento),
+    ('estado', 'id_estado', Estado),
+)
+
+
+def _por_catalogo(columna, modelo, valor):
+    """Filtro por ID (un número) o por nombre (IN de una subconsulta al catálogo)."""
+    if isinstance(valor, int) or str(valor).isdigit():
+        return Q(**{f'{columna}_id': int(valor)})
+    return Q(**{f'{columna}_id__in': modelo.objects.filter(nombre=valor).values('pk')})
+
+
+def _fecha(valor):
+    return valor if isinstance(valor, date) else date.fromisoformat(valor)
+
+
+def _inicio_del_dia(dia):
+    """La medianoche de 'dia' en la zona horaria actual (fecha_registro es DATETIME)."""
+    return timezone.make_aware(datetime.combine(dia, time.min))
+
+
+# ==========================================================
+#  PIVOTE EN LA BBDD (agregación condicional sobre Factortributario)
+# ==========================================================
+def factores_por_tributaria(ids_tributaria):
+    """
+    Los 30 factores de cada Calificaciontributaria en UNA fila, calculados por
+    la BBDD con MAX(CASE WHEN codigo_factor = 'F08' THEN valor_factor END), ...
+    agrupando por tributaria: tuplas (id_tributaria, F08, ..., F37), en vez de
+    hasta 30 instancias de Factortributario por calificación.
+    """
+    columnas = {
+        columna: Max(Case(When(codigo_factor=codigo, then=F('valor_factor'))))
+        for codigo, columna in COLUMNAS_FACTORES.items()
+    }
+    return (
+        Factortributario.objects
+        .filter(id_calificacion_tributaria_id__in=ids_tributaria)
+        .values('id_calificacion_tributaria_id') # (GROUP BY)
+        .annotate(**columnas)
+        .values_list('id_calificacion_tributaria_id', *columnas)
+        .order_by()
+    )
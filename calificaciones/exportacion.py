@@ -0,0 +1,252 @@
+import csv
+import io
+import zipfile
+import zlib
+from itertools import chain
+from decimal import Decimal
+
+from .consultas import valores_calificaciones, fila_calificacion
+from .factores import CODIGOS
+
+# Apache Arrow (opcional, 'requirements-parquet.txt'): sin 'pyarrow' instalado
+# no se ofrece el formato Parquet
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# ==========================================================
+#  EXPORTACIÓN DE CALIFICACIONES (por partes, memoria constante)
+# ==========================================================
+# Las filas se leen de a 'TAMANO_TROZO' y cada trozo se convierte en texto
+# CSV y se entrega de inmediato (StreamingHttpResponse): la primera parte
+# sale antes de leer la segunda y nunca está el resultado completo en memoria.
+TAMANO_TROZO = 2000
+
+# Cabeceras del CSV (basado en la spec del cliente)
+CABECERAS_CSV = [
+    'Ejercicio', 'Mercado', 'Instrumento', 'Fecha',
+    'Secuencia', 'Numero de dividendo', 'Valor Historico',
+    'Estado', 'Origen'
+] + [f'Factor {i}' for i in range(8, 38)] # "Factor 8", "Factor 9", ...
+
+# formato -> (content_type, nombre del archivo descargado)
+FORMATOS = {
+    'csv': ('text/csv', 'reporte_calificaciones.csv'),
+    'csv.gz': ('application/gzip', 'reporte_calificaciones.csv.gz'),
+}
+if pyarrow is not None:
+    FORMATOS['parquet'] = ('application/vnd.apache.parquet', 'reporte_calificaciones.parquet')
+
+# Formatos de los archivos que arman los trabajos en segundo plano
+FORMATOS_ARCHIVO = {
+    'csv.gz': ('application/gzip', 'reporte_calificaciones.csv.gz'),
+    'zip': ('application/zip', 'reporte_calificaciones.zip'),
+}
+
+CERO = Decimal('0.00')
+
+
+def leer_por_trozos(qs, tamano=TAMANO_TROZO):
+    """
+    Recorre 'qs' (de CalificacionPivote, ya filtrado) de a 'tamano' filas,
+    por clave (id > último visto) y no con OFFSET ni '.iterator()': con
+    MySQL el driver trae el resultado completo de una consulta al cliente
+    aunque se itere por partes; así cada consulta trae solo un trozo.
+    Entrega listas de FilaCalificacion, en el orden de la PK.
+    """
+    valores = valores_calificaciones(qs).order_by('pk')
+    ultimo = None
+    while True:
+        trozo = valores if ultimo is None else valores.filter(pk__gt=ultimo)
+        filas = [fila_calificacion(tupla) for tupla in trozo[:tamano]]
+        if not filas:
+            return
+        yield filas
+        if len(filas) < tamano:
+            return
+        ultimo = filas[-1].pk
+
+
+def fila_csv(calif):
+    """Los valores de una fila del CSV (los factores que no tiene, en 0.00)."""
+    fila = [
+        calif.anio or '',
+        calif.nombre_mercado or '',
+        calif.nombre_instrumento or '',
+        calif.fecha_pago.strftime('%d-%m-%Y') if calif.fecha_pago else '',
+        calif.secuencia_evento or '',
+        calif.evento_capital or '',
+        '' if calif.valor_historico is None else calif.valor_historico,
+        calif.nombre_estado or '',
+        'Archivo' if calif.origen == 'archivo' else 'Manual',
+    ]
+    fila.extend(CERO if valor is None else valor for valor in calif.factores)
+    return fila
+
+
+def csv_por_partes(qs, tamano=TAMANO_TROZO, al_avanzar=None):
+    """
+    El CSV de la exportación (';' para Excel en español, con BOM UTF-8)
+    como bytes, una parte por trozo de filas. 'al_avanzar(filas)' recibe
+    las filas escritas hasta el momento.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=';')
+    buffer.write('\ufeff') # BOM para que Excel reconozca UTF-8
+    writer.writerow(CABECERAS_CSV)
+    total = 0
+    # La cabecera sale de inmediato, antes de la primera consulta
+    for filas in chain([[]], leer_por_trozos(qs, tamano)):
+        writer.writerows(fila_csv(calif) for calif in filas)
+        yield buffer.getvalue().encode('utf-8')
+        if filas and al_avanzar:
+            total += len(filas)
+            al_avanzar(total)
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def comprimir_gzip(partes, nivel=6):
+    """Comprime las partes en formato gzip a medida que llegan."""
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # (16+: cabecera gzip)
+    for parte in partes:
+        comprimido = compresor.compress(parte)
+        if comprimido:
+            yield comprimido
+    yield compresor.flush()
+
+
+# ==========================================================
+#  PARQUET (columnas con tipo, para análisis)
+# ==========================================================
+# Los factores van como decimal(18, 8) (igual que en la BBDD), no como texto
+# (y los que la calificación no tiene, en NULL en vez de 0.00), y Mercado, Instrumento, Estado y Origen como diccionario (cada nombre se
+# guarda una vez). Las filas se escriben en grupos ("row groups") de hasta
+# FILAS_POR_GRUPO a medida que se leen: la memoria queda acotada por un grupo.
+FILAS_POR_GRUPO = 50000
+_DICCIONARIO = ('mercado', 'instrumento', 'estado', 'origen')
+
+
+def esquema_parquet():
+    """Las columnas del Parquet (los nombres de la tabla pivote; factores 'F08'..'F37')."""
+    texto_diccionario = pyarrow.dictionary(pyarrow.int32(), pyarrow.string())
+    return pyarrow.schema(
+        [
+            ('ejercicio', pyarrow.string()),
+            ('mercado', texto_diccionario),
+            ('instrumento', texto_diccionario),
+            ('fecha_pago', pyarrow.date32()),
+            ('secuencia_evento', pyarrow.string()),
+            ('evento_capital', pyarrow.string()),
+            ('valor_historico', pyarrow.decimal128(15, 2)),
+            ('estado', texto_diccionario),
+            ('origen', texto_diccionario),
+        ]
+        + [(codigo, pyarrow.decimal128(18, 8)) for codigo in CODIGOS]
+    )
+
+
+def _lote_arrow(filas, esquema):
+    """Un trozo de FilaCalificacion como RecordBatch de Arrow (columnar, con tipos)."""
+    columnas = {
+        'ejercicio': [calif.anio for calif in filas],
+        'mercado': [calif.nombre_mercado for calif in filas],
+        'instrumento': [calif.nombre_instrumento for calif in filas],
+        'fecha_pago': [calif.fecha_pago for calif in filas],
+        'secuencia_evento': [calif.secuencia_evento for calif in filas],
+        'evento_capital': [calif.evento_capital for calif in filas],
+        'valor_historico': [calif.valor_historico for calif in filas],
+        'estado': [calif.nombre_estado for calif in filas],
+        'origen': ['Archivo' if calif.origen == 'archivo' else 'Manual' for calif in filas],
+    }
+    for posicion, codigo in enumerate(CODIGOS):
+        columnas[codigo] = [calif.factores[posicion] for calif in filas]
+
+    arreglos = []
+    for campo in esquema:
+        if campo.name in _DICCIONARIO:
+            arreglos.append(pyarrow.array(columnas[campo.name], pyarrow.string()).dictionary_encode())
+        else:
+            arreglos.append(pyarrow.array(columnas[campo.name], campo.type))
+    return pyarrow.RecordBatch.from_arrays(arreglos, schema=esquema)
+
+
+class _SalidaPorPartes(io.RawIOBase):
+    """
+    Destino de escritura que guarda lo escrito hasta que se retira con
+    'retirar()'. Lleva la posición total (Parquet la usa en su índice final).
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.partes = []
+        self.posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self.partes.append(bytes(datos))
+        self.posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self.posicion
+
+    def retirar(self):
+        datos, self.partes = b''.join(self.partes), []
+        return datos
+
+
+def parquet_por_partes(qs, tamano=TAMANO_TROZO, filas_por_grupo=FILAS_POR_GRUPO):
+    """
+    La exportación como archivo Parquet (compresión zstd), en bytes: una
+    parte por grupo de filas escrito, más el índice del final.
+    """
+    esquema = esquema_parquet()
+    salida = _SalidaPorPartes()
+    escritor = pyarrow.parquet.ParquetWriter(salida, esquema, compression='zstd')
+    yield salida.retirar() # (La cabecera 'PAR1' sale de inmediato)
+    lotes, pendientes = [], 0
+    for filas in leer_por_trozos(qs, tamano):
+        lotes.append(_lote_arrow(filas, esquema))
+        pendientes += len(filas)
+        if pendientes >= filas_por_grupo:
+            escritor.write_table(pyarrow.Table.from_batches(lotes, esquema), row_group_size=pendientes)
+            lotes, pendientes = [], 0
+            yield salida.retirar()
+    if lotes:
+        escritor.write_table(pyarrow.Table.from_batches(lotes, esquema), row_group_size=pendientes)
+    escritor.close()
+    yield salida.retirar()
+
+
+def exportar(qs, formato='csv'):
+    """Las partes (bytes) del archivo de exportación en el 'formato' pedido (ver FORMATOS)."""
+    if formato == 'parquet':
+        return parquet_por_partes(qs, TAMANO_TROZO)
+    partes = csv_por_partes(qs, TAMANO_TROZO)
+    if formato == 'csv.gz':
+        return comprimir_gzip(partes)
+    return partes
+
+
+def escribir_archivo(qs, formato, destino, al_avanzar=None):
+    """
+    Escribe la exportación de 'qs' en 'destino' (un archivo binario abierto)
+    en el 'formato' pedido (ver FORMATOS_ARCHIVO), por partes: la memoria
+    no crece con el tamaño del reporte.
+    """
+    partes = csv_por_partes(qs, TAMANO_TROZO, al_avanzar)
+    if formato == 'zip':
+        nombre_csv = FORMATOS['csv'][1]
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+            with archivo_zip.open(nombre_csv, 'w', force_zip64=True) as salida: # (zip64: sin límite de 4 GB)
+                for parte in partes:
+                    salida.write(parte)
+    else:
+        for parte in comprimir_gzip(partes):
+            destino.write(parte)
@@ -0,0 +1,232 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+# (Este módulo NO importa Django: lo usan también los procesos del pool
+# de validación de la Carga Masiva, a través de 'validacion')
+
+
+# ==========================================================
+#  TABLAS DE FACTORES (precalculadas una sola vez)
+# ==========================================================
+# Todos los "vectores" de este módulo tienen 30 posiciones, en este orden:
+# F08..F19 (base), F20..F33 (calculados) y F34..F37 (directos).
+CODIGOS_BASE = tuple(f'F{n:02d}' for n in range(8, 20))        # 8-19: denominador
+CODIGOS_CALCULADOS = tuple(f'F{n:02d}' for n in range(20, 34)) # 20-33: monto / suma(8-19)
+CODIGOS_DIRECTOS = tuple(f'F{n:02d}' for n in range(34, 38))   # 34-37: se copian (TEF, TEX, ...)
+CODIGOS = CODIGOS_BASE + CODIGOS_CALCULADOS + CODIGOS_DIRECTOS
+
+# Campos del formulario y del serializer ('factor_08' -> 'F08')
+CAMPOS_BASE = tuple(f'factor_{codigo[1:]}' for codigo in CODIGOS_BASE)
+CAMPOS_CALCULADOS = tuple(f'factor_{codigo[1:]}' for codigo in CODIGOS_CALCULADOS)
+CAMPOS_DIRECTOS = tuple(f'factor_{codigo[1:]}' for codigo in CODIGOS_DIRECTOS)
+CAMPOS = CAMPOS_BASE + CAMPOS_CALCULADOS + CAMPOS_DIRECTOS
+CODIGO_POR_CAMPO = dict(zip(CAMPOS, CODIGOS))
+
+# Descripción corta (API y Carga Masiva de Montos): 'F08' -> 'Factor-08'
+DESCRIPCIONES = {codigo: f'Factor-{codigo[1:]}' for codigo in CODIGOS}
+
+# Etiqueta completa (formulario de Ingreso/Modificación)
+ETIQUETAS = {
+    'F08': 'Factor-08 No Constitutiva de Renta No Acogido a Impto',
+    'F09': 'Factor-09 Impto. 1ra Caetg. Afecto GI. Comp. Con Devolución',
+    'F10': 'Factor-10 Impuesto Tasa Adicional Exento Art. 21',
+    'F11': 'Factor-11 Incremento Impuesto 1ra Categoría',
+    'F12': 'Factor-12 Impto. 1ra Categ Exento GI. Comp. Con Devolución',
+    'F13': 'Factor-13 Impto. 1ra Categ. Afecto GI. Comp. Sin Devoución',
+    'F14': 'Factor-14 Impto. 1ra Categg. Exento GI. Comp. Sin Devolución',
+    'F15': 'Factor-15 Impro. Créditos pro Impuestos Externos',
+    'F16': 'Factor-16 No Constitutiva de Renta Acogido a Impto.',
+    'F17': 'Factor-17 No Constitutiva de Renta de Renta Devolución de Capital Art. 17',
+    'F18': 'Factor-18 Rentas Extentas de Impro GC Y/O Impto Adicional',
+    'F19': 'Factor-19 Ingreso no Constitutivos de Renta',
+    'F20': 'Factor-20 Sin Derecho a Devolución',
+    'F21': 'Factor-21 Con Derecho a Devolución',
+    'F22': 'Factor-22 Sin Derecho a Devolución',
+    'F23': 'Factor-23 Con Derecho a Devolución',
+    'F24': 'Factor-24 Sin Derecho a Devolución',
+    'F25': 'Factor-25 Con Derecho a Devolución',
+    'F26': 'Factor-26 Sin Derecho a Devolución',
+    'F27': 'Factor-27 Con Derecho a Devolución',
+    'F28': 'Factor-28 Credito por IPE',
+    'F29': 'Factor-29 Sin Derecho a Devolución',
+    'F30': 'Factor-30 Con Derecho a Devolución',
+    'F31': 'Factor-31 Sin Derecho a Devolución',
+    'F32': 'Factor-32 Con Derecho a Devolución',
+    'F33': 'Factor-33 Credito por IPE',
+    'F34': 'Factor-34 Cred. Por Impto.',
+    'F35': 'Factor-35 Tasa Efectiva Del Cred. Del FUT (TEF)',
+    'F36': 'Factor-36 Tasa Efectiva Del Cred. Del FUNT (TEX)',
+    'F37': 'Factor-37 Devolución de Capital Art. 17 num 7 LIR',
+}
+
+N_BASE = len(CODIGOS_BASE)                            # 12
+N_CALCULADOS = N_BASE + len(CODIGOS_CALCULADOS)       # 26 (los que se dividen)
+N_FACTORES = len(CODIGOS)                             # 30
+
+PRECISION = Decimal('0.00000001') # 8 decimales (como la columna 'valor_factor')
+ESCALA = 10 ** 8
+CERO = Decimal('0.0')
+CERO_FACTOR = Decimal('0E-8') # Un cero ya cuantizado a 8 decimales
+
+
+# ==========================================================
+#  CAMINO DECIMAL (el de referencia)
+# ==========================================================
+def a_decimal(valor):
+    """
+    Decimal de un monto o factor: None o '' = 0; acepta Decimal, int, float
+    (por su texto, ej. 0.1 -> '0.1') o texto. Rechaza textos inválidos,
+    NaN e Infinito con un ValueError.
+    """
+    if isinstance(valor, Decimal):
+        numero = valor
+    elif valor is None or valor == '':
+        return CERO
+    elif isinstance(valor, bool):
+        raise ValueError(f"Valor numérico inválido '{valor}'.")
+    else:
+        try:
+            numero = Decimal(str(valor) if isinstance(valor, float) else valor)
+        except (ArithmeticError, TypeError, ValueError):
+            numero = None
+    if numero is None or not numero.is_finite():
+        raise ValueError(f"Valor numérico inválido '{valor}'.")
+    return numero
+
+
+def calcular_factores(montos):
+    """
+    La regla Montos -> Factores sobre un vector de 30 montos (Decimal,
+    F08..F37) y devuelve el vector de 30 factores:
+    - F08..F33 = monto / suma(F08..F19), cuantizado a 8 decimales (ROUND_HALF_UP).
+      Si la suma no es positiva, todos son 0.
+    - F34..F37 se copian tal cual.
+    """
+    suma = sum(montos[:N_BASE])
+    if suma > 0:
+        calculados = [(monto / suma).quantize(PRECISION, rounding=ROUND_HALF_UP) for monto in montos[:N_CALCULADOS]]
+    else:
+        calculados = [CERO_FACTOR] * N_CALCULADOS
+    calculados.extend(montos[N_CALCULADOS:N_FACTORES])
+    return tuple(calculados)
+
+
+def calcular_factores_lote(filas):
+    """
+    Varias filas de una vez: cada fila es un vector de 30 montos (Decimal,
+    texto o número; ver 'a_decimal'). Devuelve una lista de vectores de factores.
+    """
+    lote = []
+    for fila in filas:
+        montos = [a_decimal(valor) for valor in fila]
+        if len(montos) != N_FACTORES:
+            raise ValueError(f'Se esperaban {N_FACTORES} montos y llegaron {len(montos)}.')
+        lote.append(calcular_factores(montos))
+    return lote
+
+
+def factores_desde_campos(datos, ingreso_por_montos):
+    """
+    Factores a guardar ({codigo: valor}, sin los ceros) desde los campos
+    'factor_08'..'factor_37' de un formulario o serializer. Si son montos
+    se aplica la regla; si no, los valores ya son los factores.
+    """
+    valores = [datos.get(campo) or CERO for campo in CAMPOS]
+    if ingreso_por_montos:
+        valores = calcular_factores(valores)
+    return {codigo: valor for codigo, valor in zip(CODIGOS, valores) if valor} # (Decimal cero es falso)
+
+
+# ==========================================================
+#  CAMINO RÁPIDO (enteros escalados, de texto a texto)
+# ==========================================================
+# Para la calculadora y las cargas en texto (JSON/CSV): en vez de crear
+# un Decimal por celda y dividir, los montos se leen como enteros a la
+# misma escala y cada factor es una división entera con redondeo
+# ROUND_HALF_UP. El resultado es el mismo texto que 'format(factor, "f")'
+# del camino Decimal (ver la prueba 'test_camino_rapido_igual_a_decimal').
+def _entero_escalado(texto):
+    """
+    '1234.50' -> (123450, 2). None si no es un número simple no negativo
+    (negativos, exponentes, espacios...): esa fila va por el camino Decimal.
+    """
+    if type(texto) is int:
+        return (texto, 0) if texto >= 0 else None
+    if texto is None or texto == '':
+        return (0, 0)
+    if type(texto) is not str or not texto.isascii():
+        return None
+    entero, _, decimales = texto.partition('.')
+    if not (entero or decimales):
+        return None
+    for parte in (entero, decimales):
+        if parte and not parte.isdigit():
+            return None
+    return int(entero + decimales), len(decimales)
+
+
+def _montos_enteros(textos):
+    """Los montos (a una misma escala) de la fila, o None si hay que usar el camino Decimal."""
+    try:
+        junto = ''.join(textos)
+    except TypeError: # (Algún valor no es texto: Decimal, int, None...)
+        junto = None
+    if junto is not None and junto.isascii() and (junto.isdigit() or not junto):
+        # Lo más común (montos en pesos): todos enteros, una sola comprobación por fila
+        return [int(texto) if texto else 0 for texto in textos]
+
+    escalados = []
+    for texto in textos:
+        escalado = _entero_escalado(texto)
+        if escalado is None:
+            return None
+        escalados.append(escalado)
+    # Todos los montos a la misma escala (la mayor cantidad de decimales)
+    escala = max(decimales for _, decimales in escalados)
+    return [entero * 10 ** (escala - decimales) for entero, decimales in escalados]
+
+
+def _factores_texto_rapido(fila):
+    """Los 26 factores calculados como texto, o None si hay que usar el camino Decimal."""
+    montos = _montos_enteros(fila[:N_CALCULADOS])
+    if montos is None:
+        return None
+    suma = sum(montos[:N_BASE])
+    if suma <= 0:
+        return ['0.00000000'] * N_CALCULADOS
+
+    # factor = (2 * monto * 10^8 + suma) // (2 * suma): división entera con ROUND_HALF_UP
+    doble_suma = 2 * suma
+    # Si el resto queda "casi" en 2 * suma, el valor exacto está apenas bajo la
+    # mitad: el camino Decimal divide a 28 dígitos antes de redondear y podría
+    # subir. Para dar siempre lo mismo, esas filas se resuelven con Decimal.
+    casi_mitad = doble_suma - suma // 10 ** 6
+    factores = []
+    for monto in montos:
+        cociente, resto = divmod(2 * ESCALA * monto + suma, doble_suma)
+        if resto >= casi_mitad or cociente >= 10 ** 20: # (10^20: fuera de rango, que Decimal dé el error)
+            return None
+        factores.append('%d.%08d' % divmod(cociente, ESCALA))
+    return factores
+
+
+def _directos_texto(fila):
+    """F34..F37 como texto: se copian, y los vacíos (o cero) salen '0.00', como siempre en la calculadora."""
+    return [format(a_decimal(valor), 'f') if valor else '0.00' for valor in fila[N_CALCULADOS:]]
+
+
+def calcular_factores_texto(filas):
+    """
+    Como 'calcular_factores_lote', pero recibe y devuelve texto (cada
+    factor en notación fija, ej. '0.00000069'). Usa el camino rápido de
+    enteros escalados y, fila a fila, el camino Decimal cuando no aplica.
+    """
+    lote = []
+    for fila in filas:
+        if len(fila) != N_FACTORES:
+            raise ValueError(f'Se esperaban {N_FACTORES} montos y llegaron {len(fila)}.')
+        calculados = _factores_texto_rapido(fila)
+        if calculados is None:
+            calculados = [format(factor, 'f') for factor in calcular_factores_lote([fila])[0][:N_CALCULADOS]]
+        calculados.extend(_directos_texto(fila))
+        lote.append(calculados)
+    return lote
@@ -1,9 +1,13 @@
 from django import forms
 from instrumentos.models import Mercado, Instrumento
+from usuarios.models import Estado
 from .models import Calificacion, Calificaciontributaria, Factortributario
 import datetime
 from decimal import Decimal
 
+# Tablas de factores (códigos, campos y etiquetas)
+from .factores import CAMPOS_BASE, CAMPOS_CALCULADOS, CAMPOS_DIRECTOS, CODIGO_POR_CAMPO, ETIQUETAS
+
 # --- Definiciones de Años ---
 YEAR_CHOICES_FILTER = [(y, y) for y in range(datetime.date.today().year, datetime.date.today().year - 10, -1)]
 YEAR_CHOICES_CREATE = [(y, y) for y in range(datetime.date.today().year + 1, datetime.date.today().year - 10, -1)]
@@ -37,24 +41,66 @@ class CalificacionFilterForm(forms.Form):
         label='Origen',
         widget=forms.Select(attrs={'class': 'form-select'})
     )
+    instrumento = forms.CharField(
+        max_length=100,
+        required=False,
+        label='Instrumento',
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Nombre exacto'})
+    )
+    estado = forms.ModelChoiceField(
+        queryset=Estado.objects.all(),
+        required=False,
+        label='Estado',
+        empty_label='-- Todos los Estados --',
+        widget=forms.Select(attrs={'class': 'form-select'})
+    )
+    # Rangos de fechas (ambos extremos incluidos)
+    fecha_pago_desde = forms.DateField(
+        required=False, label='Fecha de pago desde',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    fecha_pago_hasta = forms.DateField(
+        required=False, label='Fecha de pago hasta',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    fecha_registro_desde = forms.DateField(
+        required=False, label='Registrada desde',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    fecha_registro_hasta = forms.DateField(
+        required=False, label='Registrada hasta',
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+
+    FECHAS = ('fecha_pago_desde', 'fecha_pago_hasta', 'fecha_registro_desde', 'fecha_registro_hasta')
+
+    def filtros(self):
+        """
+        Los filtros elegidos como dict simple (se guarda en JSON, ej. en un
+        TrabajoExportacion). Si el formulario no es válido, sin filtros.
+        """
+        datos = self.cleaned_data if self.is_valid() else {}
+        mercado = datos.get('mercado')
+        estado = datos.get('estado')
+        filtros = {
+            'mercado': mercado.pk if mercado else None,
+            'anio': datos.get('anio') or '',
+            'origen': datos.get('origen') or '',
+            'instrumento': datos.get('instrumento') or '',
+            'estado': estado.pk if estado else None,
+        }
+        for campo in self.FECHAS:
+            filtros[campo] = datos[campo].isoformat() if datos.get(campo) else ''
+        return filtros
 
 # --- CAMBIO: Definición de grupos de factores (ahora con Factor 19) ---
+# (Las tablas viven en el motor de factores, 'calificaciones/factores.py')
 # Factores base para el cálculo del denominador (8-19)
-FACTORES_BASE_UI = [
-    'factor_08', 'factor_09', 'factor_10', 'factor_11', 'factor_12', 
-    'factor_13', 'factor_14', 'factor_15', 'factor_16', 'factor_17', 
-    'factor_18', 'factor_19' # <-- CAMBIO de 19A a 19
-]
+FACTORES_BASE_UI = list(CAMPOS_BASE)
 # Factores que son calculados (numerador / suma(8-19))
-FACTORES_CALCULADOS_UI = [
-    'factor_20', 'factor_21', 'factor_22', 'factor_23', 'factor_24',
-    'factor_25', 'factor_26', 'factor_27', 'factor_28', 'factor_29',
-    'factor_30', 'factor_31', 'factor_32', 'factor_33'
-]
+FACTORES_CALCULADOS_UI = list(CAMPOS_CALCULADOS)
 # Factores de ingreso directo (TEF, TEX, etc.)
-FACTORES_DIRECTOS_UI = [
-    'factor_34', 'factor_35', 'factor_36', 'factor_37'
-]
+FACTORES_DIRECTOS_UI = list(CAMPOS_DIRECTOS)
 
 # ==========================================================
 #  CLASE 2: Formulario de Creación/Edición (HD-2)
@@ -105,54 +151,20 @@ class CalificacionForm(forms.Form):
         super().__init__(*args, **kwargs)
         
         # --- CAMBIO: Nombres de factores ahora usa 19 (no 19A) ---
-        nombres_factores = {
-            'factor_08': 'Factor-08 No Constitutiva de Renta No Acogido a Impto',
-            'factor_09': 'Factor-09 Impto. 1ra Caetg. Afecto GI. Comp. Con Devolución',
-            'factor_10': 'Factor-10 Impuesto Tasa Adicional Exento Art. 21',
-            'factor_11': 'Factor-11 Incremento Impuesto 1ra Categoría',
-            'factor_12': 'Factor-12 Impto. 1ra Categ Exento GI. Comp. Con Devolución',
-            'factor_13': 'Factor-13 Impto. 1ra Categ. Afecto GI. Comp. Sin Devoución',
-            'factor_14': 'Factor-14 Impto. 1ra Categg. Exento GI. Comp. Sin Devolución',
-            'factor_15': 'Factor-15 Impro. Créditos pro Impuestos Externos',
-            'factor_16': 'Factor-16 No Constitutiva de Renta Acogido a Impto.',
-            'factor_17': 'Factor-17 No Constitutiva de Renta de Renta Devolución de Capital Art. 17',
-            'factor_18': 'Factor-18 Rentas Extentas de Impro GC Y/O Impto Adicional',
-            'factor_19': 'Factor-19 Ingreso no Constitutivos de Renta', 
-            'factor_20': 'Factor-20 Sin Derecho a Devolución',
-            'factor_21': 'Factor-21 Con Derecho a Devolución',
-            'factor_22': 'Factor-22 Sin Derecho a Devolución',
-            'factor_23': 'Factor-23 Con Derecho a Devolución',
-            'factor_24': 'Factor-24 Sin Derecho a Devolución',
-            'factor_25': 'Factor-25 Con Derecho a Devolución',
-            'factor_26': 'Factor-26 Sin Derecho a Devolución',
-            'factor_27': 'Factor-27 Con Derecho a Devolución',
-            'factor_28': 'Factor-28 Credito por IPE',
-            'factor_29': 'Factor-29 Sin Derecho a Devolución',
-            'factor_30': 'Factor-30 Con Derecho a Devolución',
-            'factor_31': 'Factor-31 Sin Derecho a Devolución',
-            'factor_32': 'Factor-32 Con Derecho a Devolución',
-            'factor_33': 'Factor-33 Credito por IPE',
-            'factor_34': 'Factor-34 Cred. Por Impto.',
-            'factor_35': 'Factor-35 Tasa Efectiva Del Cred. Del FUT (TEF)',
-            'factor_36': 'Factor-36 Tasa Efectiva Del Cred. Del FUNT (TEX)',
-            'factor_37': 'Factor-37 Devolución de Capital Art. 17 num 7 LIR',
-        }
-
         todos_los_factores = FACTORES_BASE_UI + FACTORES_CALCULADOS_UI + FACTORES_DIRECTOS_UI
         for nombre_campo in todos_los_factores:
-            if nombre_campo in nombres_factores:
-                self.fields[nombre_campo] = forms.DecimalField(
-                    label=nombres_factores[nombre_campo],
-                    required=False,
-                    initial=Decimal('0.00'),
-                    max_digits=18,
-                    decimal_places=8,
-                    widget=forms.NumberInput(attrs={
-                        'class': 'form-control',
-                        'placeholder': '0.00',
-                        'step': '0.00000001'
-                    })
-                )
+            self.fields[nombre_campo] = forms.DecimalField(
+                label=ETIQUETAS[CODIGO_POR_CAMPO[nombre_campo]],
+                required=False,
+                initial=Decimal('0.00'),
+                max_digits=18,
+                decimal_places=8,
+                widget=forms.NumberInput(attrs={
+                    'class': 'form-control',
+                    'placeholder': '0.00',
+                    'step': '0.00000001'
+                })
+            )
 
     def clean(self):
         cleaned_data = super().clean()
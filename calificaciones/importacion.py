@@ -0,0 +1,746 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from collections import deque
+from decimal import Decimal, ROUND_HALF_UP
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+import codecs
+import csv
+import hashlib
+import multiprocessing
+
+# Modelos
+from .models import Calificacion, Calificaciontributaria, Factortributario
+from auditoria.models import Log
+from archivos.models import Archivo, ErrorImportacion
+from usuarios.models import Estado
+
+# Resolver de Instrumento/Mercado (IDs desde memoria)
+from instrumentos.resolver import ResolverCatalogos
+
+# Tabla pivote (una fila por calificación, con los factores en columnas)
+from .pivote import fila_pivote, guardar_pivote, escritura_pivote
+from .factores import PRECISION
+
+# Validación de filas (Python puro, sin BBDD: también corre en el pool de procesos)
+from .validacion import (
+    CABECERAS_BASE, CABECERAS_FACTORES_CSV, CABECERAS_MONTOS_CSV,
+    validar_fila_factores, validar_fila_montos, validar_bloque,
+)
+
+
+# Cantidad de filas que se validan en memoria y se escriben juntas
+# (por defecto; se configura con IMPORTACION_TAMANO_LOTE en settings)
+TAMANO_LOTE = 1000
+
+# Procesos que validan lotes en paralelo (por defecto; IMPORTACION_PROCESOS).
+# Con 1 se valida en el mismo proceso, sin pool.
+PROCESOS_VALIDACION = 1
+
+
+# ==========================================================
+#  LECTURA INCREMENTAL DEL CSV SUBIDO (memoria constante)
+# ==========================================================
+def _lineas_texto(archivo_subido, encoding='utf-8-sig'):
+    """
+    Decodifica el archivo subido trozo a trozo ('chunks()') y entrega
+    sus líneas de texto, sin cargar el archivo completo en memoria.
+    'utf-8-sig' descarta el BOM que agrega Excel al inicio del archivo.
+    """
+    decodificador = codecs.getincrementaldecoder(encoding)()
+    pendiente = ''
+    for trozo in archivo_subido.chunks():
+        pendiente += decodificador.decode(trozo)
+        # Cortamos sólo en '\n' (un '\r\n' partido entre trozos queda completo)
+        *lineas, pendiente = pendiente.split('\n')
+        for linea in lineas:
+            yield linea + '\n'
+    pendiente += decodificador.decode(b'', final=True)
+    if pendiente:
+        yield pendiente
+
+
+def leer_csv_subido(archivo_subido, delimiter=','):
+    """
+    DictReader sobre el archivo subido, leído de forma incremental.
+    Reemplaza a 'archivo.read().decode()' + 'io.StringIO'.
+    """
+    return csv.DictReader(_lineas_texto(archivo_subido), delimiter=delimiter)
+
+
+def leer_lotes(reader, tamano_lote=TAMANO_LOTE):
+    """
+    Agrupa las filas del 'reader' en lotes de tamaño fijo de
+    (numero_linea, fila). Empieza en 2 (contando la cabecera).
+    """
+    lote = []
+    for i, fila in enumerate(reader, 2):
+        lote.append((i, fila))
+        if len(lote) >= tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def validar_lotes(reader, validar_fila, tamano_lote=TAMANO_LOTE, procesos=1):
+    """
+    Valida el 'reader' por lotes y entrega, en el orden del archivo,
+    (cantidad_filas, (filas_ok, errores)) de cada lote (ver 'validar_bloque').
+
+    Con 'procesos' > 1 los lotes se validan en paralelo en un pool de procesos.
+    'spawn': los procesos hijos no heredan la conexión a la BBDD ni los
+    hilos del servidor ('validacion' no necesita Django para funcionar).
+    """
+    lotes = leer_lotes(reader, tamano_lote)
+    if procesos <= 1:
+        for lote in lotes:
+            yield len(lote), validar_bloque(validar_fila, lote)
+        return
+
+    cabeceras = list(getattr(reader, 'fieldnames', None) or [])
+    contexto = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+        en_vuelo = deque() # [(cantidad_filas, futuro)] en el orden del archivo
+        for lote in lotes:
+            if not cabeceras:
+                cabeceras = list(lote[0][1])
+            # Cada fila viaja como tupla de valores (sin repetir las claves)
+            bloque = [(i, tuple(fila.get(c) for c in cabeceras)) for i, fila in lote]
+            en_vuelo.append((len(lote), pool.submit(validar_bloque, validar_fila, bloque, cabeceras)))
+
+            # Como máximo 2 lotes por proceso en vuelo: la memoria no crece con el archivo
+            if len(en_vuelo) >= 2 * procesos:
+                cantidad, futuro = en_vuelo.popleft()
+                yield cantidad, futuro.result()
+        while en_vuelo:
+            cantidad, futuro = en_vuelo.popleft()
+            yield cantidad, futuro.result()
+
+
+# ==========================================================
+#  AUXILIAR: bulk_create que recupera las PK
+# ==========================================================
+def bulk_create_con_ids(manager, objetos, **filtro):
+    """
+    Inserta 'objetos' con un bulk_create y les asigna su PK.
+
+    MySQL no devuelve los IDs generados en un INSERT múltiple, así que
+    los recuperamos releyendo las filas nuevas que cumplen 'filtro'
+    (ordenadas por PK, que es creciente dentro de un mismo INSERT).
+    El 'filtro' debe identificar filas que sólo este proceso inserta
+    (ej. las de un Archivo concreto o los hijos de padres recién creados).
+    """
+    if connection.features.can_return_rows_from_bulk_insert:
+        # (PostgreSQL, SQLite, MariaDB) Django ya asigna las PK
+        return manager.bulk_create(objetos)
+
+    pk = manager.model._meta.pk.attname
+    ultimo_id = manager.filter(**filtro).aggregate(ultimo=Max(pk))['ultimo'] or 0
+    manager.bulk_create(objetos)
+
+    ids = list(
+        manager.filter(**filtro, **{f'{pk}__gt': ultimo_id})
+        .order_by(pk)
+        .values_list(pk, flat=True)
+    )
+    if len(ids) != len(objetos):
+        raise RuntimeError(
+            f'No se pudieron recuperar los IDs insertados en {manager.model._meta.db_table} '
+            f'({len(ids)} de {len(objetos)}).'
+        )
+    for obj, id_nuevo in zip(objetos, ids):
+        setattr(obj, pk, id_nuevo)
+        obj._state.adding = False
+    return objetos
+
+
+
+
+# ==========================================================
+#  MOTOR DE CARGA MASIVA POR LOTES
+# ==========================================================
+class CargaMasiva:
+    """
+    Procesa las filas de un CSV por lotes:
+    1. Valida cada fila del lote en memoria (sin consultas). Con
+       IMPORTACION_PROCESOS > 1 los lotes se validan en paralelo en un
+       pool de procesos, y sus resultados se escriben en el orden del archivo.
+    2. Escribe Calificacion, Calificaciontributaria y Factortributario
+       de todo el lote con unos pocos 'bulk_create' en una transacción.
+       Si la clave natural (mercado, instrumento, anio, secuencia, evento)
+       ya existe para el usuario, actualiza lo que cambió en vez de duplicar.
+    3. Si el lote falla en la BBDD, lo divide en mitades (bisección)
+       hasta aislar las filas culpables: solo esas se rechazan.
+
+    Mantiene el reporte fila-a-fila: cada error queda en 'ErrorImportacion'
+    (línea, columna, código y mensaje, un 'bulk_create' por lote) y cada
+    calificación queda enlazada a su 'Archivo'.
+    """
+
+    def __init__(self, archivo, usuario, estado_valido, estado_invalido,
+                 validar_fila=validar_fila_factores, tamano_lote=None,
+                 resolver=None, al_avanzar=None, procesos=None):
+        self.archivo = archivo
+        self.usuario = usuario
+        self.estado_valido = estado_valido
+        self.estado_invalido = estado_invalido
+        self.validar_fila = validar_fila
+        self.tamano_lote = tamano_lote or getattr(settings, 'IMPORTACION_TAMANO_LOTE', TAMANO_LOTE)
+        self.procesos = procesos or getattr(settings, 'IMPORTACION_PROCESOS', PROCESOS_VALIDACION)
+
+        # Contadores y log de errores
+        self.registros_validos = 0
+        self.registros_invalidos = 0
+        self.registros_guardados = 0 # (válidos + inválidos por suma, ya escritos)
+        self.registros_actualizados = 0 # (de los guardados: ya existían y cambiaron)
+        self.registros_sin_cambios = 0  # (de los guardados: ya existían idénticos)
+        self.errores_guardados = 0 # (filas en 'ErrorImportacion')
+
+        # Instrumento/Mercado por nombre: dos consultas por archivo, no por fila
+        self.resolver = resolver or ResolverCatalogos()
+
+        # Opcional: función que se llama tras cada lote (ej. progreso de un trabajo)
+        self.al_avanzar = al_avanzar
+        self.filas_procesadas = 0
+
+    def procesar(self, reader):
+        """
+        Recorre el 'reader' (filas tipo DictReader) y procesa por lotes.
+        """
+        with closing(validar_lotes(reader, self.validar_fila, self.tamano_lote, self.procesos)) as validados:
+            for cantidad, (filas_ok, errores_lote) in validados:
+                self.escribir_lote(filas_ok, errores_lote)
+                self.filas_procesadas += cantidad
+                if self.al_avanzar:
+                    self.al_avanzar(self)
+
+    def procesar_lote(self, lote):
+        """
+        Valida en memoria un lote de (numero_linea, fila) y escribe las válidas.
+        """
+        filas_ok, errores_lote = validar_bloque(self.validar_fila, lote)
+        self.escribir_lote(filas_ok, errores_lote)
+
+    def escribir_lote(self, filas_ok, errores_lote):
+        """
+        Escribe un lote ya validado: 'filas_ok' son (numero_linea, FilaValidada)
+        y 'errores_lote' los (numero_linea, columna, codigo, mensaje) de la validación.
+        """
+        errores_lote = list(errores_lote)
+        if filas_ok:
+            # --- C. Buscar/Crear objetos relacionados (fuera de la transacción
+            # del lote, para que un rollback no deje IDs inválidos en el resolver) ---
+            self.resolver.precargar(
+                instrumentos={datos.instrumento for _, datos in filas_ok},
+                mercados={datos.mercado for _, datos in filas_ok},
+            )
+            # (Una clave repetida dentro del lote se escribe en una ronda posterior)
+            for ronda in self._rondas(filas_ok):
+                self._escribir_bisectando(ronda, errores_lote)
+
+        self.registros_invalidos += len(errores_lote)
+
+        # Las filas con suma de factores > 1 se guardan ('Invalido'), pero
+        # su motivo también queda en la tabla de errores
+        rechazadas = {error[0] for error in errores_lote}
+        errores_lote.extend(
+            (i, 'Factor 8-19', 'suma_factores', datos.descripcion)
+            for i, datos in filas_ok if not datos.valido and i not in rechazadas
+        )
+        self._guardar_errores(errores_lote)
+
+    def _guardar_errores(self, errores):
+        """Un 'bulk_create' con los errores del lote, en el orden del archivo."""
+        if not errores:
+            return
+        errores.sort(key=lambda error: error[0])
+        ErrorImportacion.objects.bulk_create([
+            ErrorImportacion(id_archivo=self.archivo, fila=i, columna=columna, codigo=codigo, mensaje=mensaje)
+            for i, columna, codigo, mensaje in errores
+        ])
+        self.errores_guardados += len(errores)
+
+    def _escribir_bisectando(self, filas, errores_lote):
+        """
+        Escribe 'filas' en UNA transacción. Si falla, divide en dos mitades
+        y reintenta cada una, hasta llegar a la fila individual culpable.
+        (Con k filas malas cuesta del orden de k*log2(N) transacciones
+        extra, en vez de N savepoints por lote.)
+        """
+        try:
+            # (Una transacción; la secuencia de la tabla pivote se toma al final)
+            with escritura_pivote():
+                actualizadas, sin_cambios = self._escribir(filas)
+        except Exception as e_fila:
+            if len(filas) == 1:
+                errores_lote.append((filas[0][0], None, 'bbdd', str(e_fila)))
+                return
+            mitad = len(filas) // 2
+            self._escribir_bisectando(filas[:mitad], errores_lote)
+            self._escribir_bisectando(filas[mitad:], errores_lote)
+        else:
+            self._contar(filas, actualizadas, sin_cambios)
+
+    def _contar(self, filas, actualizadas=0, sin_cambios=0):
+        self.registros_guardados += len(filas)
+        self.registros_actualizados += actualizadas
+        self.registros_sin_cambios += sin_cambios
+        for _, datos in filas:
+            if datos.valido:
+                self.registros_validos += 1
+            else:
+                self.registros_invalidos += 1
+
+    # ------------------------------------------------------
+    #  Clave natural (una calificación = una fila del archivo)
+    # ------------------------------------------------------
+    def _clave(self, datos):
+        """(mercado, instrumento, anio, secuencia_evento, evento_capital) con IDs ya resueltos."""
+        return (
+            self.resolver.id_mercado(datos.mercado),
+            self.resolver.id_instrumento(datos.instrumento),
+            datos.anio,
+            datos.secuencia_evento,
+            datos.evento_capital,
+        )
+
+    def _rondas(self, filas):
+        """
+        Reparte las filas en rondas donde cada clave aparece una sola vez
+        (en el orden del archivo). Si una clave se repite en el lote, su
+        segunda aparición se escribe en la ronda siguiente y actualiza a la primera.
+        """
+        rondas, vistas = [], {}
+        for fila in filas:
+            clave = self._clave(fila[1])
+            ronda = vistas.get(clave, 0)
+            vistas[clave] = ronda + 1
+            if ronda == len(rondas):
+                rondas.append([])
+            rondas[ronda].append(fila)
+        return rondas
+
+    def _buscar_existentes(self, filas):
+        """
+        Calificaciones activas de este usuario con la misma clave natural,
+        en dos consultas por lote (usa el índice 'calif_trib_clave_idx'):
+        {clave: {'calificacion': ..., 'tributaria': ..., 'factores': {codigo: Factortributario}}}
+        Si la clave está repetida en la BBDD se actualiza la más reciente.
+        """
+        claves = {self._clave(datos) for _, datos in filas}
+        tributarias = (
+            Calificaciontributaria.objects
+            .select_related('id_calificacion')
+            .filter(
+                secuencia_evento__in={clave[3] for clave in claves},
+                evento_capital__in={clave[4] for clave in claves},
+                anio__in={clave[2] for clave in claves},
+                id_calificacion__id_mercado_id__in={clave[0] for clave in claves},
+                id_calificacion__id_instrumento_id__in={clave[1] for clave in claves},
+                id_calificacion__id_usuario=self.usuario, # (nunca se toca lo de otro usuario)
+                id_calificacion__activo=True,
+            )
+            .order_by('id_calificacion_tributaria')
+        )
+        existentes = {}
+        for trib in tributarias:
+            calif = trib.id_calificacion
+            clave = (calif.id_mercado_id, calif.id_instrumento_id, trib.anio, trib.secuencia_evento, trib.evento_capital)
+            if clave in claves:
+                existentes[clave] = {'calificacion': calif, 'tributaria': trib, 'factores': {}}
+
+        if existentes:
+            por_tributaria = {e['tributaria'].id_calificacion_tributaria: e for e in existentes.values()}
+            for factor in Factortributario.objects.filter(id_calificacion_tributaria_id__in=list(por_tributaria)):
+                por_tributaria[factor.id_calificacion_tributaria_id]['factores'][factor.codigo_factor] = factor
+        return existentes
+
+    def _escribir(self, filas):
+        """
+        Escribe un lote de filas ya validadas (cada clave una sola vez).
+        Las claves nuevas se insertan con 'bulk_create'; las que ya existen
+        se actualizan solo si cambió algo. Debe llamarse dentro de una
+        'escritura_pivote'. Devuelve (actualizadas, sin_cambios).
+        """
+        existentes = self._buscar_existentes(filas)
+        nuevas, actualizar = [], []
+        for fila in filas:
+            existente = existentes.get(self._clave(fila[1]))
+            if existente is None:
+                nuevas.append(fila)
+            else:
+                actualizar.append((fila, existente))
+
+        if nuevas:
+            self._insertar(nuevas)
+        actualizadas = self._actualizar(actualizar) if actualizar else 0
+        return actualizadas, len(actualizar) - actualizadas
+
+    def _insertar(self, filas):
+        fecha_registro = timezone.now()
+
+        # --- D. Crear 'Calificacion' (Padres) ---
+        calificaciones = [
+            Calificacion(
+                fecha_pago=datos.fecha_pago,
+                id_usuario=self.usuario,
+                id_instrumento_id=self.resolver.id_instrumento(datos.instrumento),
+                id_mercado_id=self.resolver.id_mercado(datos.mercado),
+                id_archivo=self.archivo,
+                id_estado=self.estado_valido if datos.valido else self.estado_invalido,
+                fecha_registro=fecha_registro,
+                activo=True # Siempre activo (visible), el estado indica validez
+            )
+            for _, datos in filas
+        ]
+        bulk_create_con_ids(Calificacion.objects_all, calificaciones, id_archivo=self.archivo)
+
+        # --- E. Crear 'CalificacionTributaria' (Hijos) ---
+        tributarias = [
+            Calificaciontributaria(
+                id_calificacion=calif,
+                secuencia_evento=datos.secuencia_evento,
+                evento_capital=datos.evento_capital,
+                anio=datos.anio,
+                valor_historico=datos.valor_historico,
+                descripcion=datos.descripcion, # Guardamos el log del error aquí
+                ingreso_por_montos=datos.ingreso_por_montos
+            )
+            for calif, (_, datos) in zip(calificaciones, filas)
+        ]
+        bulk_create_con_ids(
+            Calificaciontributaria.objects, tributarias,
+            id_calificacion__in=[c.id_calificacion for c in calificaciones]
+        )
+
+        # --- F. Crear 'Factortributario' (Nietos) ---
+        # (Con los 8 decimales del motor, igual que al actualizar)
+        factores = [
+            [(codigo_db, descripcion, _redondear_factor(valor_factor)) for codigo_db, descripcion, valor_factor in datos.factores]
+            for _, datos in filas
+        ]
+        factores_para_crear = [
+            Factortributario(
+                id_calificacion_tributaria_id=trib.id_calificacion_tributaria,
+                codigo_factor=codigo_db,
+                descripcion_factor=descripcion,
+                valor_factor=valor_factor
+            )
+            for trib, factores_fila in zip(tributarias, factores)
+            for codigo_db, descripcion, valor_factor in factores_fila
+        ]
+        if factores_para_crear:
+            Factortributario.objects.bulk_create(factores_para_crear)
+
+        # --- G. Tabla pivote (con lo que ya está en memoria, sin releer) ---
+        guardar_pivote(
+            (
+                fila_pivote(calif, trib, {codigo_db: valor_factor for codigo_db, _, valor_factor in factores_fila})
+                for calif, trib, factores_fila in zip(calificaciones, tributarias, factores)
+            ),
+            nuevas=True
+        )
+
+        # --- H. Log de creación (bulk_create no dispara la señal post_save) ---
+        self._log('INSERT', 'Creación', calificaciones, fecha_registro)
+
+    def _actualizar(self, filas_existentes):
+        """
+        Actualiza las calificaciones que ya existían, solo en lo que cambió
+        (campos y factores: los distintos se actualizan, los nuevos se crean
+        y los que ya no vienen se borran). Devuelve cuántas cambiaron.
+        """
+        calificaciones, tributarias, pivote = [], [], []
+        factores_crear, factores_actualizar, factores_borrar = [], [], []
+
+        for (_, datos), existente in filas_existentes:
+            calif, trib, factores_bd = existente['calificacion'], existente['tributaria'], existente['factores']
+            estado = self.estado_valido if datos.valido else self.estado_invalido
+            valor_historico = _redondear_campo(Calificaciontributaria, 'valor_historico', datos.valor_historico)
+
+            cambio_calif = (calif.fecha_pago, calif.id_estado_id) != (datos.fecha_pago, estado.id_estado)
+            cambio_trib = (
+                (trib.valor_historico, trib.descripcion, trib.ingreso_por_montos)
+                != (valor_historico, datos.descripcion, int(datos.ingreso_por_montos))
+            )
+
+            # Diferencia de factores (comparados con los 8 decimales del motor)
+            cambio_factores = False
+            valores_nuevos = {}
+            for codigo_db, descripcion, valor_factor in datos.factores:
+                valor_factor = _redondear_factor(valor_factor)
+                valores_nuevos[codigo_db] = valor_factor
+                factor = factores_bd.get(codigo_db)
+                if factor is None:
+                    factores_crear.append(Factortributario(
+                        id_calificacion_tributaria_id=trib.id_calificacion_tributaria,
+                        codigo_factor=codigo_db,
+                        descripcion_factor=descripcion,
+                        valor_factor=valor_factor
+                    ))
+                    cambio_factores = True
+                elif (factor.valor_factor, factor.descripcion_factor) != (valor_factor, descripcion):
+                    factor.valor_factor, factor.descripcion_factor = valor_factor, descripcion
+                    factores_actualizar.append(factor)
+                    cambio_factores = True
+            for codigo_db, factor in factores_bd.items():
+                if codigo_db not in valores_nuevos:
+                    factores_borrar.append(factor.id_factor)
+                    cambio_factores = True
+
+            if not (cambio_calif or cambio_trib or cambio_factores):
+                continue # Sin cambios: ni siquiera se re-enlaza al Archivo
+
+            # La calificación queda enlazada al último Archivo que la modificó
+            calif.fecha_pago, calif.id_estado, calif.id_archivo = datos.fecha_pago, estado, self.archivo
+            calificaciones.append(calif)
+            if cambio_trib:
+                trib.valor_historico, trib.descripcion = valor_historico, datos.descripcion
+                trib.ingreso_por_montos = int(datos.ingreso_por_montos)
+                tributarias.append(trib)
+            pivote.append(fila_pivote(calif, trib, valores_nuevos))
+
+        if calificaciones:
+            Calificacion.objects_all.bulk_update(calificaciones, ['fecha_pago', 'id_estado', 'id_archivo'])
+        if tributarias:
+            Calificaciontributaria.objects.bulk_update(tributarias, ['valor_historico', 'descripcion', 'ingreso_por_montos'])
+        if factores_actualizar:
+            Factortributario.objects.bulk_update(factores_actualizar, ['valor_factor', 'descripcion_factor'])
+        if factores_crear:
+            Factortributario.objects.bulk_create(factores_crear)
+        if factores_borrar:
+            Factortributario.objects.filter(id_factor__in=factores_borrar).delete()
+        if pivote:
+            guardar_pivote(pivote)
+
+        # Log de modificación (bulk_update tampoco dispara la señal post_save)
+        self._log('UPDATE', 'Modificación', calificaciones, timezone.now())
+        return len(calificaciones)
+
+    def _log(self, accion, verbo, calificaciones, fecha):
+        # Mismo texto que la señal 'log_calificacion_post_save'
+        if self.usuario and calificaciones:
+            Log.objects.bulk_create([
+                Log(
+                    fecha=fecha,
+                    accion=accion,
+                    detalle=f'{verbo} de Calificacion ID {calif.id_calificacion} por {self.usuario.nombre}',
+                    id_usuario=self.usuario,
+                    id_calificacion=calif
+                )
+                for calif in calificaciones
+            ])
+
+
+def _redondear_campo(modelo, campo, valor):
+    """'valor' con los decimales de la columna (lo que realmente queda guardado)."""
+    decimales = modelo._meta.get_field(campo).decimal_places
+    return valor.quantize(Decimal(1).scaleb(-decimales), rounding=ROUND_HALF_UP)
+
+
+def _redondear_factor(valor):
+    """
+    Un factor con los 8 decimales del motor ('factores.PRECISION'), los de la
+    columna real y de la tabla pivote. No se usa '_redondear_campo': el
+    'valor_factor' del modelo (de inspectdb) dice 2 decimales.
+    """
+    if valor is None:
+        return None
+    return valor.quantize(PRECISION, rounding=ROUND_HALF_UP)
+
+
+# ==========================================================
+#  ARCHIVOS REPETIDOS (hash del contenido)
+# ==========================================================
+def calcular_hash_contenido(archivo_subido):
+    """SHA-256 del archivo subido, leído trozo a trozo."""
+    sha256 = hashlib.sha256()
+    for trozo in archivo_subido.chunks():
+        sha256.update(trozo)
+    return sha256.hexdigest()
+
+
+def buscar_archivo_repetido(usuario, hash_contenido):
+    """
+    El último Archivo con el mismo contenido que el usuario ya subió y que
+    no fue rechazado (procesado, o todavía en proceso: ej. un reintento
+    tras un timeout). None si el archivo es nuevo.
+    """
+    return (
+        Archivo.objects
+        .filter(id_usuario=usuario, hash_contenido=hash_contenido)
+        .exclude(estado_validacion='Rechazado')
+        .order_by('-id_archivo')
+        .first()
+    )
+
+
+# ==========================================================
+#  IMPORTACIÓN COMPLETA DE UN ARCHIVO (Vista o Worker)
+# ==========================================================
+TIPOS_CARGA = {
+    'factores': {
+        'etiqueta': 'Carga Masiva',
+        'cabeceras': CABECERAS_BASE + CABECERAS_FACTORES_CSV,
+        'validar_fila': validar_fila_factores,
+    },
+    'montos': {
+        'etiqueta': 'Carga Masiva (Montos)',
+        'cabeceras': CABECERAS_BASE + CABECERAS_MONTOS_CSV,
+        'validar_fila': validar_fila_montos,
+    },
+}
+
+
+class CabecerasInvalidas(Exception):
+    """El CSV no trae todas las cabeceras requeridas (error "todo o nada")."""
+
+    def __init__(self, faltantes):
+        self.faltantes = faltantes
+        super().__init__('Cabeceras inválidas')
+
+
+def importar_archivo(archivo, usuario, tipo, archivo_csv, al_avanzar=None):
+    """
+    Importa un CSV ya registrado como 'Archivo' (tipo 'factores' o 'montos').
+    La usan tanto las vistas de Carga Masiva como el worker en segundo plano.
+
+    Deja el Archivo 'Validado' y un Log IMPORT con el resumen, y devuelve
+    la 'CargaMasiva' con los contadores. Si ocurre un error general
+    (ej. cabeceras) deja el Archivo 'Rechazado', registra el Log y relanza
+    la excepción ('carga_parcial' indica lo que alcanzó a guardarse).
+    """
+    config = TIPOS_CARGA[tipo]
+    carga = None
+    try:
+        estado_valido = Estado.objects.get(nombre='Activo') # ID 5
+        estado_invalido = Estado.objects.get(nombre='Invalido')
+
+        # Lectura incremental (trozo a trozo): memoria constante
+        reader = leer_csv_subido(archivo_csv)
+
+        # 1. Validar cabeceras (esto sí es "todo o nada")
+        fieldnames = reader.fieldnames or []
+        faltantes = [col for col in config['cabeceras'] if col not in fieldnames]
+        if faltantes:
+            ErrorImportacion.objects.bulk_create([
+                ErrorImportacion(id_archivo=archivo, fila=1, columna=col, codigo='cabeceras',
+                                 mensaje=f"Falta la cabecera requerida '{col}'.")
+                for col in faltantes
+            ])
+            raise CabecerasInvalidas(faltantes)
+
+        # 2. Procesar por lotes (validación en memoria + bulk_create por lote)
+        carga = CargaMasiva(
+            archivo=archivo,
+            usuario=usuario,
+            estado_valido=estado_valido,
+            estado_invalido=estado_invalido,
+            validar_fila=config['validar_fila'],
+            al_avanzar=al_avanzar
+        )
+        carga.procesar(reader)
+
+        # --- 3. Finalizar Proceso ---
+        archivo.estado_validacion = 'Validado'
+        archivo.save()
+
+        # Log general
+        detalle_log = f"{config['etiqueta']}: {carga.registros_validos} válidos, {carga.registros_invalidos} inválidos desde {archivo.nombre_archivo}."
+        if carga.registros_actualizados or carga.registros_sin_cambios:
+            detalle_log += f" Ya existían: {carga.registros_actualizados} actualizados, {carga.registros_sin_cambios} sin cambios."
+        if carga.errores_guardados:
+            # (Solo el resumen: el detalle fila a fila está en 'ErrorImportacion')
+            detalle_log += f" {carga.errores_guardados} errores por fila registrados en el Archivo ID {archivo.id_archivo}."
+
+        Log.objects.create(
+            fecha=timezone.now(),
+            accion='IMPORT',
+            detalle=detalle_log,
+            id_usuario=usuario,
+            id_calificacion=None
+        )
+        return carga
+
+    except Exception as e_general:
+        # Captura errores generales (ej. cabeceras)
+        archivo.estado_validacion = 'Rechazado'
+        archivo.save()
+        Log.objects.create(
+            fecha=timezone.now(),
+            accion='IMPORT',
+            detalle=f"Error fatal en {config['etiqueta']} (archivo: {archivo.nombre_archivo}). Error: {e_general}",
+            id_usuario=usuario,
+            id_calificacion=None
+        )
+        e_general.carga_parcial = carga
+        raise
+
+
+# ==========================================================
+#  SOLO VALIDAR (sin tocar la BBDD)
+# ==========================================================
+def validar_archivo(tipo, archivo_csv, al_error, procesos=None, tamano_lote=None):
+    """
+    Revisa un CSV completo (cabeceras, fechas, números y la regla de la
+    suma de factores 8-19) SIN escribir en la BBDD.
+
+    Cada error se entrega, en el orden del archivo, a
+    'al_error(numero_linea, columna, codigo, mensaje)'.
+    Devuelve el resumen: filas leídas, válidas, con error y total de errores.
+    """
+    config = TIPOS_CARGA[tipo]
+    resumen = {'cabeceras_validas': True, 'filas': 0, 'filas_validas': 0, 'filas_con_error': 0, 'errores': 0}
+
+    reader = leer_csv_subido(archivo_csv)
+
+    # 1. Cabeceras (si faltan, no se revisan las filas)
+    fieldnames = reader.fieldnames or []
+    faltantes = [col for col in config['cabeceras'] if col not in fieldnames]
+    if faltantes:
+        resumen['cabeceras_validas'] = False
+        resumen['errores'] = len(faltantes)
+        for col in faltantes:
+            al_error(1, col, 'cabeceras', f"Falta la cabecera requerida '{col}'.")
+        return resumen
+
+    # 2. Filas (mismo validador que la importación, con el pool si está configurado)
+    procesos = procesos or getattr(settings, 'IMPORTACION_PROCESOS', PROCESOS_VALIDACION)
+    tamano_lote = tamano_lote or getattr(settings, 'IMPORTACION_TAMANO_LOTE', TAMANO_LOTE)
+    with closing(validar_lotes(reader, config['validar_fila'], tamano_lote, procesos)) as validados:
+        for cantidad, (filas_ok, errores) in validados:
+            # La suma de factores > 1 no impide guardar la fila (queda 'Invalido'),
+            # pero sí se informa como error.
+            errores.extend(
+                (i, 'Factor 8-19', 'suma_factores', datos.descripcion)
+                for i, datos in filas_ok if not datos.valido
+            )
+            errores.sort(key=lambda error: error[0])
+            for error in errores:
+                al_error(*error)
+
+            resumen['filas'] += cantidad
+            resumen['filas_con_error'] += len({error[0] for error in errores})
+            resumen['errores'] += len(errores)
+
+    resumen['filas_validas'] = resumen['filas'] - resumen['filas_con_error']
+    return resumen
+
+
+def mensaje_error_importacion(error):
+    """
+    Texto para el usuario cuando 'importar_archivo' falla.
+    (El archivo se lee por partes: un error a mitad de archivo
+    deja guardados los lotes ya procesados)
+    """
+    if isinstance(error, CabecerasInvalidas):
+        return f'El archivo CSV no tiene las cabeceras requeridas. Faltan: {", ".join(error.faltantes)}'
+    carga = getattr(error, 'carga_parcial', None)
+    if carga and carga.registros_guardados:
+        aviso = f'Se alcanzaron a guardar {carga.registros_guardados} registros antes del error.'
+    else:
+        aviso = 'No se guardó ningún registro.'
+    return f'Error al procesar el archivo: {error}. {aviso}'
@@ -0,0 +1,58 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calificaciones.trabajos import (
+    reclamar_exportacion, ejecutar_exportacion, limpiar_exportaciones_vencidas, nombre_worker
+)
+
+
+class Command(BaseCommand):
+    """
+    Worker de Exportación en segundo plano: arma los archivos .csv.gz / .zip
+    pedidos desde la Lista y borra los que ya vencieron.
+    Se pueden levantar varios en paralelo: cada uno toma trabajos distintos.
+
+    Uso:
+        python manage.py procesar_exportaciones            # queda escuchando la cola
+        python manage.py procesar_exportaciones --una-vez  # vacía la cola y termina
+    """
+    help = 'Procesa los trabajos de Exportación pendientes (TrabajoExportacion).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez', action='store_true', dest='una_vez',
+            help='Procesa los trabajos pendientes y termina (no queda escuchando).'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera entre consultas cuando la cola está vacía.'
+        )
+        parser.add_argument(
+            '--max-trabajos', type=int, default=None, dest='max_trabajos',
+            help='Termina después de procesar esta cantidad de trabajos.'
+        )
+
+    def handle(self, *args, **options):
+        worker = nombre_worker()
+        procesados = 0
+        self.stdout.write(f'Worker {worker} iniciado.')
+
+        while options['max_trabajos'] is None or procesados < options['max_trabajos']:
+            trabajo = reclamar_exportacion(worker)
+            if trabajo is None:
+                # Cola vacía: se aprovecha para borrar los archivos vencidos
+                borrados = limpiar_exportaciones_vencidas()
+                if borrados:
+                    self.stdout.write(f'{borrados} archivos vencidos borrados.')
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f'Procesando {trabajo}...')
+            trabajo = ejecutar_exportacion(trabajo)
+            procesados += 1
+            self.stdout.write(f'{trabajo}: {trabajo.mensaje}')
+
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker}: {procesados} exportaciones procesadas.'))
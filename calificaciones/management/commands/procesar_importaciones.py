@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from calificaciones.trabajos import reclamar_trabajo, ejecutar_trabajo, nombre_worker
+
+
+class Command(BaseCommand):
+    """
+    Worker de Carga Masiva en segundo plano.
+    Se pueden levantar varios en paralelo: cada uno toma archivos distintos.
+
+    Uso:
+        python manage.py procesar_importaciones            # queda escuchando la cola
+        python manage.py procesar_importaciones --una-vez  # vacía la cola y termina
+    """
+    help = 'Procesa los trabajos de Carga Masiva pendientes (TrabajoImportacion).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez', action='store_true', dest='una_vez',
+            help='Procesa los trabajos pendientes y termina (no queda escuchando).'
+        )
+        parser.add_argument(
+            '--intervalo', type=float, default=2.0,
+            help='Segundos de espera entre consultas cuando la cola está vacía.'
+        )
+        parser.add_argument(
+            '--max-trabajos', type=int, default=None, dest='max_trabajos',
+            help='Termina después de procesar esta cantidad de trabajos.'
+        )
+
+    def handle(self, *args, **options):
+        worker = nombre_worker()
+        procesados = 0
+        self.stdout.write(f'Worker {worker} iniciado.')
+
+        while options['max_trabajos'] is None or procesados < options['max_trabajos']:
+            trabajo = reclamar_trabajo(worker)
+            if trabajo is None:
+                if options['una_vez']:
+                    break
+                time.sleep(options['intervalo'])
+                continue
+
+            self.stdout.write(f'Procesando {trabajo}...')
+            trabajo = ejecutar_trabajo(trabajo)
+            procesados += 1
+            self.stdout.write(f'{trabajo}: {trabajo.mensaje}')
+
+        self.stdout.write(self.style.SUCCESS(f'Worker {worker}: {procesados} trabajos procesados.'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from calificaciones.pivote import reconstruir_pivote, TAMANO_TROZO
+
+
+class Command(BaseCommand):
+    """
+    Vuelve a armar la tabla pivote ('calificacion_pivote') desde
+    Calificacion, Calificaciontributaria y Factortributario.
+    Normalmente no hace falta (cada escritura la mantiene al día): sirve
+    tras cambios hechos directo en la BBDD o para verificar la tabla.
+
+    Uso:
+        python manage.py reconstruir_pivote
+        python manage.py reconstruir_pivote --tamano 5000
+    """
+    help = 'Reconstruye la tabla pivote de factores (una fila por calificación).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tamano', type=int, default=TAMANO_TROZO,
+            help='Calificaciones que se leen y se insertan por vez.'
+        )
+
+    def handle(self, *args, **options):
+        # Cada trozo se confirma por separado (ver 'reconstruir_pivote'):
+        # las escrituras normales no esperan a toda la reconstrucción
+        total = reconstruir_pivote(
+            tamano=options['tamano'],
+            al_avanzar=lambda total, reparadas: self.stdout.write(
+                f'{total} calificaciones ({reparadas} reparadas en este trozo)...'
+            ),
+        )
+        self.stdout.write(self.style.SUCCESS(f'Tabla pivote reconstruida: {total} calificaciones.'))
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """
+    Índice de la clave natural (secuencia_evento, evento_capital, anio) que
+    usa la Carga Masiva para actualizar en vez de duplicar.
+    'anio' es TEXT en MySQL: se indexa por prefijo, lo que un models.Index
+    no permite; por eso el SQL va a mano (la tabla es managed=False).
+    """
+
+    dependencies = [
+        ('calificaciones', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql='CREATE INDEX calif_trib_clave_idx ON calificaciontributaria (secuencia_evento, evento_capital, anio(10))',
+            reverse_sql='DROP INDEX calif_trib_clave_idx ON calificaciontributaria',
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='calificaciontributaria',
+                    index=models.Index(fields=['secuencia_evento', 'evento_capital', 'anio'], name='calif_trib_clave_idx'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,137 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def llenar_pivote(apps, schema_editor):
+    """
+    Llena la tabla pivote con las calificaciones que ya existen (por trozos
+    de IDs). Después, cada escritura la mantiene al día; para volver a
+    armarla completa: 'python manage.py reconstruir_pivote'.
+    """
+    Calificacion = apps.get_model('calificaciones', 'Calificacion')
+    Calificaciontributaria = apps.get_model('calificaciones', 'Calificaciontributaria')
+    Factortributario = apps.get_model('calificaciones', 'Factortributario')
+    CalificacionPivote = apps.get_model('calificaciones', 'CalificacionPivote')
+    columnas = {f'F{n:02d}': f'f{n:02d}' for n in range(8, 38)}
+
+    ultimo = 0
+    while True:
+        calificaciones = list(Calificacion.objects.filter(id_calificacion__gt=ultimo).order_by('id_calificacion')[:1000])
+        if not calificaciones:
+            return
+        ultimo = calificaciones[-1].id_calificacion
+        ids = [calif.id_calificacion for calif in calificaciones]
+
+        tributarias = {}
+        for trib in Calificaciontributaria.objects.filter(id_calificacion_id__in=ids).order_by('id_calificacion_tributaria'):
+            tributarias.setdefault(trib.id_calificacion_id, trib)
+        factores = {}
+        for factor in Factortributario.objects.filter(
+            id_calificacion_tributaria_id__in=[trib.pk for trib in tributarias.values()]
+        ).order_by('id_factor'):
+            factores.setdefault(factor.id_calificacion_tributaria_id, {})[factor.codigo_factor] = factor.valor_factor
+
+        filas = []
+        for calif in calificaciones:
+            trib = tributarias.get(calif.id_calificacion)
+            fila = CalificacionPivote(
+                id_calificacion_id=calif.id_calificacion,
+                id_usuario_id=calif.id_usuario_id,
+                id_instrumento_id=calif.id_instrumento_id,
+                id_mercado_id=calif.id_mercado_id,
+                id_archivo_id=calif.id_archivo_id,
+                id_estado_id=calif.id_estado_id,
+                fecha_pago=calif.fecha_pago,
+                fecha_registro=calif.fecha_registro,
+                origen='archivo' if calif.id_archivo_id else ('manual' if calif.id_usuario_id else 'bolsa'),
+                activo=calif.activo,
+            )
+            if trib is not None:
+                fila.id_calificacion_tributaria_id = trib.pk
+                fila.anio = None if trib.anio is None else str(trib.anio)
+                fila.secuencia_evento = trib.secuencia_evento
+                fila.evento_capital = trib.evento_capital
+                fila.valor_historico = trib.valor_historico
+                fila.descripcion = trib.descripcion
+                fila.ingreso_por_montos = trib.ingreso_por_montos
+                for codigo, valor in factores.get(trib.pk, {}).items():
+                    if codigo in columnas:
+                        setattr(fila, columnas[codigo], valor)
+            filas.append(fila)
+        CalificacionPivote.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+    """
+    Tabla pivote 'calificacion_pivote' (una fila por calificación, F08..F37
+    como columnas) y su llenado inicial con los datos existentes.
+    """
+
+    dependencies = [
+        ('archivos', '0004_errorimportacion'),
+        ('calificaciones', '0002_calificaciontributaria_clave_natural'),
+        ('instrumentos', '0001_initial'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalificacionPivote',
+            fields=[
+                ('id_calificacion', models.OneToOneField(db_column='id_calificacion', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='pivote', serialize=False, to='calificaciones.calificacion')),
+                ('fecha_pago', models.DateField(blank=True, null=True)),
+                ('fecha_registro', models.DateTimeField(blank=True, null=True)),
+                ('origen', models.CharField(choices=[('manual', 'Manual'), ('archivo', 'Archivo'), ('bolsa', 'Bolsa')], max_length=10)),
+                ('activo', models.BooleanField(default=True)),
+                ('anio', models.CharField(blank=True, max_length=10, null=True)),
+                ('secuencia_evento', models.CharField(blank=True, max_length=50, null=True)),
+                ('evento_capital', models.CharField(blank=True, max_length=100, null=True)),
+                ('valor_historico', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True)),
+                ('descripcion', models.TextField(blank=True, null=True)),
+                ('ingreso_por_montos', models.IntegerField(blank=True, null=True)),
+                ('f08', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f09', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f10', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f11', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f12', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f13', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f14', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f15', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f16', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f17', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f18', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f19', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f20', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f21', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f22', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f23', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f24', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f25', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f26', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f27', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f28', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f29', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f30', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f31', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f32', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f33', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f34', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f35', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f36', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('f37', models.DecimalField(blank=True, decimal_places=8, max_digits=18, null=True)),
+                ('id_archivo', models.ForeignKey(blank=True, db_column='id_archivo', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='archivos.archivo')),
+                ('id_calificacion_tributaria', models.ForeignKey(blank=True, db_column='id_calificacion_tributaria', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='calificaciones.calificaciontributaria')),
+                ('id_estado', models.ForeignKey(blank=True, db_column='id_estado', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='usuarios.estado')),
+                ('id_instrumento', models.ForeignKey(blank=True, db_column='id_instrumento', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='instrumentos.instrumento')),
+                ('id_mercado', models.ForeignKey(blank=True, db_column='id_mercado', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='instrumentos.mercado')),
+                ('id_usuario', models.ForeignKey(blank=True, db_column='id_usuario', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='usuarios.usuario')),
+            ],
+            options={
+                'db_table': 'calificacion_pivote',
+                'indexes': [models.Index(fields=['activo', 'id_mercado', 'anio'], name='calif_pivote_mercado_idx'), models.Index(fields=['activo', 'anio'], name='calif_pivote_anio_idx'), models.Index(fields=['activo', 'origen'], name='calif_pivote_origen_idx'), models.Index(fields=['activo', 'fecha_registro'], name='calif_pivote_registro_idx')],
+            },
+        ),
+        migrations.RunPython(llenar_pivote, migrations.RunPython.noop),
+    ]
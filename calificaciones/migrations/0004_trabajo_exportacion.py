@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0003_calificacion_pivote'),
+        ('usuarios', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionDatos',
+            fields=[
+                ('tabla', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('fecha_modificacion', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'version_datos',
+            },
+        ),
+        migrations.CreateModel(
+            name='TrabajoExportacion',
+            fields=[
+                ('id_trabajo', models.AutoField(primary_key=True, serialize=False)),
+                ('formato', models.CharField(choices=[('csv.gz', 'CSV comprimido (gzip)'), ('zip', 'CSV comprimido (zip)')], max_length=10)),
+                ('filtros', models.TextField()),
+                ('clave', models.CharField(max_length=64)),
+                ('version_datos', models.BigIntegerField(default=0)),
+                ('estado', models.CharField(choices=[('Pendiente', 'Pendiente'), ('Procesando', 'Procesando'), ('Completado', 'Completado'), ('Error', 'Error')], default='Pendiente', max_length=10)),
+                ('filas', models.IntegerField(default=0)),
+                ('ruta', models.CharField(blank=True, max_length=255, null=True)),
+                ('mensaje', models.TextField(blank=True, null=True)),
+                ('worker', models.CharField(blank=True, max_length=100, null=True)),
+                ('fecha_creacion', models.DateTimeField(blank=True, null=True)),
+                ('fecha_inicio', models.DateTimeField(blank=True, null=True)),
+                ('fecha_fin', models.DateTimeField(blank=True, null=True)),
+                ('fecha_expiracion', models.DateTimeField(blank=True, null=True)),
+                ('id_usuario', models.ForeignKey(blank=True, db_column='id_usuario', db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='usuarios.usuario')),
+            ],
+            options={
+                'db_table': 'trabajo_exportacion',
+                'indexes': [models.Index(fields=['estado', 'id_trabajo'], name='trabajo_exp_estado_idx'), models.Index(fields=['clave', 'version_datos'], name='trabajo_exp_clave_idx')],
+            },
+        ),
+    ]
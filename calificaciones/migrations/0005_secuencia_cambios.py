@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0004_trabajo_exportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CalificacionEliminada',
+            fields=[
+                ('id_calificacion', models.IntegerField(primary_key=True, serialize=False)),
+                ('id_usuario', models.IntegerField(blank=True, null=True)),
+                ('secuencia_cambio', models.BigIntegerField(db_index=True)),
+                ('fecha_eliminacion', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'calificacion_eliminada',
+            },
+        ),
+        migrations.AddField(
+            model_name='calificacionpivote',
+            name='secuencia_alta',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='calificacionpivote',
+            name='secuencia_cambio',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='calificacionpivote',
+            index=models.Index(fields=['secuencia_cambio'], name='calif_pivote_cambio_idx'),
+        ),
+    ]
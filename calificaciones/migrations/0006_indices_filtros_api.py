@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calificaciones', '0005_secuencia_cambios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calificacionpivote',
+            index=models.Index(fields=['activo', 'id_mercado', 'fecha_registro'], name='calif_pivote_merc_reg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calificacionpivote',
+            index=models.Index(fields=['activo', 'id_instrumento', 'fecha_registro'], name='calif_pivote_instr_reg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calificacionpivote',
+            index=models.Index(fields=['activo', 'id_estado', 'fecha_registro'], name='calif_pivote_estado_reg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calificacionpivote',
+            index=models.Index(fields=['activo', 'fecha_pago'], name='calif_pivote_pago_idx'),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 
+# Códigos de factor (F08..F37), del motor de factores
+from .factores import CODIGOS
+
 # --- NUEVO MANAGER ---
 # Este Manager se asegura de que Calificacion.objects.all()
 # SÓLO devuelva las calificaciones activas (borrado lógico)
@@ -49,6 +52,11 @@ class Calificaciontributaria(models.Model):
     class Meta:
         managed = False
         db_table = 'calificaciontributaria'
+        # Clave natural de la Carga Masiva (índice creado con la migración 0002;
+        # en MySQL 'anio' es TEXT y usa un índice por prefijo)
+        indexes = [
+            models.Index(fields=['secuencia_evento', 'evento_capital', 'anio'], name='calif_trib_clave_idx'),
+        ]
 
 
 class Factortributario(models.Model):
@@ -60,4 +68,223 @@ class Factortributario(models.Model):
 
     class Meta:
         managed = False
-        db_table = 'factortributario'
\ No newline at end of file
+        db_table = 'factortributario'
+
+# ==========================================================
+#  TABLA PIVOTE (una fila por Calificacion, F08..F37 como columnas)
+# ==========================================================
+# 'F08' -> 'f08' (columna de cada factor en la tabla pivote)
+COLUMNAS_FACTORES = {codigo: codigo.lower() for codigo in CODIGOS}
+
+
+class CalificacionPivote(models.Model):
+    """
+    Copia "aplanada" de Calificacion + Calificaciontributaria + Factortributario:
+    una fila por calificación, con los 30 factores como columnas (NULL si
+    la calificación no tiene ese factor) y las columnas por las que se filtra.
+    La Lista, la Exportación y la API leen de aquí, en una sola consulta,
+    en vez de armar el pivote fila a fila en Python.
+
+    Se mantiene al día en cada escritura (ver 'calificaciones/pivote.py') y
+    se reconstruye con 'python manage.py reconstruir_pivote'.
+    Esta tabla SÍ la administra Django (managed=True).
+    """
+    ORIGEN_CHOICES = (
+        ('manual', 'Manual'),   # Ingresada por un usuario (sin Archivo)
+        ('archivo', 'Archivo'), # Cargada desde un Archivo
+        ('bolsa', 'Bolsa'),     # Sin usuario ni Archivo (ej. la API)
+    )
+
+    id_calificacion = models.OneToOneField(
+        Calificacion, models.DO_NOTHING, db_column='id_calificacion',
+        primary_key=True, db_constraint=False, related_name='pivote'
+    )
+    # (Sin restricción de FK: la tabla se puede vaciar y reconstruir sin tocar las demás)
+    id_usuario = models.ForeignKey('usuarios.Usuario', models.DO_NOTHING, db_column='id_usuario', blank=True, null=True, db_constraint=False, related_name='+')
+    id_instrumento = models.ForeignKey('instrumentos.Instrumento', models.DO_NOTHING, db_column='id_instrumento', blank=True, null=True, db_constraint=False, related_name='+')
+    id_mercado = models.ForeignKey('instrumentos.Mercado', models.DO_NOTHING, db_column='id_mercado', blank=True, null=True, db_constraint=False, related_name='+')
+    id_archivo = models.ForeignKey('archivos.Archivo', models.DO_NOTHING, db_column='id_archivo', blank=True, null=True, db_constraint=False, related_name='+')
+    id_estado = models.ForeignKey('usuarios.Estado', models.DO_NOTHING, db_column='id_estado', blank=True, null=True, db_constraint=False, related_name='+')
+    fecha_pago = models.DateField(blank=True, null=True)
+    fecha_registro = models.DateTimeField(blank=True, null=True)
+    origen = models.CharField(max_length=10, choices=ORIGEN_CHOICES)
+    activo = models.BooleanField(default=True)
+
+    # --- De Calificaciontributaria (NULL si la calificación no tiene) ---
+    id_calificacion_tributaria = models.ForeignKey(Calificaciontributaria, models.DO_NOTHING, db_column='id_calificacion_tributaria', blank=True, null=True, db_constraint=False, related_name='+')
+    anio = models.CharField(max_length=10, blank=True, null=True)
+    secuencia_evento = models.CharField(max_length=50, blank=True, null=True)
+    evento_capital = models.CharField(max_length=100, blank=True, null=True)
+    valor_historico = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
+    descripcion = models.TextField(blank=True, null=True)
+    ingreso_por_montos = models.IntegerField(blank=True, null=True)
+
+    # --- De Factortributario (F08..F37) ---
+    f08 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f09 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f10 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f11 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f12 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f13 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f14 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f15 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f16 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f17 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f18 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f19 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f20 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f21 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f22 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f23 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f24 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f25 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f26 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f27 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f28 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f29 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f30 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f31 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f32 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f33 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f34 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f35 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f36 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+    f37 = models.DecimalField(max_digits=18, decimal_places=8, blank=True, null=True)
+
+    # --- Secuencia de cambios (sincronización incremental de la API) ---
+    # La versión de la tabla pivote (ver 'calificaciones/versiones.py') con la
+    # que se escribió la fila por última vez, y con la que se escribió por primera vez
+    secuencia_cambio = models.BigIntegerField(default=0)
+    secuencia_alta = models.BigIntegerField(default=0)
+
+    class Meta:
+        db_table = 'calificacion_pivote'
+        indexes = [
+            # Los filtros de la Lista y la Exportación (siempre sobre las activas)
+            models.Index(fields=['activo', 'id_mercado', 'anio'], name='calif_pivote_mercado_idx'),
+            models.Index(fields=['activo', 'anio'], name='calif_pivote_anio_idx'),
+            models.Index(fields=['activo', 'origen'], name='calif_pivote_origen_idx'),
+            # El orden de la API
+            models.Index(fields=['activo', 'fecha_registro'], name='calif_pivote_registro_idx'),
+            # Los filtros de la API (y de la Lista), ya en el orden (-fecha_registro):
+            # la página sale del índice sin ordenar todas las que cumplen el filtro
+            models.Index(fields=['activo', 'id_mercado', 'fecha_registro'], name='calif_pivote_merc_reg_idx'),
+            models.Index(fields=['activo', 'id_instrumento', 'fecha_registro'], name='calif_pivote_instr_reg_idx'),
+            models.Index(fields=['activo', 'id_estado', 'fecha_registro'], name='calif_pivote_estado_reg_idx'),
+            models.Index(fields=['activo', 'fecha_pago'], name='calif_pivote_pago_idx'),
+            # Los cambios desde una secuencia (/api/v1/calificaciones/changes/)
+            models.Index(fields=['secuencia_cambio'], name='calif_pivote_cambio_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pivote de Calificación {self.id_calificacion_id}"
+
+    @property
+    def factores(self):
+        """{'F08': valor, ...} con los 30 factores (None si no está)."""
+        return {codigo: getattr(self, columna) for codigo, columna in COLUMNAS_FACTORES.items()}
+
+
+class CalificacionEliminada(models.Model):
+    """
+    Marca de una calificación borrada de verdad (no con borrado lógico):
+    su fila pivote ya no existe, pero la API de cambios tiene que avisar
+    la baja a quienes la copiaron. La escribe 'actualizar_pivote'.
+    """
+    id_calificacion = models.IntegerField(primary_key=True)
+    # (Dueño que tenía, para que cada Corredor reciba solo las bajas de lo que podía ver)
+    id_usuario = models.IntegerField(blank=True, null=True)
+    secuencia_cambio = models.BigIntegerField(db_index=True)
+    fecha_eliminacion = models.DateTimeField()
+
+    class Meta:
+        db_table = 'calificacion_eliminada'
+
+    def __str__(self):
+        return f"Calificación {self.id_calificacion} eliminada"
+
+
+
+# ==========================================================
+#  VERSIÓN DE LOS DATOS (un contador por tabla)
+# ==========================================================
+class VersionDatos(models.Model):
+    """
+    Un contador por tabla que sube con cada escritura (ver
+    'calificaciones/versiones.py'): si no cambió, los datos tampoco.
+    Sirve para reutilizar resultados ya calculados (ej. una Exportación).
+    Esta tabla SÍ la administra Django (managed=True).
+    """
+    tabla = models.CharField(primary_key=True, max_length=64)
+    version = models.BigIntegerField(default=0)
+    fecha_modificacion = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'version_datos'
+
+    def __str__(self):
+        return f"{self.tabla} v{self.version}"
+
+
+# ==========================================================
+#  TRABAJOS DE EXPORTACIÓN EN SEGUNDO PLANO (ExportJob)
+# ==========================================================
+class TrabajoExportacion(models.Model):
+    """
+    Cola (en BBDD) de exportaciones que arma el comando
+    'manage.py procesar_exportaciones' fuera de la petición HTTP: guarda
+    los filtros de 'CalificacionFilterForm' y deja el archivo comprimido
+    en MEDIA_ROOT/EXPORTACION_DIRECTORIO hasta 'fecha_expiracion'.
+    Esta tabla SÍ la administra Django (managed=True).
+    """
+    ESTADO_PENDIENTE = 'Pendiente'
+    ESTADO_PROCESANDO = 'Procesando'
+    ESTADO_COMPLETADO = 'Completado'
+    ESTADO_ERROR = 'Error'
+    ESTADO_CHOICES = (
+        (ESTADO_PENDIENTE, 'Pendiente'),
+        (ESTADO_PROCESANDO, 'Procesando'),
+        (ESTADO_COMPLETADO, 'Completado'),
+        (ESTADO_ERROR, 'Error'),
+    )
+
+    FORMATO_CHOICES = (
+        ('csv.gz', 'CSV comprimido (gzip)'),
+        ('zip', 'CSV comprimido (zip)'),
+    )
+
+    id_trabajo = models.AutoField(primary_key=True)
+    id_usuario = models.ForeignKey('usuarios.Usuario', models.DO_NOTHING, db_column='id_usuario', blank=True, null=True, db_constraint=False)
+    formato = models.CharField(max_length=10, choices=FORMATO_CHOICES)
+    filtros = models.TextField() # JSON con los filtros (ver 'CalificacionFilterForm.filtros')
+    # SHA-256 de formato + filtros: dos pedidos iguales tienen la misma clave
+    clave = models.CharField(max_length=64)
+    # Versión de la tabla pivote con la que se armó (o se armará) el archivo
+    version_datos = models.BigIntegerField(default=0)
+    estado = models.CharField(max_length=10, choices=ESTADO_CHOICES, default=ESTADO_PENDIENTE)
+
+    filas = models.IntegerField(default=0) # Filas escritas (avance)
+    ruta = models.CharField(max_length=255, blank=True, null=True) # En default_storage
+    mensaje = models.TextField(blank=True, null=True)
+
+    worker = models.CharField(max_length=100, blank=True, null=True) # Quién lo tomó (host:pid)
+    fecha_creacion = models.DateTimeField(blank=True, null=True)
+    fecha_inicio = models.DateTimeField(blank=True, null=True)
+    fecha_fin = models.DateTimeField(blank=True, null=True)
+    # Último aviso de vida del worker (al reclamarlo y en cada avance): si queda
+    # viejo, el worker murió y el trabajo se vuelve a encolar (ver 'calificaciones/trabajos.py')
+    fecha_latido = models.DateTimeField(blank=True, null=True)
+    intentos = models.IntegerField(default=0) # Veces que un worker lo reclamó
+    fecha_expiracion = models.DateTimeField(blank=True, null=True) # Desde aquí el archivo ya no se entrega
+
+    class Meta:
+        db_table = 'trabajo_exportacion'
+        indexes = [
+            # Los workers buscan el Pendiente más antiguo
+            models.Index(fields=['estado', 'id_trabajo'], name='trabajo_exp_estado_idx'),
+            # Un pedido igual busca un archivo que se pueda reutilizar
+            models.Index(fields=['clave', 'version_datos'], name='trabajo_exp_clave_idx'),
+        ]
+
+    def __str__(self):
+        return f"Exportación {self.id_trabajo} ({self.formato}) - {self.estado}"
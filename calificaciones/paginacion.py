@@ -0,0 +1,162 @@
+import base64
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+# ==========================================================
+#  PAGINACIÓN POR CLAVE (KEYSET) SOBRE (fecha_registro, id)
+# ==========================================================
+# En vez de OFFSET (que recorre y descarta todas las filas anteriores), cada
+# página pide "las N siguientes a la última fila vista": el costo es el mismo
+# en la página 1 que en la 10.000 y usa el índice (activo, fecha_registro).
+#
+# Orden: las más recientes primero (-fecha_registro, -id). Una fecha NULL
+# cuenta como la menor (así ordenan MySQL y SQLite), o sea, van al final.
+
+
+class CursorInvalido(ValueError):
+    """El cursor de la URL no se pudo leer (se vuelve a la primera página)."""
+
+
+def codificar_cursor(fila):
+    """Cursor opaco (texto para la URL) con la fecha_registro y el ID de la fila."""
+    fecha = fila.fecha_registro.isoformat() if fila.fecha_registro else ''
+    texto = f'{fecha}|{fila.pk}'
+    return base64.urlsafe_b64encode(texto.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor):
+    """(fecha_registro o None, id) del cursor. Lanza CursorInvalido si no se puede leer."""
+    try:
+        texto = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode('ascii')
+        fecha, _, pk = texto.partition('|')
+        return (datetime.fromisoformat(fecha) if fecha else None), int(pk)
+    except (TypeError, ValueError) as e_cursor: # (binascii.Error y UnicodeDecodeError son ValueError)
+        raise CursorInvalido(f'Cursor inválido: {e_cursor}')
+
+
+def _posteriores(fecha, pk):
+    """Las filas que van DESPUÉS de (fecha, pk) en el orden de la lista."""
+    if fecha is None:
+        return Q(fecha_registro__isnull=True, pk__lt=pk)
+    return Q(fecha_registro__lt=fecha) | Q(fecha_registro=fecha, pk__lt=pk) | Q(fecha_registro__isnull=True)
+
+
+def _anteriores(fecha, pk):
+    """Las filas que van ANTES de (fecha, pk) en el orden de la lista."""
+    if fecha is None:
+        return Q(fecha_registro__isnull=False) | Q(fecha_registro__isnull=True, pk__gt=pk)
+    return Q(fecha_registro__gt=fecha) | Q(fecha_registro=fecha, pk__gt=pk)
+
+
+class PaginaKeyset:
+    """
+    Una página de 'qs' (un queryset con 'fecha_registro' y PK, ej. la tabla
+    pivote). 'despues' y 'antes' son cursores: se pide la página que sigue a
+    'despues' o la que precede a 'antes' (si no viene ninguno, la primera).
+    Hace una sola consulta (por_pagina + 1 filas, para saber si hay más).
+    'construir_fila' convierte cada resultado (ej. una tupla de values_list)
+    en la fila que se entrega: debe tener 'fecha_registro' y 'pk'.
+    """
+
+    def __init__(self, qs, por_pagina, despues=None, antes=None, construir_fila=None):
+        self.por_pagina = por_pagina
+        if antes:
+            fecha, pk = decodificar_cursor(antes)
+            filas = list(qs.filter(_anteriores(fecha, pk)).order_by('fecha_registro', 'pk')[:por_pagina + 1])
+            self.hay_anterior = len(filas) > por_pagina
+            self.hay_siguiente = True
+            filas = filas[:por_pagina][::-1]
+        else:
+            if despues:
+                fecha, pk = decodificar_cursor(despues)
+                qs = qs.filter(_posteriores(fecha, pk))
+            filas = list(qs.order_by('-fecha_registro', '-pk')[:por_pagina + 1])
+            self.hay_siguiente = len(filas) > por_pagina
+            self.hay_anterior = bool(despues)
+            filas = filas[:por_pagina]
+        self.filas = [construir_fila(fila) for fila in filas] if construir_fila else filas
+
+    def __iter__(self):
+        return iter(self.filas)
+
+    def __len__(self):
+        return len(self.filas)
+
+    @property
+    def cursor_siguiente(self):
+        return codificar_cursor(self.filas[-1]) if self.hay_siguiente and self.filas else None
+
+    @property
+    def cursor_anterior(self):
+        return codificar_cursor(self.filas[0]) if self.hay_anterior and self.filas else None
+
+
+# ==========================================================
+#  PAGINACIÓN POR CURSOR PARA LA API (DRF)
+# ==========================================================
+class PaginacionCursorAPI(BasePagination):
+    """
+    Paginación de la API sobre 'PaginaKeyset': mismo orden que la Lista
+    (-fecha_registro, -id) y sin COUNT(*) ni OFFSET. Cada página cuesta lo
+    mismo sin importar cuán lejos esté, así que sincronizar todo son
+    (total / page_size) peticiones baratas.
+
+    ?page_size=N elige el tamaño (hasta settings.API_MAX_POR_PAGINA) y
+    ?cursor= es opaco: se copia de los enlaces 'next' / 'previous'.
+    La vista puede definir 'construir_fila' (ver 'PaginaKeyset').
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    # El cursor de la URL es la dirección ('d' = después, 'a' = antes) + el de PaginaKeyset
+    _DESPUES, _ANTES = 'd', 'a'
+
+    def get_page_size(self, request):
+        try:
+            por_pagina = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return api_settings.PAGE_SIZE
+        return min(max(por_pagina, 1), settings.API_MAX_POR_PAGINA)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param) or ''
+        direccion, cursor = cursor[:1], cursor[1:]
+        if direccion not in ('', self._DESPUES, self._ANTES):
+            raise NotFound('Cursor inválido.')
+        try:
+            self.pagina = PaginaKeyset(
+                queryset, self.get_page_size(request),
+                despues=cursor if direccion == self._DESPUES else None,
+                antes=cursor if direccion == self._ANTES else None,
+                construir_fila=getattr(view, 'construir_fila', None),
+            )
+        except CursorInvalido:
+            raise NotFound('Cursor inválido.')
+        return self.pagina.filas
+
+    def _enlace(self, direccion, cursor):
+        if not cursor:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, direccion + cursor)
+
+    def get_next_link(self):
+        return self._enlace(self._DESPUES, self.pagina.cursor_siguiente)
+
+    def get_previous_link(self):
+        return self._enlace(self._ANTES, self.pagina.cursor_anterior)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
@@ -0,0 +1,72 @@
+import json
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException, ParseError
+from rest_framework.parsers import BaseParser, JSONParser
+
+# Lector por trozos de la calculadora por lotes
+from .calculadora import leer_arreglo_json, CuerpoInvalido
+
+
+# ==========================================================
+#  LOTES DE LA API (POST bulk/): se deja de leer al pasar el máximo
+# ==========================================================
+# Los dos parsers entregan la lista de objetos del lote, pero leen el
+# cuerpo de a un objeto y cortan con un 413 apenas pasa de API_MAX_LOTE:
+# un lote demasiado grande no llega a quedar completo en memoria.
+class LoteDemasiadoGrande(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'El lote tiene demasiadas calificaciones.'
+    default_code = 'lote_demasiado_grande'
+
+
+def _hasta_el_maximo(objetos):
+    maximo = settings.API_MAX_LOTE
+    lote = []
+    for objeto in objetos:
+        if len(lote) == maximo:
+            raise LoteDemasiadoGrande(f'El lote tiene más de {maximo} calificaciones; el máximo es {maximo}.')
+        lote.append(objeto)
+    return lote
+
+
+class ParserLoteJSON(JSONParser):
+    """
+    Un arreglo JSON, leído por trozos ('leer_arreglo_json'). Los decimales
+    llegan como texto, igual que en la calculadora por lotes.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return _hasta_el_maximo(leer_arreglo_json(stream))
+        except CuerpoInvalido:
+            raise ParseError('Se esperaba un arreglo JSON (o NDJSON, un objeto por línea).')
+        except ValueError as e:
+            raise ParseError(str(e))
+
+
+# ==========================================================
+#  NDJSON (un objeto JSON por línea)
+# ==========================================================
+class ParserNDJSON(BaseParser):
+    """
+    Cuerpo 'application/x-ndjson': un objeto JSON por línea (las líneas
+    en blanco se ignoran). Entrega la lista de objetos, igual que un
+    arreglo JSON, para la creación por lotes de la API.
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return _hasta_el_maximo(self._objetos(stream, parser_context or {}))
+
+    def _objetos(self, stream, parser_context):
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        for numero, linea in enumerate(stream, start=1):
+            linea = linea.decode(encoding).strip()
+            if not linea:
+                continue
+            try:
+                yield json.loads(linea)
+            except ValueError as e:
+                raise ParseError(f'NDJSON inválido en la línea {numero}: {e}')
@@ -0,0 +1,336 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import BigIntegerField, Case, F, Value, When
+from django.utils import timezone
+
+from .models import Calificacion, Calificaciontributaria, CalificacionPivote, CalificacionEliminada, COLUMNAS_FACTORES
+from .consultas import factores_por_tributaria
+from .versiones import siguiente_version, TABLA_PIVOTE
+
+
+# ==========================================================
+#  TABLA PIVOTE: SINCRONIZACIÓN INCREMENTAL
+# ==========================================================
+# 'CalificacionPivote' es una copia aplanada de las 3 tablas (una fila por
+# calificación). Toda escritura de Calificacion, Calificaciontributaria o
+# Factortributario debe terminar llamando a 'actualizar_pivote' (con los IDs
+# de las calificaciones que tocó) o a 'guardar_pivote' (si ya tiene los
+# objetos en memoria, como la Carga Masiva), DENTRO de la misma transacción:
+# así la tabla pivote nunca queda a medias respecto de las originales.
+# Ambas suben la versión de la tabla pivote (ver 'calificaciones/versiones.py')
+# y la guardan en cada fila escrita como su 'secuencia_cambio': la API de
+# cambios entrega lo escrito desde una secuencia dada, en orden.
+#
+# La versión es UNA fila que queda bloqueada desde que se sube hasta el
+# COMMIT (así el orden de las secuencias es el de los COMMIT). Para que dos
+# escrituras largas (ej. dos workers importando archivos distintos) no se
+# esperen entre sí, las filas se escriben con la secuencia PENDIENTE y la
+# versión se toma recién al final, en un paso corto justo antes del COMMIT
+# (ver 'escritura_pivote'): solo ese paso queda en fila.
+TAMANO_TROZO = 1000 # Calificaciones por consulta (IN de tamaño acotado)
+
+# Secuencia de lo escrito en la transacción en curso, hasta que se sella
+# (nunca se ve desde afuera: se reemplaza antes del COMMIT)
+PENDIENTE = -1
+
+# Lo escrito en la 'escritura_pivote' abierta en este hilo (o None)
+_escritura = threading.local()
+
+
+def fila_pivote(calificacion, tributaria, factores):
+    """
+    La fila de la tabla pivote de una calificación: 'tributaria' puede ser
+    None y 'factores' es {codigo: valor} (los que faltan quedan en NULL).
+    'calificacion' y 'tributaria' pueden ser instancias de modelo o tuplas
+    con nombre (values_list(..., named=True)) con los mismos atributos.
+    """
+    if calificacion.id_archivo_id:
+        origen = 'archivo'
+    elif calificacion.id_usuario_id:
+        origen = 'manual'
+    else:
+        origen = 'bolsa'
+
+    fila = CalificacionPivote(
+        id_calificacion_id=calificacion.id_calificacion,
+        id_usuario_id=calificacion.id_usuario_id,
+        id_instrumento_id=calificacion.id_instrumento_id,
+        id_mercado_id=calificacion.id_mercado_id,
+        id_archivo_id=calificacion.id_archivo_id,
+        id_estado_id=calificacion.id_estado_id,
+        fecha_pago=calificacion.fecha_pago,
+        fecha_registro=calificacion.fecha_registro,
+        origen=origen,
+        activo=calificacion.activo,
+    )
+    if tributaria is not None:
+        fila.id_calificacion_tributaria_id = tributaria.id_calificacion_tributaria
+        fila.anio = None if tributaria.anio is None else str(tributaria.anio)
+        fila.secuencia_evento = tributaria.secuencia_evento
+        fila.evento_capital = tributaria.evento_capital
+        fila.valor_historico = tributaria.valor_historico
+        fila.descripcion = tributaria.descripcion
+        fila.ingreso_por_montos = None if tributaria.ingreso_por_montos is None else int(tributaria.ingreso_por_montos)
+    for codigo, valor in factores.items():
+        columna = COLUMNAS_FACTORES.get(codigo)
+        if columna: # (Un código desconocido no tiene columna: se ignora)
+            setattr(fila, columna, valor)
+    return fila
+
+
+@contextmanager
+def escritura_pivote():
+    """
+    Transacción para escribir en la tabla pivote: 'guardar_pivote' y
+    'actualizar_pivote' dejan sus filas (y las bajas) con la secuencia
+    PENDIENTE, y al cerrar el bloque se toma la nueva versión y se sellan
+    todas juntas, ya al final. Si ya hay una abierta, se suma a esa.
+    Quien escribe mucho en una transacción (un lote de la Carga Masiva)
+    la abre alrededor de todo el lote.
+    """
+    if getattr(_escritura, 'pendientes', None) is not None:
+        yield
+        return
+    pendientes = _escritura.pendientes = {'filas': set(), 'bajas': set()}
+    try:
+        with transaction.atomic():
+            yield
+            _sellar(pendientes)
+    finally:
+        _escritura.pendientes = None
+
+
+def _sellar(pendientes):
+    """
+    Sube la versión de la tabla pivote (desde acá hasta el COMMIT la fila
+    queda bloqueada) y la pone de secuencia en lo escrito: un UPDATE por
+    trozo, por clave primaria y solo en lo que sigue PENDIENTE (lo de un
+    savepoint deshecho no se toca).
+    """
+    if not (pendientes['filas'] or pendientes['bajas']):
+        return
+    secuencia = siguiente_version(TABLA_PIVOTE)
+    for trozo in _trozos(sorted(pendientes['filas'])):
+        CalificacionPivote.objects.filter(id_calificacion_id__in=trozo, secuencia_cambio=PENDIENTE).update(
+            secuencia_cambio=secuencia,
+            secuencia_alta=Case(
+                When(secuencia_alta=PENDIENTE, then=Value(secuencia)),
+                default=F('secuencia_alta'), output_field=BigIntegerField(),
+            ),
+        )
+    for trozo in _trozos(sorted(pendientes['bajas'])):
+        CalificacionEliminada.objects.filter(id_calificacion__in=trozo, secuencia_cambio=PENDIENTE).update(
+            secuencia_cambio=secuencia
+        )
+
+
+def _trozos(ids, tamano=TAMANO_TROZO):
+    for inicio in range(0, len(ids), tamano):
+        yield ids[inicio:inicio + tamano]
+
+
+def guardar_pivote(filas, nuevas=False):
+    """
+    Reemplaza en la tabla pivote las filas de esas calificaciones
+    (un DELETE y un INSERT por trozo, sin importar el motor de BBDD).
+    Todas quedan con la misma 'secuencia_cambio' (la nueva versión de la
+    tabla, al cerrar la 'escritura_pivote'). Con 'nuevas' (calificaciones
+    recién creadas) no se buscan ni se borran filas anteriores: su
+    'secuencia_alta' es la misma.
+    """
+    filas = list(filas)
+    if not filas:
+        return
+    with escritura_pivote():
+        for trozo in _trozos(filas):
+            ids = [fila.id_calificacion_id for fila in trozo]
+            anteriores = {} if nuevas else _anteriores(ids)
+            if not nuevas:
+                # (Las nuevas no tienen fila: sin el DELETE, en MySQL tampoco
+                # bloquean el hueco al final del índice donde insertan los demás)
+                CalificacionPivote.objects.filter(id_calificacion_id__in=ids).delete()
+            CalificacionPivote.objects.bulk_create(_con_secuencia(trozo, anteriores))
+            _escritura.pendientes['filas'].update(ids)
+
+
+def _anteriores(ids):
+    """{id_calificacion: (secuencia_alta, id_usuario)} de las filas pivote que ya existen."""
+    return {
+        pk: (alta, id_usuario)
+        for pk, alta, id_usuario in CalificacionPivote.objects.filter(id_calificacion_id__in=ids)
+        .values_list('pk', 'secuencia_alta', 'id_usuario_id')
+    }
+
+
+def _con_secuencia(filas, anteriores):
+    """
+    Marca las filas con la secuencia PENDIENTE (y la del alta: la anterior
+    si ya existían; si no, también PENDIENTE, y se sella con la del cambio).
+    """
+    for fila in filas:
+        fila.secuencia_cambio = PENDIENTE
+        anterior = anteriores.get(fila.id_calificacion_id)
+        fila.secuencia_alta = anterior[0] if anterior else PENDIENTE
+    return filas
+
+
+def _filas_desde_bbdd(ids):
+    """
+    Arma las filas pivote de esas calificaciones con 3 consultas de tuplas
+    (sin importar cuántas sean): los factores ya vienen pivoteados por la BBDD.
+    """
+    calificaciones = Calificacion.objects_all.filter(id_calificacion__in=ids).order_by('id_calificacion').values_list(
+        'id_calificacion', 'id_usuario_id', 'id_instrumento_id', 'id_mercado_id', 'id_archivo_id',
+        'id_estado_id', 'fecha_pago', 'fecha_registro', 'activo', named=True
+    )
+
+    # La primera tributaria de cada calificación (como la Lista y la Exportación)
+    tributarias = {}
+    for trib in Calificaciontributaria.objects.filter(id_calificacion_id__in=ids).order_by('id_calificacion_tributaria').values_list(
+        'id_calificacion_tributaria', 'id_calificacion_id', 'anio', 'secuencia_evento',
+        'evento_capital', 'valor_historico', 'descripcion', 'ingreso_por_montos', named=True
+    ):
+        tributarias.setdefault(trib.id_calificacion_id, trib)
+
+    # {id_tributaria: {'F08': valor, ...}} (MAX(CASE WHEN ...) agrupado por tributaria)
+    factores = {
+        fila[0]: dict(zip(COLUMNAS_FACTORES, fila[1:]))
+        for fila in factores_por_tributaria([trib.id_calificacion_tributaria for trib in tributarias.values()])
+    }
+
+    filas = []
+    for calif in calificaciones:
+        trib = tributarias.get(calif.id_calificacion)
+        filas.append(fila_pivote(calif, trib, factores.get(trib.id_calificacion_tributaria, {}) if trib else {}))
+    return filas
+
+
+def actualizar_pivote(ids):
+    """
+    Recalcula desde las tablas originales las filas pivote de las
+    calificaciones 'ids'. Las que ya no existen se borran del pivote
+    y quedan en 'CalificacionEliminada' (la baja que informa la API de cambios).
+    """
+    ids = sorted(set(ids))
+    if not ids:
+        return
+    with escritura_pivote():
+        for trozo in _trozos(ids):
+            filas = _filas_desde_bbdd(trozo)
+            anteriores = _anteriores(trozo)
+            CalificacionPivote.objects.filter(id_calificacion_id__in=trozo).delete()
+            CalificacionPivote.objects.bulk_create(_con_secuencia(filas, anteriores))
+            _escritura.pendientes['filas'].update(fila.id_calificacion_id for fila in filas)
+
+            existen = {fila.id_calificacion_id for fila in filas}
+            eliminadas = {
+                pk: anteriores[pk][1] if pk in anteriores else None
+                for pk in trozo if pk not in existen
+            }
+            if eliminadas:
+                _registrar_bajas(eliminadas, PENDIENTE)
+                _escritura.pendientes['bajas'].update(eliminadas)
+
+
+def marcar_cambio_pivote(**filtro):
+    """
+    Marca como cambiadas (nueva secuencia, sin reescribirlas) las filas
+    pivote que cumplen 'filtro' (ej. id_mercado=3): las que muestran un
+    nombre de otra tabla que cambió. Sube la versión de la tabla pivote
+    (ETag, reutilización de exportaciones) y la API de cambios las vuelve
+    a entregar. Si ninguna cumple, no hace nada.
+    """
+    with escritura_pivote():
+        ids = list(CalificacionPivote.objects.filter(**filtro).values_list('pk', flat=True))
+        for trozo in _trozos(ids):
+            CalificacionPivote.objects.filter(id_calificacion_id__in=trozo).update(secuencia_cambio=PENDIENTE)
+        _escritura.pendientes['filas'].update(ids)
+
+
+def _registrar_bajas(eliminadas, secuencia):
+    """Deja en 'CalificacionEliminada' la baja de {id_calificacion: id_usuario que tenía}."""
+    CalificacionEliminada.objects.filter(id_calificacion__in=list(eliminadas)).delete()
+    fecha = timezone.now()
+    CalificacionEliminada.objects.bulk_create([
+        CalificacionEliminada(id_calificacion=pk, id_usuario=id_usuario, secuencia_cambio=secuencia, fecha_eliminacion=fecha)
+        for pk, id_usuario in eliminadas.items()
+    ])
+
+
+def reconstruir_pivote(tamano=TAMANO_TROZO, al_avanzar=None):
+    """
+    Vuelve a calcular la tabla pivote con TODAS las calificaciones (activas
+    e inactivas), recorriéndolas por trozos de 'tamano' IDs, y borra las
+    filas de calificaciones que ya no existen (dejando su baja).
+    Cada trozo se confirma por separado (su propia 'escritura_pivote' y su
+    propia secuencia): las escrituras normales solo esperan al trozo en
+    curso, no a toda la reconstrucción. Solo se reescriben las filas que
+    cambiaron (lo que se reparó), con una nueva secuencia: la API de
+    cambios entrega solo esas.
+    'al_avanzar(total, reparadas)' se llama tras confirmar cada trozo.
+    Devuelve cuántas filas quedaron.
+    """
+    total, ultimo = 0, 0
+    while True:
+        with escritura_pivote():
+            ids = list(
+                Calificacion.objects_all.select_for_update().filter(id_calificacion__gt=ultimo)
+                .order_by('id_calificacion').values_list('id_calificacion', flat=True)[:tamano]
+            )
+            if not ids:
+                break
+            reparadas = _reconstruir_trozo(ids, _escritura.pendientes)
+        total += len(ids)
+        ultimo = ids[-1]
+        if al_avanzar:
+            al_avanzar(total, reparadas)
+
+    # Filas de calificaciones que ya no existen
+    huerfanas = list(
+        CalificacionPivote.objects.exclude(id_calificacion_id__in=Calificacion.objects_all.values('id_calificacion'))
+        .values_list('id_calificacion_id', flat=True)
+    )
+    for trozo in _trozos(huerfanas, tamano):
+        with escritura_pivote():
+            bajas = dict(
+                CalificacionPivote.objects.select_for_update().filter(id_calificacion_id__in=trozo)
+                .values_list('id_calificacion_id', 'id_usuario_id')
+            )
+            if bajas:
+                _registrar_bajas(bajas, PENDIENTE)
+                _escritura.pendientes['bajas'].update(bajas)
+                CalificacionPivote.objects.filter(id_calificacion_id__in=list(bajas)).delete()
+    return total
+
+
+def _reconstruir_trozo(ids, pendientes):
+    """Reescribe las filas de 'ids' que faltan o no coinciden. Devuelve cuántas."""
+    previas = {
+        tupla[0]: tupla[1:]
+        for tupla in CalificacionPivote.objects.filter(id_calificacion_id__in=ids)
+        .values_list(*_COLUMNAS_DATOS, 'secuencia_alta')
+    }
+    reparadas = []
+    for fila in _filas_desde_bbdd(ids):
+        previa = previas.get(fila.id_calificacion_id)
+        if previa is None:
+            fila.secuencia_cambio = fila.secuencia_alta = PENDIENTE
+        elif tuple(getattr(fila, columna) for columna in _COLUMNAS_DATOS[1:]) == previa[:-1]:
+            continue # (Sin cambios: queda como está)
+        else:
+            fila.secuencia_cambio, fila.secuencia_alta = PENDIENTE, previa[-1]
+        reparadas.append(fila)
+    if reparadas:
+        CalificacionPivote.objects.filter(id_calificacion_id__in=[fila.id_calificacion_id for fila in reparadas]).delete()
+        CalificacionPivote.objects.bulk_create(reparadas)
+        pendientes['filas'].update(fila.id_calificacion_id for fila in reparadas)
+    return len(reparadas)
+
+
+# Las columnas con datos (la PK primero; sin las secuencias)
+_COLUMNAS_DATOS = tuple(
+    campo.attname for campo in CalificacionPivote._meta.concrete_fields
+    if campo.attname not in ('secuencia_cambio', 'secuencia_alta')
+)
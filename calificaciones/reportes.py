@@ -0,0 +1,94 @@
+import csv
+import io
+import json
+import os
+import re
+import tempfile
+import uuid
+from itertools import islice
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+# Validación del CSV sin tocar la BBDD
+from .importacion import validar_archivo
+
+
+# ==========================================================
+#  REPORTES DE "SOLO VALIDAR" (en MEDIA_ROOT, no en la BBDD)
+# ==========================================================
+# Cada reporte son dos archivos en MEDIA_ROOT/importaciones/validaciones/:
+# - <id>.json: el resumen (filas, válidas, con error, usuario, ...)
+# - <id>.csv:  los errores fila a fila (fila, columna, codigo, mensaje)
+CABECERAS_REPORTE = ['fila', 'columna', 'codigo', 'mensaje']
+FORMATO_ID_REPORTE = re.compile(r'^[0-9a-f]{32}$')
+
+
+def _ruta(id_reporte, extension):
+    return os.path.join(settings.IMPORTACION_DIRECTORIO, 'validaciones', f'{id_reporte}.{extension}')
+
+
+def crear_reporte_validacion(tipo, archivo_csv, id_usuario):
+    """
+    Valida el CSV completo (tipo 'factores' o 'montos') sin escribir en la
+    BBDD y guarda el reporte de errores. Devuelve el resumen.
+    """
+    id_reporte = uuid.uuid4().hex
+
+    # Los errores se escriben a un temporal a medida que aparecen (memoria constante)
+    with tempfile.TemporaryFile(mode='w+', encoding='utf-8', newline='') as temporal:
+        writer = csv.writer(temporal)
+        writer.writerow(CABECERAS_REPORTE)
+
+        def al_error(fila, columna, codigo, mensaje):
+            writer.writerow([fila, columna or '', codigo, mensaje])
+
+        resumen = validar_archivo(tipo, archivo_csv, al_error)
+
+        temporal.seek(0)
+        default_storage.save(_ruta(id_reporte, 'csv'), File(temporal))
+
+    resumen.update({
+        'id_reporte': id_reporte,
+        'tipo': tipo,
+        'nombre_archivo': archivo_csv.name,
+        'id_usuario': id_usuario,
+        'fecha': timezone.now().isoformat(),
+    })
+    default_storage.save(_ruta(id_reporte, 'json'), ContentFile(json.dumps(resumen).encode('utf-8')))
+    return resumen
+
+
+def leer_resumen(id_reporte):
+    """Resumen de un reporte, o None si no existe (o el ID no es válido)."""
+    if not id_reporte or not FORMATO_ID_REPORTE.match(id_reporte):
+        return None
+    ruta = _ruta(id_reporte, 'json')
+    if not default_storage.exists(ruta):
+        return None
+    with default_storage.open(ruta, 'rb') as archivo:
+        return json.load(archivo)
+
+
+def abrir_errores(id_reporte):
+    """El CSV de errores (binario), para descargarlo completo."""
+    return default_storage.open(_ruta(id_reporte, 'csv'), 'rb')
+
+
+def leer_pagina_errores(id_reporte, pagina, por_pagina):
+    """
+    Errores de la página indicada (empieza en 1), leyendo el CSV por
+    partes: solo se convierten a diccionario las filas de esa página.
+    """
+    inicio = (pagina - 1) * por_pagina
+    with abrir_errores(id_reporte) as binario:
+        reader = csv.DictReader(io.TextIOWrapper(binario, encoding='utf-8', newline=''))
+        errores = []
+        for error in islice(reader, inicio, inicio + por_pagina):
+            error['fila'] = int(error['fila'])
+            error['columna'] = error['columna'] or None
+            errores.append(error)
+        return errores
@@ -1,10 +1,13 @@
 from rest_framework import serializers
 from .models import Calificacion, Calificaciontributaria, Factortributario
+from .consultas import fila_calificacion, FilaCalificacion
+from .factores import CODIGOS
 from instrumentos.models import Instrumento, Mercado
 from usuarios.models import Usuario, Estado
 
 from .forms import FACTORES_BASE_UI, FACTORES_CALCULADOS_UI, FACTORES_DIRECTOS_UI
 from decimal import Decimal
+from datetime import date
 
 class FactortributarioSerializer(serializers.ModelSerializer):
     """
@@ -67,6 +70,186 @@ class CalificacionSerializer(serializers.ModelSerializer):
         ]
 
 
+class CalificacionPivoteSerializer(serializers.Serializer):
+    """
+    La misma salida que 'CalificacionSerializer' (con los datos tributarios
+    y los factores anidados), pero leída de la tabla pivote como tuplas
+    ('valores_calificaciones'): sin instanciar modelos ni consultas por fila.
+    Los nombres de las relaciones son los de su __str__ (Usuario: correo).
+    """
+    id_calificacion = serializers.IntegerField(source='pk', read_only=True)
+    fecha_pago = serializers.DateField(read_only=True)
+    fecha_registro = serializers.DateTimeField(read_only=True)
+    activo = serializers.BooleanField(read_only=True)
+    id_usuario = serializers.CharField(source='correo_usuario', read_only=True)
+    id_instrumento = serializers.CharField(source='nombre_instrumento', read_only=True)
+    id_mercado = serializers.CharField(source='nombre_mercado', read_only=True)
+    id_estado = serializers.CharField(source='nombre_estado', read_only=True)
+    id_archivo = serializers.CharField(source='nombre_archivo', read_only=True)
+    calificaciontributaria_set = serializers.SerializerMethodField()
+
+    def to_representation(self, tupla):
+        # (La paginación por cursor ya entrega FilaCalificacion; el detalle, la tupla)
+        fila = tupla if isinstance(tupla, FilaCalificacion) else fila_calificacion(tupla)
+        return super().to_representation(fila)
+
+    def get_calificaciontributaria_set(self, fila):
+        if fila.id_calificacion_tributaria_id is None:
+            return []
+        # Los campos de los serializers anidados dan el mismo formato
+        # (ej. 'valor_factor' con los decimales de su columna)
+        if not hasattr(self, '_campos_anidados'):
+            self._campos_anidados = (
+                CalificaciontributariaSerializer().fields,
+                FactortributarioSerializer().fields['valor_factor'],
+            )
+        campos_tributaria, campo_valor = self._campos_anidados
+
+        tributaria = {}
+        for nombre, campo in campos_tributaria.items():
+            if nombre != 'factortributario_set':
+                valor = getattr(fila, nombre)
+                tributaria[nombre] = None if valor is None else campo.to_representation(valor)
+        tributaria['factortributario_set'] = [
+            {'codigo_factor': codigo, 'valor_factor': campo_valor.to_representation(valor)}
+            for codigo, valor in zip(CODIGOS, fila.factores) if valor is not None
+        ]
+        return [tributaria]
+
+
+# ==========================================================
+#  SALIDA PLANA (con ?fields= y los factores como mapa o columnas)
+# ==========================================================
+class CalificacionPlanaSerializer(serializers.BaseSerializer):
+    """
+    Una calificación de la tabla pivote en UN diccionario plano (sin los
+    datos tributarios ni los factores anidados), de solo lectura.
+
+    En vez de un campo DRF por valor, 'to_representation' arma cada fila
+    con un plan calculado una sola vez: (nombre, posición en la tupla,
+    formato). Las opciones vienen en el contexto:
+    - 'factores': 'mapa' ({"F08": "0.50000000", ...}, solo los que tiene)
+      o 'columnas' (F08..F37 siempre presentes, null si no lo tiene).
+    - 'fields': los nombres a entregar (None = todos). Con 'columnas' se
+      pueden pedir factores sueltos ('F08') y 'factores' equivale a los 30.
+    """
+    FORMATOS_FACTORES = ('mapa', 'columnas')
+
+    # nombre en la salida -> columna de FilaCalificacion
+    COLUMNAS = {
+        'id_calificacion': 'pk',
+        'fecha_pago': 'fecha_pago',
+        'fecha_registro': 'fecha_registro',
+        'activo': 'activo',
+        'origen': 'origen',
+        'usuario': 'correo_usuario',
+        'instrumento': 'nombre_instrumento',
+        'mercado': 'nombre_mercado',
+        'estado': 'nombre_estado',
+        'archivo': 'nombre_archivo',
+        'anio': 'anio',
+        'secuencia_evento': 'secuencia_evento',
+        'evento_capital': 'evento_capital',
+        'valor_historico': 'valor_historico',
+        'descripcion': 'descripcion',
+        'ingreso_por_montos': 'ingreso_por_montos',
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.formato_factores = self.context.get('factores') or 'mapa'
+        if self.formato_factores not in self.FORMATOS_FACTORES:
+            raise serializers.ValidationError(
+                {'factores': f"Debe ser uno de: {', '.join(self.FORMATOS_FACTORES)}."}
+            )
+        self._plan = self._armar_plan(self.context.get('fields'))
+
+    def _armar_plan(self, pedidos):
+        """[(nombre, posición en FilaCalificacion, formato o None)] y los factores a entregar."""
+        # Fechas y decimales con el mismo texto que los campos de DRF
+        formato_fecha_hora = serializers.DateTimeField().to_representation
+        formatos = {
+            'fecha_pago': date.isoformat,
+            'fecha_registro': formato_fecha_hora,
+            'valor_historico': _texto_decimal,
+        }
+        columnas_factores = CODIGOS if self.formato_factores == 'columnas' else ()
+        disponibles = list(self.COLUMNAS) + ['factores'] + list(columnas_factores)
+        if pedidos is None:
+            pedidos = list(self.COLUMNAS) + ['factores']
+        desconocidos = [nombre for nombre in pedidos if nombre not in disponibles]
+        if desconocidos:
+            raise serializers.ValidationError(
+                {'fields': f"Campos desconocidos: {', '.join(desconocidos)}. Disponibles: {', '.join(disponibles)}."}
+            )
+
+        columnas = [
+            (nombre, FilaCalificacion._fields.index(self.COLUMNAS[nombre]), formatos.get(nombre))
+            for nombre in self.COLUMNAS if nombre in pedidos
+        ]
+        if self.formato_factores == 'columnas':
+            # (En el orden F08..F37, pedidos de a uno o todos con 'factores')
+            self._factores = [
+                (codigo, posicion) for posicion, codigo in enumerate(CODIGOS)
+                if codigo in pedidos or 'factores' in pedidos
+            ]
+        else:
+            self._factores = 'factores' in pedidos
+        return columnas
+
+    def to_representation(self, tupla):
+        fila = tupla if isinstance(tupla, FilaCalificacion) else fila_calificacion(tupla)
+        salida = {}
+        for nombre, posicion, formato in self._plan:
+            valor = fila[posicion]
+            salida[nombre] = formato(valor) if formato is not None and valor is not None else valor
+
+        factores = fila.factores
+        if self.formato_factores == 'columnas':
+            for codigo, posicion in self._factores:
+                valor = factores[posicion]
+                salida[codigo] = None if valor is None else format(valor, 'f')
+        elif self._factores:
+            salida['factores'] = {
+                codigo: format(valor, 'f') for codigo, valor in zip(CODIGOS, factores) if valor is not None
+            }
+        return salida
+
+
+def _texto_decimal(valor):
+    # (Ya viene con los decimales de su columna: el mismo texto que DecimalField)
+    return format(valor, 'f')
+
+
+# ==========================================================
+#  FILTROS DE LA API (?mercado=&anio=&fecha_pago_desde=...)
+# ==========================================================
+class FiltroCalificacionesSerializer(serializers.Serializer):
+    """
+    Valida los filtros de la lista de la API (query params) y los entrega
+    con los nombres de 'filtrar_pivote'. Mercado, Instrumento y Estado van
+    por nombre o por ID; las fechas como AAAA-MM-DD (extremos incluidos).
+    """
+    mercado = serializers.CharField(required=False)
+    instrumento = serializers.CharField(required=False)
+    estado = serializers.CharField(required=False)
+    anio = serializers.IntegerField(required=False)
+    origen = serializers.ChoiceField(choices=('archivo', 'manual', 'bolsa'), required=False)
+    fecha_pago_desde = serializers.DateField(required=False)
+    fecha_pago_hasta = serializers.DateField(required=False)
+    fecha_registro_desde = serializers.DateField(required=False)
+    fecha_registro_hasta = serializers.DateField(required=False)
+
+    def validate(self, data):
+        for campo in ('fecha_pago', 'fecha_registro'):
+            desde, hasta = data.get(f'{campo}_desde'), data.get(f'{campo}_hasta')
+            if desde and hasta and desde > hasta:
+                raise serializers.ValidationError({f'{campo}_hasta': 'No puede ser anterior a la fecha "desde".'})
+        if 'anio' in data:
+            data['anio'] = str(data['anio']) # (En la tabla pivote el año es texto)
+        return data
+
+
 class CalificacionCreateSerializer(serializers.Serializer):
     """
     Este serializer valida los datos de ENTRADA para crear una calificación.
@@ -1,7 +1,10 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
 from .models import Calificacion
+from .pivote import marcar_cambio_pivote
 from auditoria.models import Log
+from instrumentos.models import Instrumento, Mercado
+from usuarios.models import Usuario, Estado
 from django.utils import timezone
 
 @receiver(post_save, sender=Calificacion)
@@ -55,4 +58,57 @@ def log_calificacion_post_save(sender, instance, created, **kwargs):
         detalle=detalle,
         id_usuario=usuario,
         id_calificacion=instance
-    )
\ No newline at end of file
+    )
+
+
+# ==========================================================
+#  NOMBRES QUE MUESTRA LA TABLA PIVOTE (de otras tablas)
+# ==========================================================
+# La Lista, la Exportación y la API muestran, junto a cada fila pivote, el
+# nombre de su Instrumento, Mercado, Estado y Usuario (y el correo). Si uno
+# cambia (ej. se renombra un Mercado en el admin) o se borra, sus filas se
+# marcan como cambiadas: sube la versión de la tabla pivote (ETag y
+# exportaciones reutilizadas dejan de servir) y la API de cambios las entrega.
+# {modelo: (columna de la tabla pivote, campos que se muestran)}
+CAMPOS_MOSTRADOS = {
+    Instrumento: ('id_instrumento', ('nombre',)),
+    Mercado: ('id_mercado', ('nombre',)),
+    Estado: ('id_estado', ('nombre',)),
+    Usuario: ('id_usuario', ('nombre', 'correo')),
+}
+
+
+def _mostrados(sender, instance):
+    return tuple(getattr(instance, campo) for campo in CAMPOS_MOSTRADOS[sender][1])
+
+
+@receiver(pre_save, sender=Instrumento)
+@receiver(pre_save, sender=Mercado)
+@receiver(pre_save, sender=Estado)
+@receiver(pre_save, sender=Usuario)
+def recordar_nombres_anteriores(sender, instance, **kwargs):
+    """Guarda en la instancia lo que mostraba antes de este 'save()' (una consulta por PK)."""
+    instance._mostrados_anteriores = None
+    if instance.pk is not None and not kwargs.get('raw', False):
+        instance._mostrados_anteriores = (
+            sender.objects.filter(pk=instance.pk).values_list(*CAMPOS_MOSTRADOS[sender][1]).first()
+        )
+
+
+@receiver(post_save, sender=Instrumento)
+@receiver(post_save, sender=Mercado)
+@receiver(post_save, sender=Estado)
+@receiver(post_save, sender=Usuario)
+def marcar_nombres_cambiados(sender, instance, created, **kwargs):
+    anteriores = getattr(instance, '_mostrados_anteriores', None)
+    if created or anteriores is None or anteriores == _mostrados(sender, instance):
+        return # (Nuevo, o sin cambios en lo que se muestra: ninguna fila lo cambia)
+    marcar_cambio_pivote(**{CAMPOS_MOSTRADOS[sender][0]: instance.pk})
+
+
+@receiver(post_delete, sender=Instrumento)
+@receiver(post_delete, sender=Mercado)
+@receiver(post_delete, sender=Estado)
+@receiver(post_delete, sender=Usuario)
+def marcar_nombres_borrados(sender, instance, **kwargs):
+    marcar_cambio_pivote(**{CAMPOS_MOSTRADOS[sender][0]: instance.pk})
@@ -1,10 +1,39 @@
-from rest_framework.test import APITestCase
+from django.test import TestCase, SimpleTestCase, override_settings
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.storage import default_storage
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from decimal import Decimal
+from datetime import timedelta
+import csv
+import gzip
+import io
+import json
+import threading
 
 # Importamos los modelos para verificar la BBDD directamente
-from .models import Calificacion, Factortributario
+from .models import Calificacion, Calificaciontributaria, Factortributario, CalificacionPivote, TrabajoExportacion
 from usuarios.models import Usuario
+from instrumentos.models import Mercado
+from usuarios.principal import clave_principal, reiniciar_estadisticas_principal
+from archivos.models import Archivo, TrabajoImportacion, ErrorImportacion
+from auditoria.models import Log
+from .importacion import leer_csv_subido
+from .consultas import factores_por_tributaria
+from .validacion import validar_bloque, validar_fila_factores
+from .factores import calcular_factores_lote, calcular_factores_texto
+from .exportacion import pyarrow
+from .pivote import actualizar_pivote, guardar_pivote, reconstruir_pivote, escritura_pivote, PENDIENTE
+from .versiones import version_actual, TABLA_PIVOTE
+from .admin import desactivar_calificaciones
+from .trabajos import reclamar_trabajo, recuperar_colgados
 
 # NOTA: Estas pruebas ASUMEN que la BBDD ha sido poblada
 # con el script SQL ('seed.sql') o el 'seed_data.json'.
@@ -132,4 +161,1022 @@ class CalificacionAPITests(APITestCase):
             id_calificacion_tributaria__id_calificacion_id=id_nueva_calif, 
             codigo_factor='F20'
         )
-        self.assertEqual(f20.valor_factor, Decimal('0.12500000'))
\ No newline at end of file
+        self.assertEqual(f20.valor_factor, Decimal('0.12500000'))
+
+    # =============================================
+    # PRUEBA 3: Paginación por cursor (GET)
+    # =============================================
+    def test_paginacion_por_cursor_sin_repetir(self):
+        """
+        Prueba que recorrer la API con ?page_size= y los enlaces 'next'
+        entrega cada calificación una vez, en orden (-fecha_registro, -id),
+        sin 'count' (no hay COUNT(*)).
+        """
+        print("Ejecutando Test: test_paginacion_por_cursor_sin_repetir...")
+
+        token = self._get_jwt_token(self.EMAIL_ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        ids, url = [], '/api/v1/calificaciones/?page_size=1'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.data)
+            ids += [item['id_calificacion'] for item in response.data['results']]
+            url = response.data['next']
+
+        esperados = list(
+            CalificacionPivote.objects.filter(activo=True)
+            .order_by('-fecha_registro', '-pk').values_list('pk', flat=True)
+        )
+        self.assertEqual(ids, esperados)
+
+    # =============================================
+    # PRUEBA 4: Creación por lotes (POST bulk/)
+    # =============================================
+    def test_creacion_por_lotes_con_resultado_por_item(self):
+        """
+        Prueba que 'bulk/' (arreglo JSON o NDJSON) guarda los válidos,
+        informa cada error con su índice (207 si el éxito es parcial)
+        y rechaza los lotes más grandes que API_MAX_LOTE.
+        """
+        print("Ejecutando Test: test_creacion_por_lotes_con_resultado_por_item...")
+
+        token = self._get_jwt_token(self.EMAIL_ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        def item(secuencia, **extra):
+            return {"mercado_nombre": "ACN", "instrumento_nombre": "Test API Lote",
+                    "fecha_pago": "2025-12-01", "secuencia_evento": secuencia, "anio": 2025, **extra}
+
+        lote = [
+            item('BULK-1', factor_08='0.5'),
+            item('BULK-2', factor_08='1.5'),  # Suma > 1: error
+            item('BULK-3', ingreso_por_montos=True, factor_08='100.00', factor_09='300.00'),
+            {"mercado_nombre": "ACN"},         # Faltan campos: error
+        ]
+        response = self.client.post('/api/v1/calificaciones/bulk/', lote, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS, response.data)
+        self.assertEqual((response.data['creados'], response.data['errores']), (2, 2))
+        resultados = response.data['resultados']
+        self.assertEqual([r['indice'] for r in resultados], [0, 1, 2, 3])
+        self.assertEqual([r['estado'] for r in resultados], ['creado', 'error', 'creado', 'error'])
+        self.assertIn('secuencia_evento', resultados[3]['errores'])
+
+        fila = CalificacionPivote.objects.get(pk=resultados[2]['id_calificacion'])
+        self.assertEqual((fila.secuencia_evento, fila.f08, fila.f09), ('BULK-3', Decimal('0.25'), Decimal('0.75')))
+        self.assertEqual(
+            Factortributario.objects.get(
+                id_calificacion_tributaria__id_calificacion_id=resultados[0]['id_calificacion']
+            ).valor_factor,
+            Decimal('0.5')
+        )
+
+        # NDJSON: un objeto por línea
+        cuerpo = '\n'.join(json.dumps(item(f'NDJSON-{i}')) for i in range(3))
+        response = self.client.post('/api/v1/calificaciones/bulk/', cuerpo, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        self.assertEqual(response.data['creados'], 3)
+
+        with override_settings(API_MAX_LOTE=2):
+            response = self.client.post('/api/v1/calificaciones/bulk/', lote, format='json')
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            # Se deja de leer al pasar el máximo: lo que sigue ni se parsea
+            cuerpo = json.dumps(lote[:3])[:-1] + ', {roto'
+            response = self.client.post('/api/v1/calificaciones/bulk/', cuerpo, content_type='application/json')
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            cuerpo = '\n'.join(json.dumps(i) for i in lote[:3]) + '\n{roto'
+            response = self.client.post('/api/v1/calificaciones/bulk/', cuerpo, content_type='application/x-ndjson')
+            self.assertEqual(response.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        response = self.client.post('/api/v1/calificaciones/bulk/', {'mercado_nombre': 'ACN'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Sin PK en el INSERT múltiple (MySQL): las calificaciones se insertan de a una
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            response = self.client.post('/api/v1/calificaciones/bulk/', [item(f'SIN-RETURNING-{i}') for i in range(3)], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+        for r in response.data['resultados']:
+            self.assertEqual(
+                CalificacionPivote.objects.get(pk=r['id_calificacion']).secuencia_evento, f"SIN-RETURNING-{r['indice']}"
+            )
+
+    # =============================================
+    # PRUEBA 5: Salida plana con ?fields= (GET)
+    # =============================================
+    def test_salida_plana_con_campos_elegidos(self):
+        """
+        Prueba que ?factores=mapa|columnas entrega cada calificación plana
+        (los mismos valores que la salida anidada) y que ?fields= proyecta.
+        """
+        print("Ejecutando Test: test_salida_plana_con_campos_elegidos...")
+
+        token = self._get_jwt_token(self.EMAIL_ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        anidada = self.client.get('/api/v1/calificaciones/').data['results'][0]
+        tributaria = anidada['calificaciontributaria_set'][0]
+        factores = {f['codigo_factor']: f['valor_factor'] for f in tributaria['factortributario_set']}
+
+        plana = self.client.get('/api/v1/calificaciones/?factores=mapa').data['results'][0]
+        self.assertEqual(plana['id_calificacion'], anidada['id_calificacion'])
+        self.assertEqual(plana['fecha_registro'], anidada['fecha_registro'])
+        self.assertEqual(plana['mercado'], anidada['id_mercado'])
+        self.assertEqual(plana['valor_historico'], tributaria['valor_historico'])
+        # (Los factores planos van con los 8 decimales de la tabla pivote)
+        self.assertEqual({codigo: Decimal(valor) for codigo, valor in plana['factores'].items()},
+                         {codigo: Decimal(valor) for codigo, valor in factores.items()})
+
+        response = self.client.get('/api/v1/calificaciones/?factores=columnas&fields=id_calificacion,F08,F37')
+        fila = response.data['results'][0]
+        self.assertEqual(list(fila), ['id_calificacion', 'F08', 'F37'])
+        self.assertEqual(fila['F08'], plana['factores'].get('F08'))
+
+        response = self.client.get('/api/v1/calificaciones/?fields=id_calificacion,no_existe')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    # =============================================
+    # PRUEBA 6: Cambios desde un token (GET changes/)
+    # =============================================
+    def _cambios(self, since=None):
+        url = '/api/v1/calificaciones/changes/' + (f'?since={since}' if since else '')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lineas = [json.loads(linea) for linea in b''.join(response.streaming_content).decode().splitlines()]
+        return lineas[:-1], lineas[-1]['siguiente']
+
+    def test_cambios_desde_un_token(self):
+        """
+        Prueba que changes/?since= entrega, en orden, solo lo escrito
+        después del token: altas, cambios y bajas (también las del admin).
+        """
+        print("Ejecutando Test: test_cambios_desde_un_token...")
+
+        token = self._get_jwt_token(self.EMAIL_ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        _, since = self._cambios()
+
+        lote = [
+            {"mercado_nombre": "ACN", "instrumento_nombre": "Test API Cambios", "fecha_pago": "2025-12-01",
+             "secuencia_evento": f'CAMBIO-{i}', "anio": 2025, "factor_08": "0.5"}
+            for i in range(2)
+        ]
+        creadas = self.client.post('/api/v1/calificaciones/bulk/', lote, format='json').data['resultados']
+        id_a, id_b = [r['id_calificacion'] for r in creadas]
+
+        lineas, since = self._cambios(since)
+        self.assertEqual([(l['tipo'], l['id_calificacion']) for l in lineas], [('alta', id_a), ('alta', id_b)])
+        self.assertEqual(lineas[0]['datos']['secuencia_evento'], 'CAMBIO-0')
+        _, sin_cambios = self._cambios(since)
+        self.assertEqual(sin_cambios, since)
+
+        # Baja desde la acción del admin y un cambio en los datos tributarios
+        admin_falso = mock.Mock()
+        request = mock.Mock(user=mock.Mock(email=self.EMAIL_ADMIN))
+        desactivar_calificaciones(admin_falso, request, Calificacion.objects_all.filter(pk=id_a))
+        Calificaciontributaria.objects.filter(id_calificacion_id=id_b).update(descripcion='Corregida')
+        actualizar_pivote([id_b])
+
+        lineas, _ = self._cambios(since)
+        self.assertEqual([(l['tipo'], l['id_calificacion']) for l in lineas], [('baja', id_a), ('cambio', id_b)])
+        self.assertEqual(lineas[1]['datos']['descripcion'], 'Corregida')
+
+        # Se puede retomar desde el token de cualquier línea
+        retomadas, _ = self._cambios(lineas[0]['token'])
+        self.assertEqual([l['id_calificacion'] for l in retomadas], [id_b])
+
+    # =============================================
+    # PRUEBA 7: Filtros de la lista (GET)
+    # =============================================
+    def test_filtros_de_la_lista_en_sql(self):
+        """
+        Prueba que ?mercado=, ?instrumento=, ?anio= y los rangos de fechas
+        filtran en la BBDD (por nombre o ID) y que una fecha inválida es un 400.
+        """
+        print("Ejecutando Test: test_filtros_de_la_lista_en_sql...")
+
+        token = self._get_jwt_token(self.EMAIL_ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        lote = [
+            {"mercado_nombre": "ACN", "instrumento_nombre": "Test Filtro A", "fecha_pago": "2025-03-01",
+             "secuencia_evento": "FILTRO-1", "anio": 2025},
+            {"mercado_nombre": "ACN", "instrumento_nombre": "Test Filtro B", "fecha_pago": "2025-06-01",
+             "secuencia_evento": "FILTRO-2", "anio": 2025},
+            {"mercado_nombre": "Test Filtro Mercado", "instrumento_nombre": "Test Filtro A", "fecha_pago": "2025-09-01",
+             "secuencia_evento": "FILTRO-3", "anio": 2024},
+        ]
+        creadas = self.client.post('/api/v1/calificaciones/bulk/', lote, format='json').data['resultados']
+        ids = [r['id_calificacion'] for r in creadas]
+
+        def filtrar(params):
+            response = self.client.get(f'/api/v1/calificaciones/?page_size=100&{params}')
+            self.assertEqual(response.status_code, status.HTTP_200_OK, response.data)
+            return sorted(item['id_calificacion'] for item in response.data['results'] if item['id_calificacion'] in ids)
+
+        self.assertEqual(filtrar('instrumento=Test Filtro A'), [ids[0], ids[2]])
+        self.assertEqual(filtrar('instrumento=Test Filtro A&anio=2024'), [ids[2]])
+        id_mercado = CalificacionPivote.objects.get(pk=ids[2]).id_mercado_id
+        self.assertEqual(filtrar(f'mercado={id_mercado}'), [ids[2]])
+        self.assertEqual(filtrar('fecha_pago_desde=2025-04-01&fecha_pago_hasta=2025-06-01'), [ids[1]])
+        self.assertEqual(filtrar('instrumento=Test Filtro A&estado=Activo&origen=bolsa'), [ids[0], ids[2]])
+
+        response = self.client.get('/api/v1/calificaciones/?fecha_registro_desde=2025-13-01')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_renombrar_mercado_invalida_el_etag(self):
+        """
+        Prueba que renombrar un Mercado (como en el admin) cambia el ETag de
+        la lista (200 con el nombre nuevo, no 304) y que la API de cambios
+        vuelve a entregar sus calificaciones.
+        """
+        print("Ejecutando Test: test_renombrar_mercado_invalida_el_etag...")
+
+        token = self._get_jwt_token(self.EMAIL_ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        lote = [{"mercado_nombre": "Test Renombre", "instrumento_nombre": "Test Renombre",
+                 "fecha_pago": "2025-03-01", "secuencia_evento": "RENOMBRE-1", "anio": 2025}]
+        id_calificacion = self.client.post('/api/v1/calificaciones/bulk/', lote, format='json').data['resultados'][0]['id_calificacion']
+        mercado = Mercado.objects.get(nombre='Test Renombre')
+        _, desde = self._cambios()
+
+        url = f'/api/v1/calificaciones/?mercado={mercado.id_mercado}'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        mercado.nombre = 'Test Renombrado'
+        mercado.save()
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['id_mercado'], 'Test Renombrado')
+        cambios, _ = self._cambios(desde)
+        self.assertEqual([(c['tipo'], c['id_calificacion']) for c in cambios], [('cambio', id_calificacion)])
+
+    def test_usuario_del_token_en_cache(self):
+        """
+        Prueba que el usuario del token se lee de la BBDD solo la primera
+        vez (después sale de la caché), que guardarlo lo saca de la caché y
+        que los aciertos y fallos se ven en '/api/token/cache/'.
+        """
+        print("Ejecutando Test: test_usuario_del_token_en_cache...")
+
+        cache.clear()
+        reiniciar_estadisticas_principal()
+        token = self._get_jwt_token(self.EMAIL_ADMIN)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        admin = Usuario.objects.get(correo=self.EMAIL_ADMIN)
+        tabla = Usuario._meta.db_table
+
+        def consultas_a_usuario():
+            with CaptureQueriesContext(connection) as consultas:
+                response = self.client.get('/api/v1/calificaciones/?page_size=1')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return [q['sql'] for q in consultas.captured_queries if f'FROM "{tabla}"' in q['sql'] or f'FROM `{tabla}`' in q['sql']]
+
+        self.assertEqual(len(consultas_a_usuario()), 1) # (Fallo: se lee y queda en caché)
+        self.assertEqual(consultas_a_usuario(), [])     # (Acierto)
+
+        # Guardar el usuario (como el formulario o el admin) lo saca de la caché
+        admin.nombre = admin.nombre + ' '
+        admin.save()
+        self.assertIsNone(cache.get(clave_principal(admin.id_usuario)))
+        self.assertEqual(len(consultas_a_usuario()), 1)
+
+        # (Esta petición también es un acierto)
+        estadisticas = self.client.get('/api/token/cache/').data
+        self.assertEqual((estadisticas['aciertos'], estadisticas['fallos']), (2, 2))
+
+        # Solo los Administradores ven las estadísticas
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self._get_jwt_token(self.EMAIL_CORREDOR_A)}')
+        self.assertEqual(self.client.get('/api/token/cache/').status_code, status.HTTP_403_FORBIDDEN)
+
+@override_settings(IMPORTACION_EN_SEGUNDO_PLANO=False)
+class CargaMasivaTests(TestCase):
+    """
+    Pruebas de la Carga Masiva (Factores) por lotes.
+    (También asumen la BBDD poblada con el seed.)
+    """
+    PASSWORD_PRUEBA = 'admin123'
+    EMAIL_ADMIN = 'admin@mail.com'
+
+    CABECERAS = [
+        'Ejercicio', 'Mercado', 'Instrumento', 'Fecha',
+        'Secuencia', 'Numero de dividendo', 'Tipo sociedad', 'Valor Historico'
+    ] + [f'Factor {i}' for i in range(8, 38)]
+
+    def _login_web(self, email):
+        """Inicia sesión en la web (sesión personalizada, no JWT)."""
+        response = self.client.post('/usuarios/login/', {
+            'correo': email,
+            'password': self.PASSWORD_PRUEBA
+        })
+        self.assertEqual(response.status_code, 302, f"No se pudo iniciar sesión como {email}.")
+
+    def _fila(self, secuencia, fecha='01-12-2025', factor_08='0.5'):
+        return ['2025', 'ACN', 'Test Carga Lotes', fecha, secuencia, '1', 'SA', '100', factor_08] + ['0'] * 29
+
+    def _subir(self, url, filas, accept='*/*', **datos):
+        contenido = '\n'.join([','.join(self.CABECERAS)] + [','.join(f) for f in filas])
+        archivo = SimpleUploadedFile('carga_lotes.csv', contenido.encode('utf-8'), content_type='text/csv')
+        return self.client.post(url, {'archivo_csv': archivo, **datos}, HTTP_ACCEPT=accept)
+
+    def test_carga_masiva_por_lotes_reporta_fila_a_fila(self):
+        """
+        Prueba que la carga por lotes guarda las filas válidas (enlazadas
+        a su Archivo) y reporta las inválidas con su número de línea.
+        """
+        print("Ejecutando Test: test_carga_masiva_por_lotes_reporta_fila_a_fila...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        filas = [
+            self._fila('LOTE-1'),
+            self._fila('LOTE-2', fecha='2025/12/01'), # Fecha inválida (línea 3)
+            self._fila('LOTE-3', factor_08='1.5'),    # Suma > 1 (se guarda como 'Invalido')
+        ]
+        self._subir('/calificaciones/carga-masiva/', filas)
+
+        archivo = Archivo.objects.filter(nombre_archivo='carga_lotes.csv').latest('id_archivo')
+        calificaciones = Calificacion.objects.filter(id_archivo=archivo)
+        self.assertEqual(calificaciones.count(), 2)
+        self.assertEqual(
+            calificaciones.filter(id_estado__nombre='Invalido').count(), 1
+        )
+
+        log = Log.objects.filter(accion='IMPORT').latest('id_log')
+        self.assertIn('1 válidos, 2 inválidos', log.detalle)
+
+        # El detalle fila a fila queda en 'ErrorImportacion' (el Log solo guarda el resumen)
+        errores = ErrorImportacion.objects.filter(id_archivo=archivo).order_by('fila')
+        self.assertEqual(
+            [(e.fila, e.columna, e.codigo) for e in errores],
+            [(3, 'Fecha', 'fecha'), (4, 'Factor 8-19', 'suma_factores')]
+        )
+        self.assertNotIn('Fila 3:', log.detalle)
+
+        response = self.client.get(f'/calificaciones/importaciones/archivos/{archivo.id_archivo}/errores/')
+        self.assertContains(response, 'Formato de fecha inválido')
+
+    @override_settings(IMPORTACION_EN_SEGUNDO_PLANO=True)
+    def test_carga_en_segundo_plano_con_worker(self):
+        """
+        Prueba que la vista solo encola el archivo (responde de inmediato)
+        y que el worker ('procesar_importaciones --una-vez') lo procesa.
+        """
+        print("Ejecutando Test: test_carga_en_segundo_plano_con_worker...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        response = self._subir('/calificaciones/carga-masiva/', [self._fila('COLA-1'), self._fila('COLA-2')])
+        self.assertEqual(response.status_code, 302)
+
+        trabajo = TrabajoImportacion.objects.latest('id_trabajo')
+        self.assertEqual(trabajo.estado, TrabajoImportacion.ESTADO_PENDIENTE)
+        self.assertFalse(Calificacion.objects.filter(id_archivo=trabajo.id_archivo).exists())
+        ruta = trabajo.id_archivo.ruta
+        self.assertTrue(default_storage.exists(ruta))
+
+        call_command('procesar_importaciones', '--una-vez')
+
+        progreso = self.client.get(f'/calificaciones/importaciones/{trabajo.id_trabajo}/progreso/').json()
+        self.assertEqual(progreso['estado'], TrabajoImportacion.ESTADO_COMPLETADO)
+        self.assertEqual(progreso['registros_validos'], 2)
+
+        # El CSV subido se borra al terminar
+        self.assertFalse(default_storage.exists(ruta))
+        self.assertIsNone(Archivo.objects.get(pk=trabajo.id_archivo_id).ruta)
+
+    @override_settings(IMPORTACION_EN_SEGUNDO_PLANO=True, TRABAJOS_MAX_INTENTOS=2)
+    def test_trabajo_de_un_worker_muerto_se_recupera(self):
+        """
+        Prueba que un trabajo 'Procesando' cuyo worker dejó de dar señales
+        vuelve a 'Pendiente' (sin sus errores por fila), y que al agotar los
+        intentos queda en 'Error' con su Archivo 'Rechazado'.
+        """
+        print("Ejecutando Test: test_trabajo_de_un_worker_muerto_se_recupera...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila('COLGADO-1')])
+        trabajo = TrabajoImportacion.objects.latest('id_trabajo')
+        vencido = timezone.now() - timedelta(minutes=settings.TRABAJOS_LATIDO_VENCIDO_MINUTOS + 1)
+
+        def morir():
+            # Un worker lo reclama y muere sin terminarlo
+            self.assertEqual(reclamar_trabajo('worker-muerto').id_trabajo, trabajo.id_trabajo)
+            self.assertEqual(recuperar_colgados(TrabajoImportacion), 0) # (Aún con latido reciente)
+            TrabajoImportacion.objects.filter(id_trabajo=trabajo.id_trabajo).update(fecha_latido=vencido)
+            self.assertEqual(recuperar_colgados(TrabajoImportacion), 1)
+            trabajo.refresh_from_db()
+
+        ErrorImportacion.objects.create(id_archivo=trabajo.id_archivo, fila=2, codigo='fecha', mensaje='Parcial')
+        ruta = trabajo.id_archivo.ruta
+        morir()
+        self.assertEqual((trabajo.estado, trabajo.intentos, trabajo.worker), (TrabajoImportacion.ESTADO_PENDIENTE, 1, None))
+        self.assertFalse(ErrorImportacion.objects.filter(id_archivo=trabajo.id_archivo).exists())
+        self.assertTrue(default_storage.exists(ruta)) # (Se va a reintentar)
+
+        morir()
+        self.assertEqual((trabajo.estado, trabajo.intentos), (TrabajoImportacion.ESTADO_ERROR, 2))
+        self.assertEqual(Archivo.objects.get(pk=trabajo.id_archivo_id).estado_validacion, 'Rechazado')
+        self.assertFalse(default_storage.exists(ruta))
+        progreso = self.client.get(f'/calificaciones/importaciones/{trabajo.id_trabajo}/progreso/').json()
+        self.assertEqual(progreso['estado'], TrabajoImportacion.ESTADO_ERROR)
+
+    def test_reimportar_actualiza_en_vez_de_duplicar(self):
+        """
+        Prueba que un archivo idéntico no se vuelve a procesar, y que otro
+        archivo con la misma clave natural (mercado, instrumento, año,
+        secuencia, evento) actualiza los factores en vez de duplicar la fila.
+        """
+        print("Ejecutando Test: test_reimportar_actualiza_en_vez_de_duplicar...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila('REIMPORT-1')])
+        archivos_antes = Archivo.objects.count()
+
+        # 1. Mismo archivo (ej. reintento tras un timeout): no se crea otro Archivo
+        self._subir('/calificaciones/carga-masiva/', [self._fila('REIMPORT-1')])
+        self.assertEqual(Archivo.objects.count(), archivos_antes)
+
+        # 2. Misma clave con otro factor: se actualiza la misma calificación
+        self._subir('/calificaciones/carga-masiva/', [self._fila('REIMPORT-1', factor_08='0.25')])
+        calificaciones = Calificacion.objects.filter(calificaciontributaria__secuencia_evento='REIMPORT-1')
+        self.assertEqual(calificaciones.count(), 1)
+        factor = Factortributario.objects.get(
+            id_calificacion_tributaria__id_calificacion=calificaciones.get(), codigo_factor='F08'
+        )
+        self.assertEqual(factor.valor_factor, Decimal('0.25'))
+
+        log = Log.objects.filter(accion='IMPORT').latest('id_log')
+        self.assertIn('1 actualizados', log.detalle)
+
+    def test_reimportar_factor_con_8_decimales_sin_cambios(self):
+        """
+        Prueba que un factor con más de 2 decimales se guarda igual al crear
+        y al volver a importarlo: la re-importación no lo cuenta como cambio
+        y la tabla pivote mantiene los 8 decimales.
+        """
+        print("Ejecutando Test: test_reimportar_factor_con_8_decimales_sin_cambios...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        fila = self._fila('REIMPORT-8DEC', factor_08='0.33333333')
+        self._subir('/calificaciones/carga-masiva/', [fila])
+        # (Otro archivo, para que no se descarte como repetido, con la misma fila)
+        self._subir('/calificaciones/carga-masiva/', [fila, self._fila('REIMPORT-8DEC-2')])
+
+        log = Log.objects.filter(accion='IMPORT').latest('id_log')
+        self.assertIn('0 actualizados, 1 sin cambios', log.detalle)
+        calificacion = Calificacion.objects.get(calificaciontributaria__secuencia_evento='REIMPORT-8DEC')
+        self.assertEqual(CalificacionPivote.objects.get(pk=calificacion.pk).f08, Decimal('0.33333333'))
+        factor = Factortributario.objects.get(id_calificacion_tributaria__id_calificacion=calificacion, codigo_factor='F08')
+        self.assertEqual(factor.valor_factor, Decimal('0.33333333'))
+
+    def test_lote_toma_la_secuencia_al_final(self):
+        """
+        Prueba que dentro de una 'escritura_pivote' las filas quedan con la
+        secuencia PENDIENTE y la versión de la tabla pivote no se toca (no
+        se bloquea su fila) hasta cerrar el bloque, donde se sellan todas.
+        """
+        print("Ejecutando Test: test_lote_toma_la_secuencia_al_final...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila('SELLO-1')])
+        calificacion = Calificacion.objects.get(calificaciontributaria__secuencia_evento='SELLO-1')
+        alta = CalificacionPivote.objects.get(pk=calificacion.pk).secuencia_alta
+
+        antes = version_actual(TABLA_PIVOTE)
+        with escritura_pivote():
+            actualizar_pivote([calificacion.pk])
+            self.assertEqual(version_actual(TABLA_PIVOTE), antes)
+            self.assertEqual(CalificacionPivote.objects.get(pk=calificacion.pk).secuencia_cambio, PENDIENTE)
+
+        fila = CalificacionPivote.objects.get(pk=calificacion.pk)
+        self.assertEqual((fila.secuencia_cambio, fila.secuencia_alta), (antes + 1, alta))
+
+    def test_solo_validar_reporta_errores_sin_guardar(self):
+        """
+        Prueba que 'Solo validar' revisa todas las filas (fecha, números y
+        suma de factores), entrega el reporte paginado y NO escribe en la BBDD.
+        """
+        print("Ejecutando Test: test_solo_validar_reporta_errores_sin_guardar...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        archivos_antes = Archivo.objects.count()
+        filas = [
+            self._fila('VALIDAR-1'),
+            self._fila('VALIDAR-2', fecha='2025/12/01'),  # Fecha inválida (línea 3)
+            self._fila('VALIDAR-3', factor_08='abc'),     # Número inválido (línea 4)
+            self._fila('VALIDAR-4', factor_08='1.5'),     # Suma > 1 (línea 5)
+        ]
+        response = self._subir('/calificaciones/carga-masiva/', filas, solo_validar='1', accept='application/json')
+        reporte = response.json()
+
+        self.assertEqual(Archivo.objects.count(), archivos_antes)
+        self.assertFalse(Calificacion.objects.filter(calificaciontributaria__secuencia_evento__startswith='VALIDAR').exists())
+        self.assertEqual((reporte['filas'], reporte['filas_validas'], reporte['filas_con_error']), (4, 1, 3))
+        self.assertEqual(
+            [(e['fila'], e['codigo']) for e in reporte['errores']],
+            [(3, 'fecha'), (4, 'decimal'), (5, 'suma_factores')]
+        )
+
+        # Segunda página (de a 2 errores) y descarga completa en CSV
+        pagina_2 = self.client.get(f"/calificaciones/importaciones/validaciones/{reporte['id_reporte']}/?pagina=2&por_pagina=2").json()
+        self.assertEqual([e['fila'] for e in pagina_2['errores']], [5])
+        descarga = self.client.get(reporte['csv'])
+        self.assertIn('4,Factor 8,decimal', b''.join(descarga.streaming_content).decode('utf-8'))
+
+
+    def test_tabla_pivote_sigue_a_las_escrituras(self):
+        """
+        Prueba que la tabla pivote (una fila por calificación, F08..F37 en
+        columnas) queda al día tras importar, reimportar y eliminar, y que
+        'reconstruir_pivote' llega a lo mismo.
+        """
+        print("Ejecutando Test: test_tabla_pivote_sigue_a_las_escrituras...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila('PIVOTE-1')])
+        calif = Calificacion.objects.get(calificaciontributaria__secuencia_evento='PIVOTE-1')
+        fila = CalificacionPivote.objects.get(pk=calif.pk)
+        self.assertEqual((fila.anio, fila.origen, fila.activo, fila.f08, fila.f09), ('2025', 'archivo', True, Decimal('0.5'), None))
+
+        # Reimportar con otro factor actualiza la misma fila
+        self._subir('/calificaciones/carga-masiva/', [self._fila('PIVOTE-1', factor_08='0.25')])
+        self.assertEqual(CalificacionPivote.objects.get(pk=calif.pk).f08, Decimal('0.25'))
+        self.assertContains(self.client.get('/calificaciones/?anio=2025'), 'PIVOTE-1')
+
+        # El borrado lógico la saca de la Lista (la fila queda, inactiva)
+        self.client.post(f'/calificaciones/{calif.pk}/eliminar/')
+        self.assertFalse(CalificacionPivote.objects.get(pk=calif.pk).activo)
+        self.assertNotContains(self.client.get('/calificaciones/'), 'PIVOTE-1')
+
+        # Los factores pivoteados por la BBDD (MAX(CASE WHEN ...)) son los de Factortributario
+        (fila_bd,) = factores_por_tributaria([fila.id_calificacion_tributaria_id])
+        self.assertEqual(fila_bd[1], Decimal('0.25'))
+        self.assertEqual(fila_bd[2:], (None,) * 29)
+
+        antes = list(CalificacionPivote.objects.order_by('pk').values())
+        call_command('reconstruir_pivote')
+        self.assertEqual(list(CalificacionPivote.objects.order_by('pk').values()), antes)
+
+        # Por trozos: cada trozo con lo reparado se confirma con su propia secuencia
+        self._subir('/calificaciones/carga-masiva/', [self._fila('PIVOTE-2')])
+        datos = lambda: list(CalificacionPivote.objects.order_by('pk').values_list('pk', 'f08', 'activo'))
+        antes = datos()
+        reparar = [pk for pk, _, _ in antes[:2]]
+        CalificacionPivote.objects.filter(pk__in=reparar).update(f08=Decimal('0.99'))
+        avance = []
+        total = reconstruir_pivote(tamano=1, al_avanzar=lambda total, reparadas: avance.append((total, reparadas)))
+        self.assertEqual(datos(), antes)
+        self.assertEqual(avance, [(i, 1 if i <= 2 else 0) for i in range(1, total + 1)])
+        secuencias = dict(CalificacionPivote.objects.filter(pk__in=reparar).values_list('pk', 'secuencia_cambio'))
+        self.assertLess(secuencias[reparar[0]], secuencias[reparar[1]])
+
+
+    def test_lista_paginada_por_cursor(self):
+        """
+        Prueba que la Lista pagina por clave (fecha_registro, id): recorrer
+        las páginas con 'Siguiente' y volver con 'Anterior' da las mismas
+        filas, en el mismo orden, sin repetir ni saltar ninguna.
+        """
+        print("Ejecutando Test: test_lista_paginada_por_cursor...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila(f'PAGINA-{i}') for i in range(5)])
+
+        paginas, url = [], '/calificaciones/?anio=2025&por_pagina=2'
+        while url:
+            response = self.client.get(url)
+            paginas.append([fila.pk for fila in response.context['calificaciones']])
+            siguiente = response.context['url_siguiente']
+            url = siguiente and f'/calificaciones/{siguiente}'
+        ids = [pk for pagina in paginas for pk in pagina]
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(ids, list(CalificacionPivote.objects.filter(activo=True, anio='2025').order_by('-fecha_registro', '-pk').values_list('pk', flat=True)))
+
+        # Hacia atrás desde la última página
+        anterior = response.context['url_anterior']
+        response = self.client.get(f'/calificaciones/{anterior}')
+        self.assertEqual([fila.pk for fila in response.context['calificaciones']], paginas[-2])
+
+
+    def test_exportacion_por_partes_y_comprimida(self):
+        """
+        Prueba que la Exportación sale por partes (cabecera primero, luego un
+        trozo de filas por vez) y que la versión .gz es el mismo CSV comprimido.
+        """
+        print("Ejecutando Test: test_exportacion_por_partes_y_comprimida...")
+
+        from . import exportacion
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila(f'EXPORTA-{i}') for i in range(5)])
+
+        with mock.patch.object(exportacion, 'TAMANO_TROZO', 2):
+            response = self.client.get('/calificaciones/exportar-csv/?anio=2025')
+            self.assertTrue(response.streaming)
+            partes = list(response.streaming_content)
+        contenido = b''.join(partes).decode('utf-8-sig')
+        filas = list(csv.reader(io.StringIO(contenido), delimiter=';'))
+        total = CalificacionPivote.objects.filter(activo=True, anio='2025').count()
+        self.assertEqual(len(filas), total + 1)
+        self.assertEqual(filas[0][:2], ['Ejercicio', 'Mercado'])
+        self.assertEqual(sum(f[4].startswith('EXPORTA-') for f in filas), 5)
+        self.assertGreater(len(partes), 2) # (cabecera + varios trozos)
+
+        response = self.client.get('/calificaciones/exportar-csv/?anio=2025&formato=csv.gz')
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)).decode('utf-8-sig'), contenido)
+
+
+    def test_exportacion_en_segundo_plano_se_reutiliza(self):
+        """
+        Prueba que la exportación en segundo plano guarda los filtros, que el
+        worker arma el .csv.gz (igual a la exportación directa), y que un
+        pedido igual reutiliza el archivo hasta que cambian los datos.
+        """
+        print("Ejecutando Test: test_exportacion_en_segundo_plano_se_reutiliza...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila('SEGUNDO-PLANO-1')])
+
+        response = self.client.get('/calificaciones/exportaciones/encolar/?anio=2025')
+        self.assertEqual(response.status_code, 302)
+        trabajo = TrabajoExportacion.objects.latest('id_trabajo')
+        self.assertEqual(trabajo.estado, TrabajoExportacion.ESTADO_PENDIENTE)
+
+        call_command('procesar_exportaciones', '--una-vez')
+
+        progreso = self.client.get(f'/calificaciones/exportaciones/{trabajo.id_trabajo}/progreso/').json()
+        self.assertEqual(progreso['estado'], TrabajoExportacion.ESTADO_COMPLETADO)
+        descarga = self.client.get(progreso['url_descarga'])
+        directo = self.client.get('/calificaciones/exportar-csv/?anio=2025')
+        self.assertEqual(gzip.decompress(b''.join(descarga.streaming_content)), b''.join(directo.streaming_content))
+
+        # Mismo pedido, mismos datos: no se crea otro trabajo
+        self.client.get('/calificaciones/exportaciones/encolar/?anio=2025')
+        self.assertEqual(TrabajoExportacion.objects.latest('id_trabajo').id_trabajo, trabajo.id_trabajo)
+
+        # Cambian los datos: el mismo pedido arma un archivo nuevo
+        self._subir('/calificaciones/carga-masiva/', [self._fila('SEGUNDO-PLANO-2')])
+        self.client.get('/calificaciones/exportaciones/encolar/?anio=2025')
+        self.assertNotEqual(TrabajoExportacion.objects.latest('id_trabajo').id_trabajo, trabajo.id_trabajo)
+
+
+    @skipUnless(pyarrow, 'Requiere pyarrow (formato Parquet opcional)')
+    def test_exportacion_parquet_con_tipos(self):
+        """
+        Prueba que la exportación Parquet tiene las mismas filas que el CSV,
+        con los factores como decimales (no texto) y los nombres como diccionario.
+        """
+        print("Ejecutando Test: test_exportacion_parquet_con_tipos...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        self._subir('/calificaciones/carga-masiva/', [self._fila('PARQUET-1', factor_08='0.25')])
+
+        response = self.client.get('/calificaciones/exportar-csv/?anio=2025&formato=parquet')
+        tabla = pyarrow.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(tabla.num_rows, CalificacionPivote.objects.filter(activo=True, anio='2025').count())
+        self.assertTrue(pyarrow.types.is_dictionary(tabla.schema.field('mercado').type))
+
+        fila = next(f for f in tabla.to_pylist() if f['secuencia_evento'] == 'PARQUET-1')
+        self.assertEqual(fila['F08'], Decimal('0.25'))
+        self.assertIsNone(fila['F37']) # (En el CSV sale 0.00)
+
+
+    def test_get_condicional_con_la_version_de_los_datos(self):
+        """
+        Prueba que la Exportación responde 304 (sin volver a consultar la
+        tabla pivote) mientras los datos no cambian, y 200 después de una carga.
+        """
+        print("Ejecutando Test: test_get_condicional_con_la_version_de_los_datos...")
+
+        self._login_web(self.EMAIL_ADMIN)
+        url = '/calificaciones/exportar-csv/?anio=2025'
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        with self.assertNumQueries(2): # (La sesión y la versión de los datos)
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self._subir('/calificaciones/carga-masiva/', [self._fila('CONDICIONAL-1')])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+        # Escribir en el Log no toca 'version_datos' (no pone en fila a las escrituras)
+        with CaptureQueriesContext(connection) as consultas:
+            Log.objects.create(fecha=timezone.now(), accion='INSERT', detalle='Sin versión')
+        self.assertFalse([q for q in consultas.captured_queries if 'version_datos' in q['sql']])
+
+
+@skipUnless(connection.vendor != 'sqlite', 'SQLite admite un solo escritor a la vez')
+class EscrituraConcurrenteTests(TestCase):
+    """
+    Dos escrituras largas de la tabla pivote (ej. dos workers de la Carga
+    Masiva) en conexiones distintas no se esperan entre sí: la versión se
+    toma al final de cada una. (Los hilos confirman en la BBDD de pruebas;
+    al final se borran sus filas.)
+    """
+    IDS = (990000001, 990000002)
+
+    def _escribir(self, pk):
+        guardar_pivote([CalificacionPivote(id_calificacion_id=pk, origen='bolsa', activo=True)], nuevas=True)
+
+    def test_dos_lotes_a_la_vez_no_se_bloquean(self):
+        print("Ejecutando Test: test_dos_lotes_a_la_vez_no_se_bloquean...")
+
+        primero_abierto = threading.Event()
+        segundo_listo = threading.Event()
+        resultado = {}
+
+        def primero():
+            try:
+                with escritura_pivote():
+                    self._escribir(self.IDS[0])
+                    primero_abierto.set()
+                    # Sigue abierto (como un lote largo) mientras el segundo escribe y confirma
+                    resultado['segundo_antes'] = segundo_listo.wait(timeout=20)
+            finally:
+                connection.close()
+
+        def segundo():
+            try:
+                primero_abierto.wait(timeout=20)
+                with escritura_pivote():
+                    self._escribir(self.IDS[1])
+                segundo_listo.set()
+            finally:
+                connection.close()
+
+        def secuencias():
+            # (Desde otra conexión: la de la prueba no ve lo que confirmaron los hilos)
+            try:
+                resultado['secuencias'] = dict(
+                    CalificacionPivote.objects.filter(pk__in=self.IDS).values_list('pk', 'secuencia_cambio')
+                )
+                CalificacionPivote.objects.filter(pk__in=self.IDS).delete()
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=primero), threading.Thread(target=segundo)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(timeout=60)
+        limpieza = threading.Thread(target=secuencias)
+        limpieza.start()
+        limpieza.join(timeout=60)
+
+        self.assertTrue(resultado.get('segundo_antes'), 'El segundo lote esperó a que el primero terminara.')
+        # El orden de las secuencias es el de los COMMIT
+        self.assertLess(resultado['secuencias'][self.IDS[1]], resultado['secuencias'][self.IDS[0]])
+
+
+@skipUnless(connection.vendor != 'sqlite', 'SQLite admite un solo escritor a la vez')
+class LotesAPIConcurrentesTests(APITestCase):
+    """
+    Dos POST a 'bulk/' a la vez (ambos de "Bolsa": sin usuario ni archivo)
+    no se confunden las PK ni caen a filas sueltas. (Los hilos confirman
+    en la BBDD de pruebas; al final se borran sus filas.)
+    """
+    ITEMS = 20
+
+    def test_dos_lotes_a_la_vez_recuperan_sus_ids(self):
+        print("Ejecutando Test: test_dos_lotes_a_la_vez_recuperan_sus_ids...")
+
+        respuesta = self.client.post(
+            '/api/token/', {'username': 'admin@mail.com', 'password': 'admin123'}, format='json'
+        )
+        token = respuesta.data['access']
+        barrera = threading.Barrier(2, timeout=20)
+        resultados = {}
+
+        def lote(prefijo):
+            try:
+                cliente = APIClient()
+                cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+                items = [
+                    {"mercado_nombre": "ACN", "instrumento_nombre": "Test API Concurrente",
+                     "fecha_pago": "2025-12-01", "secuencia_evento": f'{prefijo}-{i}',
+                     "anio": 2025, "factor_08": "0.5"}
+                    for i in range(self.ITEMS)
+                ]
+                barrera.wait()
+                resultados[prefijo] = cliente.post('/api/v1/calificaciones/bulk/', items, format='json')
+            finally:
+                connection.close()
+
+        def revisar_y_limpiar():
+            # (Desde otra conexión: la de la prueba no ve lo que confirmaron los hilos)
+            try:
+                tributarias = Calificaciontributaria.objects.filter(secuencia_evento__startswith='CONCURRENTE-')
+                resultados['secuencias'] = dict(tributarias.values_list('id_calificacion_id', 'secuencia_evento'))
+                ids = list(resultados['secuencias'])
+                Factortributario.objects.filter(id_calificacion_tributaria__in=tributarias).delete()
+                CalificacionPivote.objects.filter(pk__in=ids).delete()
+                tributarias.delete()
+                Calificacion.objects_all.filter(pk__in=ids).delete()
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=lote, args=(prefijo,)) for prefijo in ('CONCURRENTE-A', 'CONCURRENTE-B')]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join(timeout=60)
+        limpieza = threading.Thread(target=revisar_y_limpiar)
+        limpieza.start()
+        limpieza.join(timeout=60)
+
+        for prefijo in ('CONCURRENTE-A', 'CONCURRENTE-B'):
+            response = resultados[prefijo]
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED, response.data)
+            # Cada índice quedó con la PK de su propia calificación
+            for r in response.data['resultados']:
+                self.assertEqual(resultados['secuencias'][r['id_calificacion']], f"{prefijo}-{r['indice']}")
+
+
+class LecturaCSVIncrementalTests(SimpleTestCase):
+    """
+    Pruebas de la lectura incremental del CSV subido (no usan la BBDD).
+    """
+
+    def test_lectura_por_trozos_equivale_a_leer_todo(self):
+        """
+        Prueba que leer el archivo trozo a trozo (con BOM, '\\r\\n' y
+        campos multilínea partidos entre trozos) da las mismas filas
+        que el antiguo 'read().decode()' + 'io.StringIO'.
+        """
+        print("Ejecutando Test: test_lectura_por_trozos_equivale_a_leer_todo...")
+
+        texto = 'Ejercicio,Mercado,Instrumento\r\n2025,"ACN\r\nBis",Ñandú\r\n2024,,€'
+        archivo = SimpleUploadedFile('bom.csv', '﻿'.encode('utf-8') + texto.encode('utf-8'))
+        archivo.DEFAULT_CHUNK_SIZE = 3 # Trozos diminutos para forzar los cortes
+
+        filas = list(leer_csv_subido(archivo))
+        esperado = list(csv.DictReader(io.StringIO(texto, newline='')))
+
+        self.assertEqual(filas, esperado)
+        self.assertEqual(filas[0]['Mercado'], 'ACN\r\nBis')
+
+    def test_validar_bloque_con_tuplas_compactas(self):
+        """
+        Prueba que un bloque enviado como tuplas (formato del pool de
+        procesos) valida igual que las filas tipo diccionario, y que
+        los errores vuelven como texto con su número de línea.
+        """
+        print("Ejecutando Test: test_validar_bloque_con_tuplas_compactas...")
+
+        cabeceras = ['Ejercicio', 'Mercado', 'Instrumento', 'Fecha', 'Secuencia',
+                     'Numero de dividendo', 'Tipo sociedad', 'Valor Historico', 'Factor 8']
+        buena = ('2025', 'ACN', 'BHP', '15-03-2025', '1', '1', 'A', '100', '0.5')
+        mala = ('2025', 'ACN', 'BHP', '2025-03-15', '2', '1', 'A', '100', '0.5')
+        bloque = [(2, buena), (3, mala)]
+
+        filas_ok, errores = validar_bloque(validar_fila_factores, bloque, cabeceras)
+        esperado = validar_fila_factores(dict(zip(cabeceras, buena)))
+
+        self.assertEqual(filas_ok, [(2, esperado)])
+        self.assertEqual(filas_ok[0][1].factores, (('F08', 'Factor 8', Decimal('0.5')),))
+        self.assertEqual(len(errores), 1)
+        numero_linea, columna, codigo, mensaje = errores[0]
+        self.assertEqual((numero_linea, columna, codigo), (3, 'Fecha', 'fecha'))
+        self.assertIn('Formato de fecha inválido', mensaje)
+
+    def test_generador_de_benchmark_es_reproducible(self):
+        """
+        Prueba que el generador de CSV sintéticos de 'benchmarks' usa las
+        cabeceras que exigen las vistas, repite el archivo con la misma
+        semilla, respeta la cardinalidad y que sus filas con error son
+        justamente las que rechaza la validación.
+        """
+        print("Ejecutando Test: test_generador_de_benchmark_es_reproducible...")
+        from benchmarks.generador import escribir_csv
+        from .importacion import TIPOS_CARGA
+
+        for tipo, config in TIPOS_CARGA.items():
+            destino, copia = io.StringIO(newline=''), io.StringIO(newline='')
+            opciones = dict(instrumentos=3, mercados=2, tasa_error=0.2, semilla=7)
+            escribir_csv(tipo, destino, 200, **opciones)
+            escribir_csv(tipo, copia, 200, **opciones)
+            self.assertEqual(destino.getvalue(), copia.getvalue())
+
+            filas = list(csv.DictReader(io.StringIO(destino.getvalue(), newline='')))
+            self.assertEqual(len(filas), 200)
+            for cabecera in config['cabeceras']:
+                self.assertIn(cabecera, filas[0])
+            self.assertLessEqual(len({f['Instrumento'] for f in filas}), 3)
+            self.assertLessEqual(len({f['Mercado'] for f in filas}), 2)
+
+            filas_ok, errores = validar_bloque(config['validar_fila'], enumerate(filas, start=2))
+            invalidas = [f for _, f in filas_ok if not f.valido] # (suma de factores > 1)
+            self.assertTrue(0 < len(errores) + len(invalidas) < 100)
+
+
+class MotorFactoresTests(SimpleTestCase):
+    """
+    Pruebas del motor de factores (regla Montos -> Factores, no usa la BBDD).
+    """
+
+    def test_regla_montos_a_factores(self):
+        """
+        Prueba la regla: F08-F33 = monto / suma(F08-F19) a 8 decimales
+        (ROUND_HALF_UP), F34-F37 se copian y con suma 0 todo queda en 0.
+        """
+        print("Ejecutando Test: test_regla_montos_a_factores...")
+
+        montos = ['100', '200'] + [''] * 10 + ['1'] + [''] * 13 + ['0.5', '', '', '']
+        factores = calcular_factores_lote([montos])[0]
+
+        self.assertEqual(factores[0], Decimal('0.33333333'))
+        self.assertEqual(factores[1], Decimal('0.66666667')) # (Redondeo hacia arriba)
+        self.assertEqual(factores[12], Decimal('0.00333333'))
+        self.assertEqual(factores[26], Decimal('0.5'))
+
+        sin_base = [''] * 12 + ['5'] * 14 + ['0.1'] * 4
+        factores = calcular_factores_lote([sin_base])[0]
+        self.assertFalse(any(factores[:26]))
+        self.assertEqual(factores[26:], (Decimal('0.1'),) * 4)
+
+    def test_camino_rapido_igual_a_decimal(self):
+        """
+        Prueba que el camino rápido (enteros escalados) da exactamente el
+        mismo texto que el camino Decimal, incluso en empates, casi-empates
+        y valores que lo obligan a volver a Decimal.
+        """
+        print("Ejecutando Test: test_camino_rapido_igual_a_decimal...")
+        import random
+
+        azar = random.Random(1948)
+        valores_raros = ['', '0', '7', '0.5', '.5', '2.', '007', '1e3', '-1', ' 4', 3, None, Decimal('2.5')]
+        filas = []
+        for _ in range(3000):
+            forma = azar.randrange(4)
+            if forma == 0:
+                montos = [str(azar.randint(0, 5_000_000)) for _ in range(26)]
+            elif forma == 1:
+                montos = [f'{azar.uniform(0, 1000):.{azar.randint(0, 4)}f}' for _ in range(26)]
+            elif forma == 2:
+                montos = [str(azar.randint(0, 3)) for _ in range(26)] # (Muchos empates)
+            else:
+                montos = [azar.choice(valores_raros) for _ in range(26)]
+            filas.append(montos + [azar.choice(['', '0.50', '1', '0.123456789']) for _ in range(4)])
+        # 1 / 200000000 = 0.000000005 (justo en la mitad) y 1 / 200000001 (apenas bajo)
+        filas.append(['1'] + ['0'] * 10 + ['199999999'] + ['1'] * 14 + [''] * 4)
+        filas.append(['1'] + ['0'] * 10 + ['200000000'] + ['1'] * 14 + [''] * 4)
+
+        # (F34..F37 vacíos o en cero salen '0.00', como en la calculadora de siempre)
+        esperado = [
+            [format(f, 'f') for f in factores[:26]] + [format(f, 'f') if f else '0.00' for f in factores[26:]]
+            for factores in calcular_factores_lote(filas)
+        ]
+        self.assertEqual(calcular_factores_texto(filas), esperado)
+        self.assertEqual(esperado[-2][0], '0.00000001')
+        self.assertEqual(esperado[-1][0], '0.00000000')
+        self.assertEqual(
+            calcular_factores_texto([['1'] * 26 + ['', None, '0.50', '7'], ['-1'] * 26 + ['', None, '0.50', '7']]),
+            [['0.08333333'] * 26 + ['0.00', '0.00', '0.50', '7'], ['0.00000000'] * 26 + ['0.00', '0.00', '0.50', '7']]
+        )
+
+        # Los valores inválidos fallan igual en los dos caminos
+        for invalido in ('abc', 'NaN', True):
+            fila = [invalido] + [''] * 29
+            with self.assertRaises(ValueError):
+                calcular_factores_lote([fila])
+            with self.assertRaises(ValueError):
+                calcular_factores_texto([fila])
+
+    def test_calculadora_por_lotes_lee_por_trozos(self):
+        """
+        Prueba la calculadora por lotes: el arreglo JSON se lee por trozos
+        (filas cortadas entre lecturas), las filas inválidas quedan como
+        error sin detener el resto y NDJSON numera por línea.
+        """
+        print("Ejecutando Test: test_calculadora_por_lotes_lee_por_trozos...")
+        import json
+        from unittest import mock
+        from . import calculadora
+
+        filas = [{'factor_08': '100', 'factor_09': 300, 'factor_34': 0.5}, ['1'] * 30, {'factor_08': 'abc'}, [1, 2]]
+        cuerpo = io.BytesIO(json.dumps(filas).encode('utf-8'))
+        with mock.patch.object(calculadora, 'TAMANO_LECTURA', 7), mock.patch.object(calculadora, 'TAMANO_TROZO', 2):
+            trozos = calculadora.calcular_por_trozos(calculadora.leer_arreglo_json(cuerpo), max_filas=10)
+            respuesta = json.loads(''.join(calculadora.respuesta_json(trozos)))
+
+        self.assertEqual(len(respuesta['factores']), 4)
+        self.assertEqual(respuesta['factores'][0][:2], ['0.25000000', '0.75000000'])
+        self.assertEqual(respuesta['factores'][0][26], '0.5')
+        self.assertEqual(respuesta['factores'][1][0], '0.08333333')
+        self.assertEqual([e['fila'] for e in respuesta['errores']], [3, 4])
+        self.assertIsNone(respuesta['factores'][2])
+
+        cuerpo = io.BytesIO(b'{"factor_08": "1"}\n\n{malo\n' + b'["1"]\n' * 3)
+        lineas = [json.loads(l) for l in ''.join(calculadora.respuesta_ndjson(
+            calculadora.calcular_por_trozos(calculadora.leer_ndjson(cuerpo), max_filas=4)
+        )).splitlines()]
+        self.assertEqual(lineas[0]['factores'][0], '1.00000000')
+        self.assertEqual([l['fila'] for l in lineas], [1, 3, 4, 5]) # (La línea 2 está vacía)
+        self.assertIn('JSON inválido', lineas[1]['error'])
+        self.assertIn('hasta 4 filas', lineas[-1]['error'])
@@ -0,0 +1,370 @@
+import hashlib
+import json
+import os
+import socket
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+# Modelos
+from archivos.models import Archivo, TrabajoImportacion, ErrorImportacion
+from .models import CalificacionPivote, TrabajoExportacion
+
+# Motor de Carga Masiva
+from .importacion import importar_archivo, mensaje_error_importacion
+
+# Exportación
+from .consultas import filtrar_pivote
+from .exportacion import FORMATOS_ARCHIVO, escribir_archivo
+from .versiones import version_actual, TABLA_PIVOTE
+
+
+# ==========================================================
+#  ENCOLAR (Lo usan las vistas de Carga Masiva)
+# ==========================================================
+def encolar_importacion(archivo, usuario, tipo, archivo_csv):
+    """
+    Guarda el CSV subido en disco (MEDIA_ROOT/importaciones/) y crea el
+    'TrabajoImportacion' Pendiente que procesará un worker.
+    La petición HTTP termina de inmediato. El CSV se borra cuando el
+    trabajo termina ('Completado' o 'Error', ver 'borrar_csv_subido').
+    """
+    ruta = default_storage.save(
+        os.path.join(settings.IMPORTACION_DIRECTORIO, f'{archivo.id_archivo}_{archivo_csv.name}'),
+        archivo_csv
+    )
+    archivo.ruta = ruta
+    archivo.save()
+
+    return TrabajoImportacion.objects.create(
+        id_archivo=archivo,
+        id_usuario=usuario,
+        tipo=tipo,
+        estado=TrabajoImportacion.ESTADO_PENDIENTE,
+        fecha_creacion=timezone.now()
+    )
+
+
+# ==========================================================
+#  RECLAMAR (SELECT ... FOR UPDATE SKIP LOCKED)
+# ==========================================================
+def nombre_worker():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _reclamar(modelo, worker, relacionados=()):
+    """
+    Toma el trabajo Pendiente más antiguo de 'modelo' (TrabajoImportacion o
+    TrabajoExportacion) y lo marca 'Procesando'. Ver 'reclamar_trabajo'.
+    Antes, vuelve a encolar los que dejó colgados un worker muerto
+    (ver 'recuperar_colgados').
+    """
+    recuperar_colgados(modelo)
+    with transaction.atomic():
+        candidatos = (
+            modelo.objects
+            .select_for_update(skip_locked=True)
+            .filter(estado=modelo.ESTADO_PENDIENTE)
+            .order_by('id_trabajo')
+            .values_list('id_trabajo', flat=True)[:1]
+        )
+        for id_trabajo in list(candidatos):
+            ahora = timezone.now()
+            tomado = modelo.objects.filter(
+                id_trabajo=id_trabajo,
+                estado=modelo.ESTADO_PENDIENTE
+            ).update(
+                estado=modelo.ESTADO_PROCESANDO,
+                worker=worker,
+                fecha_inicio=ahora,
+                fecha_latido=ahora,
+                intentos=F('intentos') + 1
+            )
+            if tomado:
+                return modelo.objects.select_related(*relacionados).get(id_trabajo=id_trabajo)
+    return None
+
+
+def recuperar_colgados(modelo):
+    """
+    Los trabajos 'Procesando' sin aviso de vida ('fecha_latido') hace más de
+    TRABAJOS_LATIDO_VENCIDO_MINUTOS son de un worker que murió (sin memoria,
+    un deploy, un kill): vuelven a 'Pendiente' para que otro los tome, o
+    quedan en 'Error' si ya se reclamaron TRABAJOS_MAX_INTENTOS veces.
+    Cada uno pasa, ya con su nuevo estado, por el 'al_recuperar' de su
+    modelo (ver '_AL_RECUPERAR'). Devuelve cuántos recuperó.
+    """
+    al_recuperar = _AL_RECUPERAR.get(modelo)
+    limite = timezone.now() - timedelta(minutes=settings.TRABAJOS_LATIDO_VENCIDO_MINUTOS)
+    colgados = modelo.objects.filter(estado=modelo.ESTADO_PROCESANDO).filter(
+        # (Los reclamados antes de que existiera 'fecha_latido', por su 'fecha_inicio')
+        Q(fecha_latido__lt=limite) | Q(fecha_latido__isnull=True, fecha_inicio__lt=limite)
+    )
+    recuperados = 0
+    for trabajo in colgados:
+        if trabajo.intentos >= settings.TRABAJOS_MAX_INTENTOS:
+            cambios = {
+                'estado': modelo.ESTADO_ERROR,
+                'mensaje': f'El worker {trabajo.worker} dejó de responder y ya se intentó {trabajo.intentos} veces.',
+                'fecha_fin': timezone.now(),
+            }
+        else:
+            cambios = {'estado': modelo.ESTADO_PENDIENTE, 'worker': None}
+        with transaction.atomic():
+            # (Condicionado: si otro worker ya lo recuperó, o el dueño dio señales, no se toca)
+            if not modelo.objects.filter(
+                id_trabajo=trabajo.id_trabajo, estado=modelo.ESTADO_PROCESANDO, fecha_latido=trabajo.fecha_latido
+            ).update(**cambios):
+                continue
+            for campo, valor in cambios.items():
+                setattr(trabajo, campo, valor)
+            if al_recuperar:
+                al_recuperar(trabajo)
+        recuperados += 1
+    return recuperados
+
+
+def reclamar_trabajo(worker=None):
+    """
+    Toma el trabajo Pendiente más antiguo y lo marca 'Procesando'.
+
+    Usa 'SELECT ... FOR UPDATE SKIP LOCKED' para que varios workers en
+    paralelo tomen archivos distintos sin bloquearse entre sí. En motores
+    sin SKIP LOCKED (ej. SQLite en pruebas locales) el UPDATE condicionado
+    por estado evita que dos workers tomen el mismo trabajo.
+    Devuelve None si no hay trabajos pendientes.
+    """
+    return _reclamar(TrabajoImportacion, worker or nombre_worker(), ('id_archivo', 'id_usuario'))
+
+
+def _importacion_recuperada(trabajo):
+    """
+    Un trabajo de Carga Masiva recuperado de un worker muerto: los lotes que
+    alcanzó a confirmar quedan (al reintentar se cuentan 'sin cambios'), pero
+    sus errores por fila se borran, porque el reintento los vuelve a registrar.
+    Si quedó en 'Error', su Archivo queda 'Rechazado' (se puede volver a subir).
+    """
+    if trabajo.estado == TrabajoImportacion.ESTADO_PENDIENTE:
+        ErrorImportacion.objects.filter(id_archivo_id=trabajo.id_archivo_id).delete()
+    else:
+        trabajo.id_archivo.estado_validacion = 'Rechazado'
+        trabajo.id_archivo.save()
+        borrar_csv_subido(trabajo.id_archivo)
+
+
+def borrar_csv_subido(archivo):
+    """
+    Borra de default_storage el CSV que 'encolar_importacion' guardó para el
+    worker (el Archivo queda, sin 'ruta'). Se llama cuando su trabajo ya
+    terminó: mientras pueda reintentarse, el CSV se conserva.
+    """
+    if archivo.ruta:
+        default_storage.delete(archivo.ruta)
+        Archivo.objects.filter(id_archivo=archivo.id_archivo).update(ruta=None)
+        archivo.ruta = None
+
+
+# Qué hacer con un trabajo recuperado, por modelo (una exportación no deja
+# nada a medias: su archivo se arma en un temporal)
+_AL_RECUPERAR = {TrabajoImportacion: _importacion_recuperada}
+
+
+# ==========================================================
+#  EJECUTAR
+# ==========================================================
+def ejecutar_trabajo(trabajo):
+    """
+    Procesa un trabajo ya reclamado y deja su estado final
+    ('Completado' o 'Error') con los contadores y el mensaje.
+    """
+    def al_avanzar(carga):
+        # Progreso visible para la página que consulta el estado
+        # (y, de paso, el aviso de vida del worker)
+        TrabajoImportacion.objects.filter(id_trabajo=trabajo.id_trabajo).update(
+            filas_procesadas=carga.filas_procesadas,
+            registros_validos=carga.registros_validos,
+            registros_invalidos=carga.registros_invalidos,
+            fecha_latido=timezone.now()
+        )
+
+    archivo = trabajo.id_archivo
+    try:
+        with default_storage.open(archivo.ruta, 'rb') as archivo_csv:
+            carga = importar_archivo(archivo, trabajo.id_usuario, trabajo.tipo, archivo_csv, al_avanzar=al_avanzar)
+    except Exception as e:
+        carga = getattr(e, 'carga_parcial', None)
+        trabajo.estado = TrabajoImportacion.ESTADO_ERROR
+        trabajo.mensaje = mensaje_error_importacion(e)
+    else:
+        trabajo.estado = TrabajoImportacion.ESTADO_COMPLETADO
+        trabajo.mensaje = f'¡Proceso completado! Se guardaron {carga.registros_validos} calificaciones válidas.'
+        if carga.registros_invalidos > 0:
+            trabajo.mensaje += f' Se encontraron {carga.registros_invalidos} filas inválidas. Revise los errores por fila para más detalles.'
+        if carga.registros_actualizados or carga.registros_sin_cambios:
+            trabajo.mensaje += f' {carga.registros_actualizados} ya existían y se actualizaron; {carga.registros_sin_cambios} ya existían sin cambios.'
+
+    if carga:
+        trabajo.filas_procesadas = carga.filas_procesadas
+        trabajo.registros_validos = carga.registros_validos
+        trabajo.registros_invalidos = carga.registros_invalidos
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save()
+
+    # Terminó (bien o con Error): el CSV subido ya no hace falta
+    borrar_csv_subido(archivo)
+    return trabajo
+
+
+def procesar_pendientes(worker=None, max_trabajos=None):
+    """
+    Procesa trabajos hasta vaciar la cola (o llegar a 'max_trabajos').
+    Devuelve cuántos procesó. (Útil en pruebas con una BBDD local)
+    """
+    procesados = 0
+    while max_trabajos is None or procesados < max_trabajos:
+        trabajo = reclamar_trabajo(worker)
+        if trabajo is None:
+            break
+        ejecutar_trabajo(trabajo)
+        procesados += 1
+    return procesados
+
+
+# ==========================================================
+#  TRABAJOS DE EXPORTACIÓN
+# ==========================================================
+SAL_DESCARGA = 'calificaciones.exportacion.descarga'
+
+
+def clave_exportacion(filtros, formato, id_usuario):
+    """
+    SHA-256 de formato + filtros: identifica pedidos iguales. El usuario solo
+    cuenta si el resultado depende de él (origen 'manual' = sus propias cargas).
+    """
+    datos = {
+        'formato': formato,
+        'filtros': filtros,
+        'usuario': id_usuario if filtros.get('origen') == 'manual' else None,
+    }
+    return hashlib.sha256(json.dumps(datos, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def encolar_exportacion(filtros, formato, usuario):
+    """
+    Crea el TrabajoExportacion Pendiente con esos filtros, o devuelve uno
+    que ya sirve: mismo pedido, misma versión de los datos y archivo vigente
+    (o todavía en proceso). Devuelve (trabajo, reutilizado).
+    """
+    clave = clave_exportacion(filtros, formato, usuario.id_usuario if usuario else None)
+    version = version_actual(TABLA_PIVOTE)
+    existente = (
+        TrabajoExportacion.objects
+        .filter(clave=clave, version_datos=version)
+        .exclude(estado=TrabajoExportacion.ESTADO_ERROR)
+        .filter(Q(fecha_expiracion__isnull=True) | Q(fecha_expiracion__gt=timezone.now()))
+        .order_by('-id_trabajo')
+        .first()
+    )
+    if existente:
+        return existente, True
+
+    trabajo = TrabajoExportacion.objects.create(
+        id_usuario=usuario,
+        formato=formato,
+        filtros=json.dumps(filtros, sort_keys=True),
+        clave=clave,
+        version_datos=version,
+        estado=TrabajoExportacion.ESTADO_PENDIENTE,
+        fecha_creacion=timezone.now()
+    )
+    return trabajo, False
+
+
+def reclamar_exportacion(worker=None):
+    """Como 'reclamar_trabajo', para la cola de exportaciones."""
+    return _reclamar(TrabajoExportacion, worker or nombre_worker())
+
+
+def ejecutar_exportacion(trabajo):
+    """
+    Arma el archivo de un trabajo ya reclamado (primero en un temporal, luego
+    a default_storage) y deja su estado final ('Completado' o 'Error').
+    """
+    def al_avanzar(filas):
+        # Progreso visible para la página que consulta el estado
+        # (y, de paso, el aviso de vida del worker)
+        trabajo.filas = filas
+        TrabajoExportacion.objects.filter(id_trabajo=trabajo.id_trabajo).update(filas=filas, fecha_latido=timezone.now())
+
+    # La versión se lee ANTES que los datos: si cambian mientras se
+    # exporta, el próximo pedido verá otra versión y no reutilizará este
+    trabajo.version_datos = version_actual(TABLA_PIVOTE)
+    qs = filtrar_pivote(CalificacionPivote.objects.filter(activo=True), json.loads(trabajo.filtros), trabajo.id_usuario_id)
+    nombre_archivo = FORMATOS_ARCHIVO[trabajo.formato][1]
+    try:
+        with tempfile.TemporaryFile() as temporal:
+            escribir_archivo(qs, trabajo.formato, temporal, al_avanzar=al_avanzar)
+            temporal.seek(0)
+            trabajo.ruta = default_storage.save(
+                os.path.join(settings.EXPORTACION_DIRECTORIO, f'{trabajo.id_trabajo}_{nombre_archivo}'),
+                File(temporal)
+            )
+    except Exception as e:
+        trabajo.estado = TrabajoExportacion.ESTADO_ERROR
+        trabajo.mensaje = f'Error al exportar: {e}'
+    else:
+        trabajo.estado = TrabajoExportacion.ESTADO_COMPLETADO
+        trabajo.mensaje = f'¡Exportación lista! {trabajo.filas} calificaciones.'
+        trabajo.fecha_expiracion = timezone.now() + timedelta(hours=settings.EXPORTACION_VIGENCIA_HORAS)
+    trabajo.fecha_fin = timezone.now()
+    trabajo.save()
+    return trabajo
+
+
+def limpiar_exportaciones_vencidas():
+    """
+    Borra de default_storage los archivos de exportación vencidos (el
+    trabajo queda, sin 'ruta'). Devuelve cuántos borró.
+    """
+    vencidos = TrabajoExportacion.objects.filter(fecha_expiracion__lte=timezone.now(), ruta__isnull=False)
+    borrados = 0
+    for trabajo in vencidos:
+        default_storage.delete(trabajo.ruta)
+        TrabajoExportacion.objects.filter(id_trabajo=trabajo.id_trabajo).update(ruta=None)
+        borrados += 1
+    return borrados
+
+
+def procesar_exportaciones_pendientes(worker=None, max_trabajos=None):
+    """
+    Arma exportaciones hasta vaciar la cola (o llegar a 'max_trabajos').
+    Devuelve cuántas procesó. (Útil en pruebas con una BBDD local)
+    """
+    procesados = 0
+    while max_trabajos is None or procesados < max_trabajos:
+        trabajo = reclamar_exportacion(worker)
+        if trabajo is None:
+            break
+        ejecutar_exportacion(trabajo)
+        procesados += 1
+    return procesados
+
+
+def token_descarga(trabajo):
+    """Token firmado (con fecha) del enlace de descarga de un trabajo."""
+    return signing.dumps(trabajo.id_trabajo, salt=SAL_DESCARGA)
+
+
+def id_trabajo_de_token(token):
+    """
+    El ID del trabajo de un token de 'token_descarga'. Lanza
+    signing.BadSignature (o SignatureExpired, si pasó la vigencia).
+    """
+    return signing.loads(token, salt=SAL_DESCARGA, max_age=settings.EXPORTACION_VIGENCIA_HORAS * 3600)
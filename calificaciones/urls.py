@@ -12,6 +12,8 @@ urlpatterns = [
 
     path('calcular-factores/', views.calcular_factores_view, name='calcular_factores'),
 
+    path('calcular-factores/lote/', views.calcular_factores_lote_view, name='calcular_factores_lote'),
+
     path('<int:pk>/eliminar/', views.calificacion_delete_view, name='eliminar_calificacion'),
 
     path('<int:pk>/modificar/', views.calificacion_update_view, name='modificar_calificacion'),  
@@ -20,5 +22,17 @@ urlpatterns = [
     
     path('exportar-csv/', views.calificacion_export_csv_view, name='exportar_csv'),
 
+    path('exportaciones/encolar/', views.exportacion_encolar_view, name='exportacion_encolar'),
+
+    path('exportaciones/<int:pk>/progreso/', views.exportacion_progreso_view, name='exportacion_progreso'),
+
+    path('exportaciones/descargar/<str:token>/', views.exportacion_descargar_view, name='exportacion_descargar'),
+
     path('carga-masiva-montos/', views.calificacion_carga_montos_view, name='carga_masiva_montos'),
+
+    path('importaciones/<int:pk>/progreso/', views.importacion_progreso_view, name='importacion_progreso'),
+
+    path('importaciones/validaciones/<str:id_reporte>/', views.reporte_validacion_view, name='reporte_validacion'),
+
+    path('importaciones/archivos/<int:pk>/errores/', views.errores_importacion_view, name='errores_importacion'),
 ]
\ No newline at end of file
@@ -0,0 +1,222 @@
+from decimal import Decimal, InvalidOperation
+from datetime import datetime
+from collections import namedtuple
+from functools import lru_cache
+
+# (Este módulo NO importa Django: se ejecuta también dentro de los
+# procesos del pool de validación, que no inicializan la app)
+
+# Motor de factores (tablas de códigos y regla Montos -> Factores)
+from .factores import CODIGOS, DESCRIPCIONES, calcular_factores
+
+
+# ==========================================================
+#  CABECERAS DEL CSV DE CARGA MASIVA (FACTORES)
+# ==========================================================
+CABECERAS_BASE = [
+    'Ejercicio', 'Mercado', 'Instrumento', 'Fecha',
+    'Secuencia', 'Numero de dividendo', 'Tipo sociedad', 'Valor Historico'
+]
+# (Usamos F19, no F19A)
+CABECERAS_FACTORES_CSV = [f'Factor {i}' for i in range(8, 38)]
+
+# Pares ('Factor 8', 'F08') precalculados una sola vez (no por fila)
+CODIGOS_FACTORES_CSV = list(zip(CABECERAS_FACTORES_CSV, CODIGOS))
+# Cabeceras de los factores base (8 al 19) para la validación de la suma
+CABECERAS_FACTORES_BASE_CSV = [f'Factor {j}' for j in range(8, 20)]
+
+# ==========================================================
+#  CABECERAS DEL CSV DE CARGA MASIVA (MONTOS DJ1948)
+# ==========================================================
+# Monto_08 ... Monto_37: en el mismo orden que los vectores del motor de factores
+CABECERAS_MONTOS_CSV = [f'Monto_{codigo[1:]}' for codigo in CODIGOS]
+
+# ==========================================================
+#  FILA VALIDADA (tupla compacta y ya tipada)
+# ==========================================================
+# Es lo que viaja de vuelta desde los procesos de validación al escritor:
+# una tupla liviana de serializar (pickle) en vez de un diccionario.
+FilaValidada = namedtuple('FilaValidada', [
+    'fecha_pago', 'instrumento', 'mercado', 'secuencia_evento', 'evento_capital',
+    'anio', 'valor_historico', 'descripcion', 'ingreso_por_montos', 'valido',
+    'factores', # ((codigo_db, descripcion, valor), ...)
+])
+
+
+# ==========================================================
+#  ERRORES DE VALIDACIÓN (con columna y código)
+# ==========================================================
+class ErrorFila(Exception):
+    """
+    Error de una fila del CSV. Además del mensaje para el usuario indica
+    la columna y un código estable (ej. 'fecha', 'decimal') para los reportes.
+    """
+
+    def __init__(self, mensaje, columna=None, codigo='fila_invalida'):
+        super().__init__(mensaje)
+        self.mensaje = mensaje
+        self.columna = columna
+        self.codigo = codigo
+
+
+CERO = Decimal('0.0')
+
+
+def _texto(fila, cabecera):
+    valor = fila.get(cabecera)
+    if valor is None:
+        raise ErrorFila(f"Falta el valor de '{cabecera}'.", cabecera, 'campo_requerido')
+    return valor
+
+
+@lru_cache(maxsize=4096)
+def _convertir_fecha(texto, formato):
+    # (En un archivo se repiten pocas fechas de pago: strptime una vez por fecha distinta)
+    return datetime.strptime(texto, formato).date()
+
+
+def _fecha(fila, formato, ejemplo):
+    try:
+        return _convertir_fecha(_texto(fila, 'Fecha'), formato)
+    except ValueError:
+        raise ErrorFila(f"Formato de fecha inválido '{fila['Fecha']}'. Use {ejemplo}.", 'Fecha', 'fecha')
+
+
+def _decimal(fila, cabecera):
+    """Decimal de la columna ('' o vacío = 0). Rechaza textos, NaN e Infinito."""
+    valor = fila.get(cabecera)
+    if not valor:
+        return CERO
+    try:
+        numero = Decimal(valor)
+    except InvalidOperation:
+        numero = None
+    if numero is None or not numero.is_finite():
+        raise ErrorFila(f"Valor numérico inválido '{valor}' en '{cabecera}'.", cabecera, 'decimal')
+    return numero
+
+
+def _decimales(fila, cabeceras):
+    """
+    Decimales de varias columnas de una vez (camino rápido, sin una
+    llamada por celda). Si alguna no es un número finito, se revisan
+    columna por columna para informar cuál es ('_decimal').
+    """
+    try:
+        valores = [Decimal(fila.get(cabecera) or '0') for cabecera in cabeceras]
+        # (Una suma con NaN o Infinito no es finita: basta una comprobación)
+        if sum(valores).is_finite():
+            return valores
+    except InvalidOperation:
+        pass
+    return [_decimal(fila, cabecera) for cabecera in cabeceras]
+
+
+# ==========================================================
+#  VALIDACIÓN EN MEMORIA (Una fila del CSV de Factores)
+# ==========================================================
+def validar_fila_factores(fila):
+    """
+    Valida y transforma una fila del CSV de Factores SIN tocar la BBDD.
+    Devuelve una 'FilaValidada' con los datos ya tipados.
+    Lanza 'ErrorFila' (con el mensaje para el usuario) si la fila es inválida.
+    """
+    # --- A. Validación de Formato (Fecha) ---
+    fecha_pago = _fecha(fila, '%d-%m-%Y', 'DD-MM-AAAA')
+
+    # --- Factores: cada columna se convierte una sola vez ---
+    valores = _decimales(fila, CABECERAS_FACTORES_CSV)
+
+    # --- B. Validación de Negocio (Suma de Factores) ---
+    valido = True
+    descripcion_log = f"Carga Masiva - Tipo: {fila.get('Tipo sociedad', 'N/A')}"
+
+    suma_factores_base = sum(valores[:len(CABECERAS_FACTORES_BASE_CSV)]) # Factores 8 al 19
+
+    if suma_factores_base > Decimal('1.00000001'):
+        valido = False
+        # Guardamos la razón del error
+        descripcion_log = f"Error: Suma de factores base ({suma_factores_base}) > 1"
+
+    # --- Factores (se guardan *incluso si son inválidos*) ---
+    factores = tuple(
+        (codigo_db, cabecera, valor_factor)
+        for (cabecera, codigo_db), valor_factor in zip(CODIGOS_FACTORES_CSV, valores)
+        if valor_factor # (Decimal cero es falso)
+    )
+
+    return FilaValidada(
+        fecha_pago=fecha_pago,
+        instrumento=_texto(fila, 'Instrumento'),
+        mercado=_texto(fila, 'Mercado'),
+        secuencia_evento=_texto(fila, 'Secuencia'),
+        evento_capital=_texto(fila, 'Numero de dividendo'),
+        anio=_texto(fila, 'Ejercicio'),
+        valor_historico=_decimal(fila, 'Valor Historico'),
+        descripcion=descripcion_log,
+        ingreso_por_montos=False,
+        valido=valido,
+        factores=factores, # ((codigo_db, descripcion, valor), ...)
+    )
+
+
+# ==========================================================
+#  VALIDACIÓN EN MEMORIA (Una fila del CSV de Montos)
+# ==========================================================
+def validar_fila_montos(fila):
+    """
+    Valida una fila del CSV de Montos y calcula sus factores SIN tocar la BBDD.
+    (Misma lógica de cálculo que 'calificacion_create_view')
+    """
+    # --- A. Validación de Formato (Fecha AAAA-MM-DD) ---
+    fecha_pago = _fecha(fila, '%Y-%m-%d', 'AAAA-MM-DD')
+
+    # --- B. LÓGICA DE CÁLCULO (Montos -> Factores), con el motor de factores ---
+    valores = calcular_factores(_decimales(fila, CABECERAS_MONTOS_CSV))
+
+    factores = tuple(
+        (codigo_db, DESCRIPCIONES[codigo_db], valor_factor)
+        for codigo_db, valor_factor in zip(CODIGOS, valores)
+        if valor_factor # (Decimal cero es falso)
+    )
+
+    return FilaValidada(
+        fecha_pago=fecha_pago,
+        instrumento=_texto(fila, 'Instrumento'),
+        mercado=_texto(fila, 'Mercado'),
+        secuencia_evento=_texto(fila, 'Secuencia'),
+        evento_capital=_texto(fila, 'Numero de dividendo'),
+        anio=_texto(fila, 'Ejercicio'),
+        valor_historico=_decimal(fila, 'Valor Historico'),
+        descripcion=f"Carga Masiva (Montos) - Tipo: {fila.get('Tipo sociedad', 'N/A')}",
+        ingreso_por_montos=True,
+        valido=True, # (no hay validación de suma en montos)
+        factores=factores,
+    )
+
+
+# ==========================================================
+#  VALIDACIÓN DE UN BLOQUE DE FILAS (en proceso o en el pool)
+# ==========================================================
+def validar_bloque(validar_fila, bloque, cabeceras=None):
+    """
+    Valida un bloque de (numero_linea, fila) y devuelve dos listas:
+    - filas_ok: [(numero_linea, FilaValidada), ...]
+    - errores:  [(numero_linea, columna, codigo, mensaje), ...]
+
+    Si se indican 'cabeceras', cada fila viene como tupla de valores en ese
+    orden (así se envía al pool: sin repetir las claves en cada fila) y se
+    vuelve a armar el diccionario aquí.
+    Los errores se devuelven como tuplas de texto: siempre se pueden serializar.
+    """
+    filas_ok, errores = [], []
+    for i, fila in bloque:
+        if cabeceras is not None:
+            fila = dict(zip(cabeceras, fila))
+        try:
+            filas_ok.append((i, validar_fila(fila)))
+        except ErrorFila as e_fila:
+            errores.append((i, e_fila.columna, e_fila.codigo, e_fila.mensaje))
+        except Exception as e_fila:
+            errores.append((i, None, 'fila_invalida', str(e_fila)))
+    return filas_ok, errores
@@ -0,0 +1,111 @@
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import VersionDatos
+
+
+# ==========================================================
+#  VERSIÓN DE LOS DATOS (contador por tabla, en la BBDD)
+# ==========================================================
+# Cada escritura sube el contador de su tabla dentro de la misma transacción,
+# así todos los procesos (web y workers) ven el mismo número: si no cambió,
+# los datos tampoco. La tabla pivote lo sube en 'calificaciones/pivote.py'
+# (toda escritura de Calificacion, Calificaciontributaria y Factortributario
+# pasa por ahí). El Log no tiene contador: ninguna vista con ETag lo muestra,
+# y subirlo en cada escritura ponía a todas en fila por esa única fila.
+TABLA_PIVOTE = 'calificacion_pivote'
+
+
+def incrementar_version(tabla):
+    """Sube en 1 la versión de 'tabla' (UPDATE ... SET version = version + 1)."""
+    actualizadas = VersionDatos.objects.filter(tabla=tabla).update(
+        version=F('version') + 1, fecha_modificacion=timezone.now()
+    )
+    if not actualizadas:
+        # Primera escritura: se crea la fila (si otro proceso se adelantó, se suma a la suya)
+        try:
+            with transaction.atomic():
+                VersionDatos.objects.create(tabla=tabla, version=1, fecha_modificacion=timezone.now())
+        except IntegrityError:
+            incrementar_version(tabla)
+
+
+def siguiente_version(tabla):
+    """
+    Sube la versión de 'tabla' y devuelve la nueva. Dentro de una transacción
+    la fila queda bloqueada hasta el COMMIT: dos escrituras no pueden tomar
+    números en un orden y confirmarse en el otro (ver 'secuencia_cambio').
+    """
+    incrementar_version(tabla)
+    return version_actual(tabla)
+
+
+def version_actual(tabla):
+    """La versión de 'tabla' (0 si nunca se escribió)."""
+    return VersionDatos.objects.filter(tabla=tabla).values_list('version', flat=True).first() or 0
+
+
+def versiones(tablas):
+    """{tabla: (version, fecha_modificacion)} de esas tablas, en una consulta."""
+    encontradas = {
+        tabla: (version, fecha)
+        for tabla, version, fecha in VersionDatos.objects.filter(tabla__in=tablas).values_list('tabla', 'version', 'fecha_modificacion')
+    }
+    return {tabla: encontradas.get(tabla, (0, None)) for tabla in tablas}
+
+
+# ==========================================================
+#  GET CONDICIONAL (ETag / Last-Modified según la versión)
+# ==========================================================
+def condicional_por_version(tablas, identidad, muestra_mensajes=False):
+    """
+    Decorador de vistas GET: calcula el ETag y el Last-Modified con la
+    versión de 'tablas' (una consulta chica, por clave primaria) y, si el
+    cliente ya tiene esa versión (If-None-Match / If-Modified-Since),
+    responde 304 SIN ejecutar la vista ni sus consultas.
+
+    'identidad(request)' devuelve lo que, además de los datos, cambia la
+    respuesta (ej. el usuario o la sesión): entra en el ETag.
+    Con 'muestra_mensajes' (páginas HTML que muestran django.contrib.messages)
+    no hay ETag si hay mensajes pendientes: se muestran una sola vez y esa
+    página no debe reutilizarse.
+    """
+    def _versiones(request):
+        # (Una sola consulta por petición, para el ETag y el Last-Modified)
+        if not hasattr(request, '_versiones_datos'):
+            pendientes = muestra_mensajes and len(get_messages(request))
+            request._versiones_datos = None if pendientes else versiones(tablas)
+        return request._versiones_datos
+
+    def etag(request, *args, **kwargs):
+        actuales = _versiones(request)
+        if actuales is None:
+            return None
+        partes = [f'{tabla}:{version}' for tabla, (version, _) in sorted(actuales.items())]
+        partes += [str(parte) for parte in identidad(request)]
+        return hashlib.sha1('|'.join(partes).encode('utf-8')).hexdigest()
+
+    def ultima_modificacion(request, *args, **kwargs):
+        actuales = _versiones(request)
+        fechas = [fecha for _, fecha in (actuales or {}).values() if fecha]
+        return max(fechas) if fechas else None
+
+    def decorador(vista):
+        condicional = condition(etag_func=etag, last_modified_func=ultima_modificacion)(vista)
+
+        @wraps(vista)
+        def envoltura(request, *args, **kwargs):
+            response = condicional(request, *args, **kwargs)
+            # Cada usuario ve lo suyo: solo el navegador guarda la respuesta
+            # y la revalida siempre (con el ETag) antes de volver a usarla
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return envoltura
+    return decorador
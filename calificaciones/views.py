@@ -4,21 +4,29 @@ from django.db import transaction
 from django.utils import timezone
 from django.db.models import Prefetch, Q, Count
 from django.http import JsonResponse
-from decimal import Decimal, ROUND_HALF_UP, InvalidOperation
+from decimal import Decimal, InvalidOperation
 import json
-import csv
-import io
-from datetime import datetime
-from django.http import HttpResponse
+import os
+from itertools import chain
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.core.paginator import Paginator
+from django.core import signing
+from django.core.files.storage import default_storage
+from django.conf import settings
 
 
 
 # Modelos
-from .models import Calificacion, Calificaciontributaria, Factortributario
-from instrumentos.models import Instrumento, Mercado
+from .models import Calificacion, Calificaciontributaria, Factortributario, CalificacionPivote, TrabajoExportacion, COLUMNAS_FACTORES
+from .pivote import actualizar_pivote
+from .paginacion import PaginaKeyset, CursorInvalido
+from .consultas import valores_calificaciones, fila_calificacion, filtrar_pivote
+from .exportacion import FORMATOS as FORMATOS_EXPORTACION, FORMATOS_ARCHIVO, exportar
+from instrumentos.resolver import ResolverCatalogos
 from usuarios.models import Usuario, Estado
 from auditoria.models import Log
-from archivos.models import Archivo
+from archivos.models import Archivo, TrabajoImportacion, ErrorImportacion
 
 # Forms (Con las nuevas listas de factores F19)
 from .forms import (
@@ -26,6 +34,25 @@ from .forms import (
     FACTORES_BASE_UI, FACTORES_CALCULADOS_UI, FACTORES_DIRECTOS_UI
 )
 
+# Motor de factores (regla Montos -> Factores y tablas de códigos)
+from .factores import (
+    CAMPOS as CAMPOS_FACTORES, CODIGO_POR_CAMPO, ETIQUETAS,
+    calcular_factores_texto, factores_desde_campos,
+)
+
+# Motor de Carga Masiva por lotes
+from .importacion import (
+    importar_archivo, mensaje_error_importacion,
+    calcular_hash_contenido, buscar_archivo_repetido,
+)
+from .versiones import condicional_por_version, TABLA_PIVOTE
+from .trabajos import encolar_importacion, encolar_exportacion, token_descarga, id_trabajo_de_token
+from .reportes import crear_reporte_validacion, leer_resumen, leer_pagina_errores, abrir_errores
+from .calculadora import (
+    TIPOS_NDJSON, calcular_por_trozos, leer_arreglo_json, leer_ndjson,
+    respuesta_json, respuesta_ndjson,
+)
+
 # Decorators
 from usuarios.decorators import login_requerido_personalizado, rol_requerido
 
@@ -33,6 +60,21 @@ from usuarios.decorators import login_requerido_personalizado, rol_requerido
 # ==========================================================
 #  VISTA 1: Lista/Grilla (Modificada para F19)
 # ==========================================================
+MAX_LISTA_POR_PAGINA = 500
+
+
+def _url_cursor(request, parametro, cursor):
+    """La URL actual (con sus filtros) apuntando a otra página, o None si no hay."""
+    if not cursor:
+        return None
+    parametros = request.GET.copy()
+    parametros.pop('despues', None)
+    parametros.pop('antes', None)
+    parametros.pop('exportacion', None)
+    parametros[parametro] = cursor
+    return f'?{parametros.urlencode()}'
+
+
 @login_requerido_personalizado
 @rol_requerido(roles_permitidos=['Corredor', 'Administrador', 'Auditor'])
 def calificacion_list_view(request):
@@ -41,9 +83,9 @@ def calificacion_list_view(request):
     id_usuario_actual = request.session.get('id_usuario')
     rol_usuario_actual = request.session.get('rol_nombre')
     
-    qs_base = Calificacion.objects.select_related(
-        'id_instrumento', 'id_mercado', 'id_usuario', 'id_estado'
-    )
+    # Una sola consulta: la tabla pivote ya trae los factores F08..F37 como
+    # columnas (antes se armaba el pivote en Python, fila por fila)
+    qs_base = CalificacionPivote.objects.filter(activo=True)
     
     if rol_usuario_actual in ['Administrador', 'Auditor']:
         qs = qs_base.all()
@@ -53,55 +95,27 @@ def calificacion_list_view(request):
             Q(id_usuario__isnull=True)
         )
         
-    if form.is_valid():
-        if form.cleaned_data.get('mercado'):
-            qs = qs.filter(id_mercado=form.cleaned_data['mercado'])
-        if form.cleaned_data.get('anio'):
-            qs = qs.filter(calificaciontributaria__anio=form.cleaned_data['anio'])
-        if form.cleaned_data.get('origen'):
-            origen = form.cleaned_data['origen']
-            if origen == 'manual':
-                qs = qs.filter(id_usuario_id=id_usuario_actual, id_archivo__isnull=True)
-            elif origen == 'archivo':
-                qs = qs.filter(id_archivo__isnull=False)
-
-    qs = qs.prefetch_related(
-        'calificaciontributaria_set__factortributario_set'
-    )
+    qs = valores_calificaciones(filtrar_pivote(qs, form.filtros(), id_usuario_actual)) # (tuplas, sin modelos)
 
-    calificaciones_aplanadas = []
-    
-    # --- CAMBIO: Lista de códigos de BBDD ahora usa F19 ---
-    codigos_factores_deseados = [
-        'F08', 'F09', 'F10', 'F11', 'F12', 'F13', 'F14', 'F15', 'F16', 'F17', 
-        'F18', 'F19', 'F20', 'F21', 'F22', 'F23', 'F24', 'F25', 'F26', 'F27', 
-        'F28', 'F29', 'F30', 'F31', 'F32', 'F33', 'F34', 'F35', 'F36', 'F37'
-    ]
-
-    for calif in qs:
-        datos_calif = {
-            'calificacion': calif,
-            'tributaria': None,
-            'factores': {}
-        }
-        calif_tributaria_lista = calif.calificaciontributaria_set.all()
-        
-        if calif_tributaria_lista:
-            tributaria = calif_tributaria_lista[0]
-            datos_calif['tributaria'] = tributaria
-            factores_lista = tributaria.factortributario_set.all()
-            
-            if factores_lista:
-                factores_dict = {f.codigo_factor: f.valor_factor for f in factores_lista}
-                for codigo in codigos_factores_deseados:
-                    datos_calif['factores'][codigo] = factores_dict.get(codigo, None)
-        
-        calificaciones_aplanadas.append(datos_calif)
+    # Solo la página pedida (paginación por clave: ?despues=<cursor> o ?antes=<cursor>)
+    por_pagina = min(_entero_positivo(request.GET.get('por_pagina'), settings.LISTA_POR_PAGINA), MAX_LISTA_POR_PAGINA)
+    try:
+        pagina = PaginaKeyset(
+            qs, por_pagina, despues=request.GET.get('despues'), antes=request.GET.get('antes'),
+            construir_fila=fila_calificacion
+        )
+    except CursorInvalido:
+        pagina = PaginaKeyset(qs, por_pagina, construir_fila=fila_calificacion) # (Un cursor roto vuelve a la primera página)
 
     context = {
         'form_filtros': form,
-        'calificaciones': calificaciones_aplanadas,
-        'factores_header': codigos_factores_deseados
+        'calificaciones': pagina,
+        'por_pagina': por_pagina,
+        'url_siguiente': _url_cursor(request, 'despues', pagina.cursor_siguiente),
+        'url_anterior': _url_cursor(request, 'antes', pagina.cursor_anterior),
+        'factores_header': list(COLUMNAS_FACTORES), # 'F08'..'F37'
+        'id_exportacion': request.GET.get('exportacion'), # (Avance de una exportación en segundo plano)
+        'formatos_exportacion': FORMATOS_EXPORTACION, # (Parquet solo si está instalado 'pyarrow')
     }
     
     return render(request, 'calificaciones/mantenedor_lista.html', context)
@@ -123,15 +137,12 @@ def calificacion_create_view(request):
                 data = form.cleaned_data
                 usuario_app = Usuario.objects.get(id_usuario=request.session['id_usuario'])
                 estado_activo = get_object_or_404(Estado, id_estado=5) 
-                instrumento, created = Instrumento.objects.get_or_create(
-                    nombre=data['instrumento_nombre'],
-                    defaults={'tipo': 'Desconocido', 'moneda': 'N/A'}
-                )
+                id_instrumento = ResolverCatalogos().id_instrumento(data['instrumento_nombre'])
 
                 nueva_calificacion = Calificacion.objects.create(
                     fecha_pago=data['fecha_pago'],
                     id_usuario=usuario_app,
-                    id_instrumento=instrumento,
+                    id_instrumento_id=id_instrumento,
                     id_mercado=data['mercado'],
                     id_archivo=None,
                     id_estado=estado_activo,
@@ -149,44 +160,18 @@ def calificacion_create_view(request):
                     ingreso_por_montos=data['ingreso_por_montos']
                 )
 
-                valores_finales = {}
-                
-                if data['ingreso_por_montos']:
-                    suma_total_montos = Decimal('0.0')
-                    for campo in FACTORES_BASE_UI: # (Usa F19)
-                        suma_total_montos += data.get(campo) or Decimal('0.0')
-                    precision = Decimal('0.00000001')
-                    if suma_total_montos > 0:
-                        for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                            monto_campo = data.get(campo) or Decimal('0.0')
-                            factor_calculado = (monto_campo / suma_total_montos).quantize(precision, rounding=ROUND_HALF_UP)
-                            valores_finales[campo] = factor_calculado
-                    else:
-                        for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                            valores_finales[campo] = Decimal('0.0')
-                    for campo in FACTORES_DIRECTOS_UI:
-                        valores_finales[campo] = data.get(campo) or Decimal('0.0')
-                else:
-                    todos_los_factores = FACTORES_BASE_UI + FACTORES_CALCULADOS_UI + FACTORES_DIRECTOS_UI
-                    for campo in todos_los_factores:
-                        valores_finales[campo] = data.get(campo) or Decimal('0.0')
-                
-                factores_para_crear = []
-                for nombre_campo, valor_factor in valores_finales.items():
-                    if valor_factor is not None and valor_factor != Decimal('0.0'):
-                        # --- CAMBIO: Mapeo de BBDD (ej. 'factor_19' -> 'F19') ---
-                        codigo_factor_bruto = nombre_campo.split('_')[-1] # '08', '09', '19'
-                        codigo_factor = f"F{codigo_factor_bruto.zfill(2)}" # 'F08', 'F09', 'F19'
-                        
-                        factores_para_crear.append(
-                            Factortributario(
-                                id_calificacion_tributaria=nueva_calif_trib,
-                                codigo_factor=codigo_factor,
-                                descripcion_factor=form.fields[nombre_campo].label,
-                                valor_factor=valor_factor
-                            )
-                        )
+                # Montos -> Factores (o factores directos) con el motor de factores
+                factores_para_crear = [
+                    Factortributario(
+                        id_calificacion_tributaria=nueva_calif_trib,
+                        codigo_factor=codigo_factor, # 'F08', 'F09', 'F19'
+                        descripcion_factor=ETIQUETAS[codigo_factor],
+                        valor_factor=valor_factor
+                    )
+                    for codigo_factor, valor_factor in factores_desde_campos(data, data['ingreso_por_montos']).items()
+                ]
                 Factortributario.objects.bulk_create(factores_para_crear)
+                actualizar_pivote([nueva_calificacion.id_calificacion])
 
                 """  Log.objects.create(
                     fecha=timezone.now(),
@@ -212,38 +197,59 @@ def calificacion_create_view(request):
 # ==========================================================
 #  VISTA 3: Calculadora (Modificada para F19)
 # ==========================================================
-@transaction.atomic 
+# (Sin transaction.atomic: es solo aritmética y no hace ninguna consulta;
+# la transacción solo abría una conexión y hacía ida y vuelta a la BBDD
+# para desactivar y reactivar el autocommit en cada cálculo)
 def calcular_factores_view(request):
     if request.method != 'POST':
         return JsonResponse({'error': 'Método no permitido'}, status=405)
     try:
         data = json.loads(request.body)
-        valores_finales = {}
-        
-        # --- CAMBIO: Usa FACTORES_BASE_UI (con F19) ---
-        suma_total_montos = Decimal('0.0')
-        for campo in FACTORES_BASE_UI: 
-            monto_str = data.get(campo) or '0.0'
-            suma_total_montos += Decimal(monto_str)
-
-        precision = Decimal('0.00000001')
-        if suma_total_montos > 0:
-            for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                monto_str = data.get(campo) or '0.0'
-                factor_calculado = (Decimal(monto_str) / suma_total_montos).quantize(precision, rounding=ROUND_HALF_UP)
-                valores_finales[campo] = str(factor_calculado)
-        else:
-            for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                valores_finales[campo] = '0.00000000'
-        
-        for campo in FACTORES_DIRECTOS_UI:
-            valores_finales[campo] = data.get(campo) or '0.00'
+
+        # Un solo vector de montos (F08..F37) por el camino rápido del motor
+        montos = [data.get(campo) for campo in CAMPOS_FACTORES]
+        factores = calcular_factores_texto([montos])[0]
+        valores_finales = dict(zip(CAMPOS_FACTORES, factores))
 
         return JsonResponse({'factores': valores_finales})
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=400)
 
 
+# ==========================================================
+#  VISTA 3b: Calculadora por lotes (JSON o NDJSON)
+# ==========================================================
+@login_requerido_personalizado
+def calcular_factores_lote_view(request):
+    """
+    Calcula los factores de muchas filas de montos en una sola petición.
+    - Content-Type application/json: un arreglo de filas.
+    - Content-Type application/x-ndjson: una fila por línea.
+    Cada fila es un objeto con 'factor_08'..'factor_37' (como la calculadora
+    de una fila) o una lista de 30 montos en ese orden.
+    La respuesta usa el mismo formato que la entrada y se envía por partes,
+    a medida que se calcula (hasta CALCULADORA_MAX_FILAS filas).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+
+    max_filas = settings.CALCULADORA_MAX_FILAS
+    if request.content_type in TIPOS_NDJSON:
+        trozos = calcular_por_trozos(leer_ndjson(request), max_filas)
+        return StreamingHttpResponse(respuesta_ndjson(trozos), content_type='application/x-ndjson')
+
+    # Arreglo JSON: se revisa el comienzo ANTES de responder (un 400 real)
+    filas = leer_arreglo_json(request)
+    try:
+        primera = next(filas, None)
+    except ValueError as e_json:
+        return JsonResponse({'error': str(e_json)}, status=400)
+    if primera is not None:
+        filas = chain([primera], filas)
+    trozos = calcular_por_trozos(filas, max_filas)
+    return StreamingHttpResponse(respuesta_json(trozos), content_type='application/json')
+
+
 # ==========================================================
 #  VISTA 4: Eliminar (Sin cambios)
 # ==========================================================
@@ -263,6 +269,7 @@ def calificacion_delete_view(request, pk):
     if request.method == 'POST':
         calif.activo = False
         calif.save()
+        actualizar_pivote([calif.id_calificacion])
         try:
             usuario_app = Usuario.objects.get(id_usuario=id_usuario_actual)
             Log.objects.create(
@@ -313,14 +320,11 @@ def calificacion_update_view(request, pk):
             try:
                 data = form.cleaned_data
                 usuario_app = Usuario.objects.get(id_usuario=id_usuario_actual)
-                instrumento, created = Instrumento.objects.get_or_create(
-                    nombre=data['instrumento_nombre'],
-                    defaults={'tipo': 'Desconocido', 'moneda': 'N/A'}
-                )
+                id_instrumento = ResolverCatalogos().id_instrumento(data['instrumento_nombre'])
 
                 # Actualizar Padre e Hijo
                 calif.fecha_pago = data['fecha_pago']
-                calif.id_instrumento = instrumento
+                calif.id_instrumento_id = id_instrumento
                 calif.id_mercado = data['mercado']
                 
                 # Si la calificación venía de un archivo (Bolsa) y un 
@@ -343,45 +347,22 @@ def calificacion_update_view(request, pk):
                 calif_trib.ingreso_por_montos = data['ingreso_por_montos']
                 calif_trib.save()
 
-                # Lógica de Cálculo (ya usa FACTORES_BASE_UI con F19)
-                valores_finales = {}
-                if data['ingreso_por_montos']:
-                    suma_total_montos = Decimal('0.0')
-                    for campo in FACTORES_BASE_UI:
-                        suma_total_montos += data.get(campo) or Decimal('0.0')
-                    precision = Decimal('0.00000001')
-                    if suma_total_montos > 0:
-                        for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                            monto_campo = data.get(campo) or Decimal('0.0')
-                            factor_calculado = (monto_campo / suma_total_montos).quantize(precision, rounding=ROUND_HALF_UP)
-                            valores_finales[campo] = factor_calculado
-                    else:
-                        for campo in FACTORES_BASE_UI + FACTORES_CALCULADOS_UI:
-                            valores_finales[campo] = Decimal('0.0')
-                    for campo in FACTORES_DIRECTOS_UI:
-                        valores_finales[campo] = data.get(campo) or Decimal('0.0')
-                else:
-                    todos_los_factores = FACTORES_BASE_UI + FACTORES_CALCULADOS_UI + FACTORES_DIRECTOS_UI
-                    for campo in todos_los_factores:
-                        valores_finales[campo] = data.get(campo) or Decimal('0.0')
-                
+                # Lógica de Cálculo (motor de factores, con F19)
+                valores_finales = factores_desde_campos(data, data['ingreso_por_montos'])
+
                 # Actualizar Nietos
                 Factortributario.objects.filter(id_calificacion_tributaria=calif_trib).delete()
-                factores_para_crear = []
-                for nombre_campo, valor_factor in valores_finales.items():
-                    if valor_factor is not None and valor_factor != Decimal('0.0'):
-                        codigo_factor_bruto = nombre_campo.split('_')[-1] # '08', '09', '19'
-                        codigo_factor = f"F{codigo_factor_bruto.zfill(2)}" # 'F08', 'F09', 'F19'
-                        
-                        factores_para_crear.append(
-                            Factortributario(
-                                id_calificacion_tributaria=calif_trib,
-                                codigo_factor=codigo_factor,
-                                descripcion_factor=form.fields[nombre_campo].label,
-                                valor_factor=valor_factor
-                            )
-                        )
+                factores_para_crear = [
+                    Factortributario(
+                        id_calificacion_tributaria=calif_trib,
+                        codigo_factor=codigo_factor, # 'F08', 'F09', 'F19'
+                        descripcion_factor=ETIQUETAS[codigo_factor],
+                        valor_factor=valor_factor
+                    )
+                    for codigo_factor, valor_factor in valores_finales.items()
+                ]
                 Factortributario.objects.bulk_create(factores_para_crear)
+                actualizar_pivote([calif.id_calificacion])
 
                 """ # Log de Auditoría
                 Log.objects.create(
@@ -420,8 +401,7 @@ def calificacion_update_view(request, pk):
         # --- CAMBIO: Rellenar con F19 ---
         todos_los_factores_ui = FACTORES_BASE_UI + FACTORES_CALCULADOS_UI + FACTORES_DIRECTOS_UI
         for nombre_campo in todos_los_factores_ui:
-            codigo_factor_bruto = nombre_campo.split('_')[-1]
-            codigo_factor_db = f"F{codigo_factor_bruto.zfill(2)}" # 'F08', 'F09', 'F19'
+            codigo_factor_db = CODIGO_POR_CAMPO[nombre_campo] # 'F08', 'F09', 'F19'
             initial_data[nombre_campo] = factores_dict.get(codigo_factor_db, Decimal('0.00'))
 
         form = CalificacionForm(initial=initial_data)
@@ -436,298 +416,347 @@ def calificacion_update_view(request, pk):
 # ==========================================================
 #  VISTA 6: Carga Masiva (Reescrita con Validación Fila-a-Fila)
 # ==========================================================
+def _carga_masiva(request, tipo, nombre_url, template):
+    """
+    Lógica común de las dos Cargas Masivas ('factores' y 'montos').
+    Con IMPORTACION_EN_SEGUNDO_PLANO el archivo se encola y la petición
+    termina de inmediato (un worker lo procesa); si no, se procesa aquí.
+    """
+    if request.method != 'POST':
+        # --- Lógica GET (con el progreso del trabajo, si viene ?trabajo=ID,
+        # o el resultado de un "solo validar", si viene ?validacion=ID) ---
+        validacion = leer_resumen(request.GET.get('validacion'))
+        if validacion and not _puede_ver_reporte(request, validacion):
+            validacion = None
+        context = {'id_trabajo': request.GET.get('trabajo'), 'validacion': validacion}
+        return render(request, template, context)
+
+    archivo_csv = request.FILES.get('archivo_csv')
+    if not archivo_csv:
+        messages.error(request, 'No se seleccionó ningún archivo.')
+        return redirect(nombre_url)
+    if not archivo_csv.name.endswith('.csv'):
+        messages.error(request, 'El archivo no es un CSV.')
+        return redirect(nombre_url)
+
+    # --- Solo validar: revisa todo el archivo SIN escribir en la BBDD ---
+    if request.POST.get('solo_validar'):
+        resumen = crear_reporte_validacion(tipo, archivo_csv, request.session.get('id_usuario'))
+        if 'application/json' in request.headers.get('Accept', ''):
+            return JsonResponse(_pagina_reporte(request, resumen))
+        if resumen['filas_con_error']:
+            messages.warning(request, f"Validación: {resumen['filas_con_error']} de {resumen['filas']} filas tienen errores. No se guardó nada.")
+        else:
+            messages.success(request, f"Validación: las {resumen['filas']} filas son válidas. No se guardó nada.")
+        return redirect(f"{reverse(nombre_url)}?validacion={resumen['id_reporte']}")
+
+    # --- Obtener objetos necesarios ---
+    id_usuario_actual = request.session.get('id_usuario')
+    usuario_app = get_object_or_404(Usuario, id_usuario=id_usuario_actual)
+
+    # --- NUEVA LÓGICA DE ESTADOS ---
+    try:
+        estado_valido = Estado.objects.get(nombre='Activo') # ID 5
+        Estado.objects.get(nombre='Invalido') # El que acabas de crear
+    except Estado.DoesNotExist:
+        messages.error(request, 'Error crítico: Los estados "Activo" o "Invalido" no existen en la BBDD.')
+        return redirect(nombre_url)
+
+    # --- Archivo repetido: un reintento (ej. tras un timeout) no se vuelve a procesar ---
+    hash_contenido = calcular_hash_contenido(archivo_csv)
+    repetido = buscar_archivo_repetido(usuario_app, hash_contenido)
+    if repetido:
+        messages.info(request, f'Este archivo ya se había cargado (Archivo ID {repetido.id_archivo}, estado: {repetido.estado_validacion}). No se volvió a procesar.')
+        trabajo = TrabajoImportacion.objects.filter(id_archivo=repetido).order_by('-id_trabajo').first()
+        if trabajo:
+            return redirect(f'{reverse(nombre_url)}?trabajo={trabajo.id_trabajo}')
+        return redirect('calificaciones:lista_calificaciones')
+
+    # Crear el registro del Archivo
+    nuevo_archivo = Archivo.objects.create(
+        nombre_archivo=archivo_csv.name,
+        fecha_carga=timezone.now(),
+        estado_validacion='Pendiente',
+        id_usuario=usuario_app,
+        id_estado=estado_valido, # El archivo en sí está 'Activo'
+        hash_contenido=hash_contenido
+    )
+
+    # --- A. En segundo plano: encolar y responder de inmediato ---
+    if settings.IMPORTACION_EN_SEGUNDO_PLANO:
+        trabajo = encolar_importacion(nuevo_archivo, usuario_app, tipo, archivo_csv)
+        messages.info(request, f'Archivo recibido. Se está procesando en segundo plano (Trabajo ID {trabajo.id_trabajo}).')
+        return redirect(f'{reverse(nombre_url)}?trabajo={trabajo.id_trabajo}')
+
+    # --- B. En la misma petición ---
+    try:
+        carga = importar_archivo(nuevo_archivo, usuario_app, tipo, archivo_csv)
+    except Exception as e_general:
+        messages.error(request, mensaje_error_importacion(e_general))
+        return redirect(nombre_url)
+
+    messages.success(request, f'¡Proceso completado! Se guardaron {carga.registros_validos} calificaciones válidas.')
+    if carga.registros_actualizados or carga.registros_sin_cambios:
+        messages.info(request, f'{carga.registros_actualizados} ya existían y se actualizaron; {carga.registros_sin_cambios} ya existían sin cambios.')
+    if carga.registros_invalidos > 0:
+        messages.warning(request, f'Se encontraron {carga.registros_invalidos} calificaciones inválidas. Este es el detalle fila a fila.')
+    if carga.errores_guardados:
+        return redirect('calificaciones:errores_importacion', pk=nuevo_archivo.id_archivo)
+
+    return redirect('calificaciones:lista_calificaciones')
+
+
 @login_requerido_personalizado
 @rol_requerido(roles_permitidos=['Corredor', 'Administrador'])
 def calificacion_carga_masiva_view(request):
-    
-    if request.method == 'POST':
-        archivo_csv = request.FILES.get('archivo_csv')
-        if not archivo_csv:
-            messages.error(request, 'No se seleccionó ningún archivo.')
-            return redirect('calificaciones:carga_masiva')
-        if not archivo_csv.name.endswith('.csv'):
-            messages.error(request, 'El archivo no es un CSV.')
-            return redirect('calificaciones:carga_masiva')
-
-        # --- Definir cabeceras CSV (basado en tu spec) ---
-        cabeceras_base = [
-            'Ejercicio', 'Mercado', 'Instrumento', 'Fecha', 
-            'Secuencia', 'Numero de dividendo', 'Tipo sociedad', 'Valor Historico'
-        ]
-        # (Usamos F19, no F19A)
-        cabeceras_factores_csv = [f'Factor {i}' for i in range(8, 38)]
-        cabeceras_requeridas = cabeceras_base + cabeceras_factores_csv
-
-        # --- Obtener objetos necesarios ---
-        id_usuario_actual = request.session.get('id_usuario')
-        usuario_app = get_object_or_404(Usuario, id_usuario=id_usuario_actual)
-        
-        # --- NUEVA LÓGICA DE ESTADOS ---
-        try:
-            estado_valido = Estado.objects.get(nombre='Activo') # ID 5
-            estado_invalido = Estado.objects.get(nombre='Invalido') # El que acabas de crear
-        except Estado.DoesNotExist:
-            messages.error(request, 'Error crítico: Los estados "Activo" o "Invalido" no existen en la BBDD.')
-            return redirect('calificaciones:carga_masiva')
-
-        # Crear el registro del Archivo
-        nuevo_archivo = Archivo.objects.create(
-            nombre_archivo=archivo_csv.name,
-            fecha_carga=timezone.now(),
-            estado_validacion='Pendiente',
-            id_usuario=usuario_app,
-            id_estado=estado_valido # El archivo en sí está 'Activo'
+    return _carga_masiva(
+        request, TrabajoImportacion.TIPO_FACTORES,
+        'calificaciones:carga_masiva', 'calificaciones/carga_masiva.html'
+    )
+
+
+# ==========================================================
+#  VISTA 6b: Progreso de un Trabajo de Importación (JSON)
+# ==========================================================
+@login_requerido_personalizado
+@rol_requerido(roles_permitidos=['Corredor', 'Administrador'])
+def importacion_progreso_view(request, pk):
+    """
+    Estado y contadores de un TrabajoImportacion.
+    Lo consultan periódicamente las páginas de Carga Masiva.
+    """
+    trabajo = get_object_or_404(TrabajoImportacion, id_trabajo=pk)
+
+    # Un Corredor solo ve el avance de sus propias cargas
+    if request.session.get('rol_nombre') == 'Corredor' and trabajo.id_usuario_id != request.session.get('id_usuario'):
+        return JsonResponse({'error': 'No tienes permisos para ver este trabajo.'}, status=403)
+
+    return JsonResponse({
+        'id_trabajo': trabajo.id_trabajo,
+        'id_archivo': trabajo.id_archivo_id,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'terminado': trabajo.estado in (TrabajoImportacion.ESTADO_COMPLETADO, TrabajoImportacion.ESTADO_ERROR),
+        'filas_procesadas': trabajo.filas_procesadas,
+        'registros_validos': trabajo.registros_validos,
+        'registros_invalidos': trabajo.registros_invalidos,
+        'mensaje': trabajo.mensaje,
+        'errores': ErrorImportacion.objects.filter(id_archivo_id=trabajo.id_archivo_id).count() if trabajo.fecha_fin else 0,
+        'url_errores': reverse('calificaciones:errores_importacion', args=[trabajo.id_archivo_id]),
+    })
+
+# ==========================================================
+#  VISTA 6c: Reporte de errores de un "Solo validar" (JSON/CSV)
+# ==========================================================
+ERRORES_POR_PAGINA = 100
+MAX_ERRORES_POR_PAGINA = 1000
+
+
+def _puede_ver_reporte(request, resumen):
+    # Un Corredor solo ve los reportes de sus propios archivos
+    return request.session.get('rol_nombre') != 'Corredor' or resumen['id_usuario'] == request.session.get('id_usuario')
+
+
+def _entero_positivo(valor, por_defecto):
+    try:
+        return max(int(valor), 1)
+    except (TypeError, ValueError):
+        return por_defecto
+
+
+def _pagina_reporte(request, resumen):
+    """Resumen + una página de errores (?pagina=N&por_pagina=M)."""
+    pagina = _entero_positivo(request.GET.get('pagina'), 1)
+    por_pagina = min(_entero_positivo(request.GET.get('por_pagina'), ERRORES_POR_PAGINA), MAX_ERRORES_POR_PAGINA)
+    url = reverse('calificaciones:reporte_validacion', args=[resumen['id_reporte']])
+    paginas = -(-resumen['errores'] // por_pagina) # (división hacia arriba)
+    return {
+        **resumen,
+        'pagina': pagina,
+        'por_pagina': por_pagina,
+        'paginas': paginas,
+        'errores': leer_pagina_errores(resumen['id_reporte'], pagina, por_pagina),
+        'siguiente': f'{url}?pagina={pagina + 1}&por_pagina={por_pagina}' if pagina < paginas else None,
+        'csv': f'{url}?formato=csv',
+    }
+
+
+@login_requerido_personalizado
+@rol_requerido(roles_permitidos=['Corredor', 'Administrador'])
+def reporte_validacion_view(request, id_reporte):
+    """
+    Errores de un "Solo validar", paginados en JSON
+    o completos en CSV (?formato=csv).
+    """
+    resumen = leer_resumen(id_reporte)
+    if resumen is None:
+        return JsonResponse({'error': 'El reporte no existe.'}, status=404)
+    if not _puede_ver_reporte(request, resumen):
+        return JsonResponse({'error': 'No tienes permisos para ver este reporte.'}, status=403)
+
+    if request.GET.get('formato') == 'csv':
+        nombre = os.path.splitext(resumen['nombre_archivo'])[0]
+        return FileResponse(
+            abrir_errores(id_reporte), as_attachment=True,
+            filename=f'errores_{nombre}.csv', content_type='text/csv'
         )
+    return JsonResponse(_pagina_reporte(request, resumen))
 
-        # Contadores y log de errores
-        registros_validos = 0
-        registros_invalidos = 0
-        errores_fila = []
 
-        try:
-            data_set = archivo_csv.read().decode('UTF-8')
-            io_string = io.StringIO(data_set)
-            reader = csv.DictReader(io_string)
-            
-            # 1. Validar cabeceras (esto sí es "todo o nada")
-            if not all(col in reader.fieldnames for col in cabeceras_requeridas):
-                missing = [col for col in cabeceras_requeridas if col not in reader.fieldnames]
-                messages.error(request, f'El archivo CSV no tiene las cabeceras requeridas. Faltan: {", ".join(missing)}')
-                raise Exception('Cabeceras inválidas') # Abortar carga
-
-            # 2. Procesar fila por fila
-            for i, fila in enumerate(reader, 2): # Empezar en 2 (contando la cabecera)
-                
-                estado_actual = estado_valido
-                descripcion_log = f"Carga Masiva - Tipo: {fila.get('Tipo sociedad', 'N/A')}"
-                
-                try:
-                    # --- INICIO DE VALIDACIÓN Y PROCESO POR FILA ---
-                    # Usamos una transacción por fila
-                    with transaction.atomic():
-                    
-                        # --- A. Validación de Formato (Fecha) ---
-                        try:
-                            fecha_pago_dt = datetime.strptime(fila['Fecha'], '%d-%m-%Y')
-                            fecha_pago_db = fecha_pago_dt.strftime('%Y-%m-%d')
-                        except ValueError:
-                            raise Exception(f"Formato de fecha inválido '{fila['Fecha']}'. Use DD-MM-AAAA.")
-
-                        # --- B. Validación de Negocio (Suma de Factores) ---
-                        suma_factores_base = Decimal('0.0')
-                        for j in range(8, 20): # Factores 8 al 19
-                            valor_str = fila.get(f'Factor {j}')
-                            suma_factores_base += Decimal(valor_str or '0.0')
-                        
-                        if suma_factores_base > Decimal('1.00000001'):
-                            estado_actual = estado_invalido 
-                            # Guardamos la razón del error
-                            descripcion_log = f"Error: Suma de factores base ({suma_factores_base}) > 1"
-
-                        # --- C. Buscar/Crear objetos relacionados ---
-                        instrumento, _ = Instrumento.objects.get_or_create(
-                            nombre=fila['Instrumento'],
-                            defaults={'tipo': 'Desconocido', 'moneda': 'N/A'}
-                        )
-                        mercado, _ = Mercado.objects.get_or_create(
-                            nombre=fila['Mercado'],
-                            defaults={'pais': 'N/A'}
-                        )
-
-                        # --- D. Crear 'Calificacion' (Padre) ---
-                        nueva_calificacion = Calificacion.objects.create(
-                            fecha_pago=fecha_pago_db,
-                            id_usuario=usuario_app,
-                            id_instrumento=instrumento,
-                            id_mercado=mercado,
-                            id_archivo=nuevo_archivo, 
-                            id_estado=estado_actual,
-                            fecha_registro=timezone.now(),
-                            activo=True # Siempre activo (visible), el estado indica validez
-                        )
-
-                        # --- E. Crear 'CalificacionTributaria' (Hijo) ---
-                        nueva_calif_trib = Calificaciontributaria.objects.create(
-                            id_calificacion=nueva_calificacion,
-                            secuencia_evento=fila['Secuencia'],
-                            evento_capital=fila['Numero de dividendo'],
-                            anio=fila['Ejercicio'],
-                            valor_historico=Decimal(fila['Valor Historico'] or '0.0'),
-                            descripcion=descripcion_log, # Guardamos el log del error aquí
-                            ingreso_por_montos=False
-                        )
-                        
-                        # --- F. Crear 'Factortributario' (Nietos) ---
-                        # Guardamos los factores *incluso si son inválidos* # para que el usuario pueda ver qué cargó.
-                        factores_para_crear = []
-                        for codigo_factor_csv in cabeceras_factores_csv: # 'Factor 8', 'Factor 9'...
-                            valor_str = fila.get(codigo_factor_csv)
-                            if valor_str:
-                                valor_factor = Decimal(valor_str)
-                                if valor_factor != Decimal('0.0'):
-                                    codigo_num_str = codigo_factor_csv.split(' ')[-1]
-                                    codigo_db = f"F{codigo_num_str.zfill(2)}"
-                                    factores_para_crear.append(
-                                        Factortributario(
-                                            id_calificacion_tributaria=nueva_calif_trib,
-                                            codigo_factor=codigo_db,
-                                            descripcion_factor=codigo_factor_csv,
-                                            valor_factor=valor_factor
-                                        )
-                                    )
-                        if factores_para_crear:
-                            Factortributario.objects.bulk_create(factores_para_crear)
-
-                        # --- G. Actualizar contadores ---
-                        if estado_actual == estado_valido:
-                            registros_validos += 1
-                        else:
-                            registros_invalidos += 1
-                
-                # --- FIN DEL TRY POR FILA ---
-                except Exception as e_fila:
-                    # Si algo falló (formato de fecha, BBDD, etc.), se revierte la fila
-                    registros_invalidos += 1
-                    errores_fila.append(f"Fila {i}: {e_fila}")
-
-            # --- 3. Finalizar Proceso ---
-            nuevo_archivo.estado_validacion = 'Validado'
-            nuevo_archivo.save()
-            
-            # Log general
-            detalle_log = f'Carga Masiva: {registros_validos} válidos, {registros_invalidos} inválidos desde {nuevo_archivo.nombre_archivo}.'
-            if errores_fila:
-                detalle_log += f" Errores: {'; '.join(errores_fila)}"
-                
-            Log.objects.create(
-                fecha=timezone.now(),
-                accion='IMPORT',
-                detalle=detalle_log,
-                id_usuario=usuario_app,
-                id_calificacion=None
-            )
-            
-            messages.success(request, f'¡Proceso completado! Se guardaron {registros_validos} calificaciones válidas.')
-            if registros_invalidos > 0:
-                messages.warning(request, f'Se encontraron {registros_invalidos} calificaciones inválidas. Revise la grilla (filtrando por estado) o el log de auditoría para más detalles.')
-            
-            return redirect('calificaciones:lista_calificaciones')
-
-        except Exception as e_general:
-            # Captura errores generales (ej. cabeceras)
-            nuevo_archivo.estado_validacion = 'Rechazado'
-            nuevo_archivo.save()
-            Log.objects.create(
-                fecha=timezone.now(),
-                accion='IMPORT',
-                detalle=f'Error fatal en Carga Masiva (archivo: {nuevo_archivo.nombre_archivo}). Error: {e_general}',
-                id_usuario=usuario_app,
-                id_calificacion=None
-            )
-            messages.error(request, f'Error al procesar el archivo: {e_general}. No se guardó ningún registro.')
-            return redirect('calificaciones:carga_masiva')
+# ==========================================================
+#  VISTA 6d: Errores fila a fila de un Archivo importado
+# ==========================================================
+@login_requerido_personalizado
+@rol_requerido(roles_permitidos=['Corredor', 'Administrador', 'Auditor'])
+def errores_importacion_view(request, pk):
+    """
+    Errores de la importación de un Archivo, paginados en el orden del
+    CSV (índice 'error_imp_archivo_fila_idx'). Filtro opcional por ?codigo=.
+    """
+    archivo = get_object_or_404(Archivo, id_archivo=pk)
+
+    # Un Corredor solo ve los errores de sus propios archivos
+    if request.session.get('rol_nombre') == 'Corredor' and archivo.id_usuario_id != request.session.get('id_usuario'):
+        messages.error(request, 'No tienes permisos para ver este archivo.')
+        return redirect('calificaciones:lista_calificaciones')
+
+    qs = ErrorImportacion.objects.filter(id_archivo=archivo).order_by('fila', 'id_error')
+    codigo = request.GET.get('codigo')
+    if codigo:
+        qs = qs.filter(codigo=codigo)
+
+    paginador = Paginator(qs.only('fila', 'columna', 'codigo', 'mensaje'), ERRORES_POR_PAGINA)
+    context = {
+        'archivo': archivo,
+        'codigo': codigo,
+        'codigos': ErrorImportacion.CODIGO_CHOICES,
+        'pagina': paginador.get_page(request.GET.get('pagina')),
+    }
+    return render(request, 'calificaciones/errores_importacion.html', context)
+
 
-    else:
-        return render(request, 'calificaciones/carga_masiva.html')
-    
 # ==========================================================
 #  VISTA 7: Exportar a CSV (CU7)
 # ==========================================================
+def _usuario_sesion(request):
+    return (request.session.get('id_usuario'),)
+
+
+def _sesion_y_csrf(request):
+    # La página muestra datos de la sesión y lleva el token CSRF
+    return (request.session.session_key, request.COOKIES.get(settings.CSRF_COOKIE_NAME))
+
+
 @login_requerido_personalizado
 @rol_requerido(roles_permitidos=['Administrador', 'Auditor']) # Opcional: ¿Corredores también?
+@condicional_por_version([TABLA_PIVOTE], identidad=_usuario_sesion) # (304 si los datos no cambiaron)
 def calificacion_export_csv_view(request):
     
-    # --- 1. LÓGICA DE FILTROS (Copiada de 'calificacion_list_view') ---
+    # --- 1. LÓGICA DE FILTROS (la misma de 'calificacion_list_view') ---
     # Usamos request.GET para leer los mismos filtros de la URL (ej. ?anio=2025)
     form = CalificacionFilterForm(request.GET or None)
     
     id_usuario_actual = request.session.get('id_usuario')
-    rol_usuario_actual = request.session.get('rol_nombre')
     
-    qs_base = Calificacion.objects.select_related(
-        'id_instrumento', 'id_mercado', 'id_usuario', 'id_estado'
+    # --- 2. TABLA PIVOTE (factores F08..F37 ya en columnas) ---
+    # (Lógica de permisos para la consulta: Admin y Auditor ven todo)
+    qs = CalificacionPivote.objects.filter(activo=True)
+    qs = filtrar_pivote(qs, form.filtros(), id_usuario_actual)
+
+    # --- 3. ENVIAR EL ARCHIVO POR PARTES ---
+    # Se lee de a trozos y cada trozo sale de inmediato: la memoria no crece
+    # con el tamaño del reporte. Con ?formato=csv.gz se envía comprimido y
+    # con ?formato=parquet, en columnas con tipo (ver 'exportacion.py').
+    formato = request.GET.get('formato', 'csv')
+    if formato not in FORMATOS_EXPORTACION:
+        formato = 'csv'
+    content_type, nombre_archivo = FORMATOS_EXPORTACION[formato]
+    response = StreamingHttpResponse(
+        exportar(qs, formato),
+        content_type=content_type,
+        headers={'Content-Disposition': f'attachment; filename="{nombre_archivo}"'},
     )
-    
-    # (Lógica de permisos para la consulta)
-    qs = qs_base.all()
-        
-    if form.is_valid():
-        if form.cleaned_data.get('mercado'):
-            qs = qs.filter(id_mercado=form.cleaned_data['mercado'])
-        if form.cleaned_data.get('anio'):
-            qs = qs.filter(calificaciontributaria__anio=form.cleaned_data['anio'])
-        if form.cleaned_data.get('origen'):
-            origen = form.cleaned_data['origen']
-            if origen == 'manual':
-                qs = qs.filter(id_usuario_id=id_usuario_actual, id_archivo__isnull=True)
-            elif origen == 'archivo':
-                qs = qs.filter(id_archivo__isnull=False)
-
-    # --- 2. LÓGICA DE PIVOTEO (Copiada de 'calificacion_list_view') ---
-    qs = qs.prefetch_related(
-        'calificaciontributaria_set__factortributario_set'
-    )
-    
-    # (Usamos F19, como definimos en el último paso)
-    codigos_factores_db = [
-        'F08', 'F09', 'F10', 'F11', 'F12', 'F13', 'F14', 'F15', 'F16', 'F17', 
-        'F18', 'F19', 'F20', 'F21', 'F22', 'F23', 'F24', 'F25', 'F26', 'F27', 
-        'F28', 'F29', 'F30', 'F31', 'F32', 'F33', 'F34', 'F35', 'F36', 'F37'
-    ]
-
-    # --- 3. PREPARAR EL ARCHIVO CSV ---
-    
-    # Definir el nombre del archivo
-    response = HttpResponse(
-        content_type='text/csv',
-        headers={'Content-Disposition': 'attachment; filename="reporte_calificaciones.csv"'},
+    return response
+
+
+# ==========================================================
+#  VISTA 7b: Exportar en segundo plano (.csv.gz / .zip)
+# ==========================================================
+@login_requerido_personalizado
+@rol_requerido(roles_permitidos=['Administrador', 'Auditor'])
+def exportacion_encolar_view(request):
+    """
+    Guarda los filtros de la Lista en un TrabajoExportacion y vuelve a la
+    Lista (con ?exportacion=ID) mientras un worker arma el archivo.
+    Si el mismo pedido ya tiene un archivo vigente con los mismos datos,
+    se reutiliza en vez de armar otro.
+    """
+    form = CalificacionFilterForm(request.GET or None)
+    formato = request.GET.get('formato', 'csv.gz')
+    if formato not in FORMATOS_ARCHIVO:
+        formato = 'csv.gz'
+
+    usuario_app = Usuario.objects.filter(id_usuario=request.session.get('id_usuario')).first()
+    trabajo, reutilizado = encolar_exportacion(form.filtros(), formato, usuario_app)
+    if reutilizado:
+        messages.info(request, f'Ya hay una exportación con estos filtros y los mismos datos (Trabajo ID {trabajo.id_trabajo}).')
+    else:
+        messages.info(request, f'Exportación encolada. Se está armando en segundo plano (Trabajo ID {trabajo.id_trabajo}).')
+
+    parametros = request.GET.copy()
+    for parametro in ('formato', 'despues', 'antes'):
+        parametros.pop(parametro, None)
+    parametros['exportacion'] = trabajo.id_trabajo
+    return redirect(f"{reverse('calificaciones:lista_calificaciones')}?{parametros.urlencode()}")
+
+
+@login_requerido_personalizado
+@rol_requerido(roles_permitidos=['Administrador', 'Auditor'])
+def exportacion_progreso_view(request, pk):
+    """
+    Estado de un TrabajoExportacion (JSON) y, si terminó, su enlace de
+    descarga (vence a las EXPORTACION_VIGENCIA_HORAS horas).
+    (Los trabajos se comparten: Administrador y Auditor pueden exportar todo,
+    y un pedido que depende del usuario tiene su propia clave)
+    """
+    trabajo = get_object_or_404(TrabajoExportacion, id_trabajo=pk)
+
+    disponible = (
+        trabajo.estado == TrabajoExportacion.ESTADO_COMPLETADO and trabajo.ruta
+        and trabajo.fecha_expiracion and trabajo.fecha_expiracion > timezone.now()
     )
-    response.write(u'\ufeff'.encode('utf8')) # BOM para que Excel reconozca UTF-8
-
-    # Definir las cabeceras del CSV (basado en la spec del cliente)
-    cabeceras_csv = [
-        'Ejercicio', 'Mercado', 'Instrumento', 'Fecha', 
-        'Secuencia', 'Numero de dividendo', 'Valor Historico',
-        'Estado', 'Origen'
-    ]
-    # Nombres de factor: "Factor 8", "Factor 9", ...
-    cabeceras_factores_csv = [f'Factor {i}' for i in range(8, 38)] 
-    
-    # Crear el escritor de CSV
-    writer = csv.writer(response, delimiter=';') # Usamos ';' para Excel en español
-    writer.writerow(cabeceras_csv + cabeceras_factores_csv)
-
-    # --- 4. ESCRIBIR LAS FILAS ---
-    for calif in qs:
-        # Procesar los datos (lógica de pivoteo simplificada)
-        tributaria = calif.calificaciontributaria_set.first()
-        factores_dict = {}
-        if tributaria:
-            factores_lista = tributaria.factortributario_set.all()
-            factores_dict = {f.codigo_factor: f.valor_factor for f in factores_lista}
-        
-        # Preparar la fila base
-        fila = [
-            tributaria.anio if tributaria else '',
-            calif.id_mercado.nombre if calif.id_mercado else '',
-            calif.id_instrumento.nombre if calif.id_instrumento else '',
-            calif.fecha_pago.strftime('%d-%m-%Y') if calif.fecha_pago else '',
-            tributaria.secuencia_evento if tributaria else '',
-            tributaria.evento_capital if tributaria else '',
-            tributaria.valor_historico if tributaria else '',
-            calif.id_estado.nombre if calif.id_estado else '',
-            'Archivo' if calif.id_archivo else 'Manual',
-        ]
-        
-        # Añadir los factores a la fila
-        for codigo in codigos_factores_db: # F08, F09...
-            valor = factores_dict.get(codigo, Decimal('0.00'))
-            fila.append(valor)
-        
-        # Escribir la fila en el archivo
-        writer.writerow(fila)
+    return JsonResponse({
+        'id_trabajo': trabajo.id_trabajo,
+        'formato': trabajo.formato,
+        'estado': trabajo.estado,
+        'terminado': trabajo.estado in (TrabajoExportacion.ESTADO_COMPLETADO, TrabajoExportacion.ESTADO_ERROR),
+        'filas': trabajo.filas,
+        'mensaje': trabajo.mensaje,
+        'fecha_expiracion': trabajo.fecha_expiracion.isoformat() if trabajo.fecha_expiracion else None,
+        'url_descarga': reverse('calificaciones:exportacion_descargar', args=[token_descarga(trabajo)]) if disponible else None,
+    })
 
-    return response
+
+@login_requerido_personalizado
+@rol_requerido(roles_permitidos=['Administrador', 'Auditor'])
+def exportacion_descargar_view(request, token):
+    """
+    Entrega el archivo de una exportación. El enlace lleva un token firmado
+    con fecha: pasada la vigencia (o si el archivo ya se borró) no sirve.
+    """
+    try:
+        pk = id_trabajo_de_token(token)
+    except signing.BadSignature: # (También SignatureExpired)
+        messages.error(request, 'El enlace de descarga no es válido o ya venció.')
+        return redirect('calificaciones:lista_calificaciones')
+
+    trabajo = get_object_or_404(TrabajoExportacion, id_trabajo=pk, estado=TrabajoExportacion.ESTADO_COMPLETADO)
+    if not trabajo.ruta or not trabajo.fecha_expiracion or trabajo.fecha_expiracion <= timezone.now():
+        messages.error(request, 'El archivo de esta exportación ya venció. Vuelve a exportar.')
+        return redirect('calificaciones:lista_calificaciones')
+
+    content_type, nombre_archivo = FORMATOS_ARCHIVO[trabajo.formato]
+    return FileResponse(default_storage.open(trabajo.ruta, 'rb'), as_attachment=True, filename=nombre_archivo, content_type=content_type)
 
 
 # ==========================================================
@@ -736,212 +765,17 @@ def calificacion_export_csv_view(request):
 @login_requerido_personalizado
 @rol_requerido(roles_permitidos=['Corredor', 'Administrador'])
 def calificacion_carga_montos_view(request):
-    
-    if request.method == 'POST':
-        archivo_csv = request.FILES.get('archivo_csv')
-        if not archivo_csv:
-            messages.error(request, 'No se seleccionó ningún archivo.')
-            return redirect('calificaciones:carga_masiva_montos')
-        if not archivo_csv.name.endswith('.csv'):
-            messages.error(request, 'El archivo no es un CSV.')
-            return redirect('calificaciones:carga_masiva_montos')
-
-        # --- Definir cabeceras CSV (basado en tu nueva spec) ---
-        cabeceras_base = [
-            'Ejercicio', 'Mercado', 'Instrumento', 'Fecha', 
-            'Secuencia', 'Numero de dividendo', 'Tipo sociedad', 'Valor Historico'
-        ]
-        # (Usamos F19, no F19A)
-        cabeceras_montos_csv = [f'Monto_{i:02d}' for i in range(8, 38)] # Monto_08 ... Monto_37
-        cabeceras_requeridas = cabeceras_base + cabeceras_montos_csv
-
-        # --- Obtener objetos necesarios ---
-        id_usuario_actual = request.session.get('id_usuario')
-        usuario_app = get_object_or_404(Usuario, id_usuario=id_usuario_actual)
-        try:
-            estado_valido = Estado.objects.get(nombre='Activo')
-            estado_invalido = Estado.objects.get(nombre='Invalido')
-        except Estado.DoesNotExist:
-            messages.error(request, 'Error crítico: Los estados "Activo" o "Invalido" no existen.')
-            return redirect('calificaciones:carga_masiva_montos')
-
-        nuevo_archivo = Archivo.objects.create(
-            nombre_archivo=archivo_csv.name,
-            fecha_carga=timezone.now(),
-            estado_validacion='Pendiente',
-            id_usuario=usuario_app,
-            id_estado=estado_valido
-        )
-
-        # Contadores y log de errores
-        registros_validos = 0
-        registros_invalidos = 0
-        errores_fila = []
-
-        try:
-            data_set = archivo_csv.read().decode('UTF-8')
-            io_string = io.StringIO(data_set)
-            # Usamos separador coma (,)
-            reader = csv.DictReader(io_string, delimiter=',')
-            
-            # 1. Validar cabeceras
-            if not all(col in reader.fieldnames for col in cabeceras_requeridas):
-                missing = [col for col in cabeceras_requeridas if col not in reader.fieldnames]
-                messages.error(request, f'El archivo CSV no tiene las cabeceras requeridas. Faltan: {", ".join(missing)}')
-                raise Exception('Cabeceras inválidas')
-
-            # 2. Procesar fila por fila
-            for i, fila in enumerate(reader, 2):
-                
-                estado_actual = estado_valido
-                descripcion_log = f"Carga Masiva (Montos) - Tipo: {fila.get('Tipo sociedad', 'N/A')}"
-                valores_finales = {} # Para guardar los *factores calculados*
-                
-                try:
-                    # --- INICIO DE VALIDACIÓN Y PROCESO POR FILA ---
-                    with transaction.atomic():
-                    
-                        # --- A. Validación de Formato (Fecha AAAA-MM-DD) ---
-                        try:
-                            fecha_pago_db = fila['Fecha']
-                            datetime.strptime(fecha_pago_db, '%Y-%m-%d')
-                        except ValueError:
-                            raise Exception(f"Formato de fecha inválido '{fila['Fecha']}'. Use AAAA-MM-DD.")
-
-                        # --- B. LÓGICA DE CÁLCULO (Montos -> Factores) ---
-                        # (Idéntica a 'calificacion_create_view')
-                        
-                        # 1. Sumar montos base (Monto_08 a Monto_19)
-                        suma_total_montos = Decimal('0.0')
-                        for campo_ui in FACTORES_BASE_UI: # 'factor_08', 'factor_09'...
-                            codigo_monto_csv = f"Monto_{campo_ui.split('_')[-1]}" # 'Monto_08', 'Monto_09'...
-                            suma_total_montos += Decimal(fila.get(codigo_monto_csv) or '0.0')
-
-                        precision = Decimal('0.00000001')
-                        
-                        if suma_total_montos > 0:
-                            # 2. Calcular factores 8-33
-                            campos_a_calcular = FACTORES_BASE_UI + FACTORES_CALCULADOS_UI
-                            for campo_ui in campos_a_calcular:
-                                codigo_monto_csv = f"Monto_{campo_ui.split('_')[-1]}"
-                                codigo_factor_db = f"F{campo_ui.split('_')[-1].zfill(2)}" # F08, F09, F19...
-                                
-                                monto_campo = Decimal(fila.get(codigo_monto_csv) or '0.0')
-                                factor_calculado = (monto_campo / suma_total_montos).quantize(precision, rounding=ROUND_HALF_UP)
-                                valores_finales[codigo_factor_db] = factor_calculado
-                        else:
-                            # 3. Si suma es 0, todos los factores calculados son 0
-                            campos_a_calcular = FACTORES_BASE_UI + FACTORES_CALCULADOS_UI
-                            for campo_ui in campos_a_calcular:
-                                codigo_factor_db = f"F{campo_ui.split('_')[-1].zfill(2)}"
-                                valores_finales[codigo_factor_db] = Decimal('0.0')
-                        
-                        # 4. Los factores directos (34-37) se toman del monto
-                        for campo_ui in FACTORES_DIRECTOS_UI:
-                            codigo_monto_csv = f"Monto_{campo_ui.split('_')[-1]}"
-                            codigo_factor_db = f"F{campo_ui.split('_')[-1].zfill(2)}"
-                            valores_finales[codigo_factor_db] = Decimal(fila.get(codigo_monto_csv) or '0.0')
-
-                        # --- C. Buscar/Crear objetos relacionados ---
-                        instrumento, _ = Instrumento.objects.get_or_create(
-                            nombre=fila['Instrumento'],
-                            defaults={'tipo': 'Desconocido', 'moneda': 'N/A'}
-                        )
-                        mercado, _ = Mercado.objects.get_or_create(
-                            nombre=fila['Mercado'],
-                            defaults={'pais': 'N/A'}
-                        )
-
-                        # --- D. Crear 'Calificacion' (Padre) ---
-                        nueva_calificacion = Calificacion.objects.create(
-                            fecha_pago=fecha_pago_db,
-                            id_usuario=usuario_app, # El usuario que carga
-                            id_instrumento=instrumento,
-                            id_mercado=mercado,
-                            id_archivo=nuevo_archivo, 
-                            id_estado=estado_actual, # Siempre Válido (no hay validación de suma en montos)
-                            fecha_registro=timezone.now(),
-                            activo=True 
-                        )
-
-                        # --- E. Crear 'CalificacionTributaria' (Hijo) ---
-                        nueva_calif_trib = Calificaciontributaria.objects.create(
-                            id_calificacion=nueva_calificacion,
-                            secuencia_evento=fila['Secuencia'],
-                            evento_capital=fila['Numero de dividendo'],
-                            anio=fila['Ejercicio'],
-                            valor_historico=Decimal(fila['Valor Historico'] or '0.0'),
-                            descripcion=descripcion_log,
-                            ingreso_por_montos=True 
-                        )
-                        
-                        # --- F. Crear 'Factortributario' (Nietos) ---
-                        # Guardamos los *factores calculados*
-                        factores_para_crear = []
-                        for codigo_db, valor_factor in valores_finales.items():
-                            if valor_factor is not None and valor_factor != Decimal('0.0'):
-                                factores_para_crear.append(
-                                    Factortributario(
-                                        id_calificacion_tributaria=nueva_calif_trib,
-                                        codigo_factor=codigo_db,
-                                        descripcion_factor=f"Factor-{codigo_db[1:]}",
-                                        valor_factor=valor_factor
-                                    )
-                                )
-                        if factores_para_crear:
-                            Factortributario.objects.bulk_create(factores_para_crear)
-
-                        registros_validos += 1
-                
-                # --- FIN DEL TRY POR FILA ---
-                except Exception as e_fila:
-                    registros_invalidos += 1
-                    errores_fila.append(f"Fila {i}: {e_fila}")
-
-            # --- 3. Finalizar Proceso ---
-            nuevo_archivo.estado_validacion = 'Validado'
-            nuevo_archivo.save()
-            
-            detalle_log = f'Carga Masiva (Montos): {registros_validos} válidos, {registros_invalidos} inválidos desde {nuevo_archivo.nombre_archivo}.'
-            if errores_fila:
-                detalle_log += f" Errores: {'; '.join(errores_fila)}"
-            
-            Log.objects.create(
-                fecha=timezone.now(),
-                accion='IMPORT',
-                detalle=detalle_log,
-                id_usuario=usuario_app,
-                id_calificacion=None
-            )
-            
-            messages.success(request, f'¡Proceso completado! Se guardaron {registros_validos} calificaciones válidas.')
-            if registros_invalidos > 0:
-                messages.warning(request, f'Se encontraron {registros_invalidos} filas con errores. Revise el log de auditoría para más detalles.')
-            
-            return redirect('calificaciones:lista_calificaciones')
-
-        except Exception as e_general:
-            nuevo_archivo.estado_validacion = 'Rechazado'
-            nuevo_archivo.save()
-            Log.objects.create(
-                fecha=timezone.now(),
-                accion='IMPORT',
-                detalle=f'Error fatal en Carga Masiva (Montos): {e_general}',
-                id_usuario=usuario_app,
-                id_calificacion=None
-            )
-            messages.error(request, f'Error al procesar el archivo: {e_general}. No se guardó ningún registro.')
-            return redirect('calificaciones:carga_masiva_montos')
-
-    else:
-        # --- Lógica GET ---
-        return render(request, 'calificaciones/carga_masiva_montos.html')
+    return _carga_masiva(
+        request, TrabajoImportacion.TIPO_MONTOS,
+        'calificaciones:carga_masiva_montos', 'calificaciones/carga_masiva_montos.html'
+    )
     
 
  # ==========================================================
 #  VISTA 9: Dashboard (Corregida - Error de Doble JSON)
 # ==========================================================
 @login_requerido_personalizado
+@condicional_por_version([TABLA_PIVOTE], identidad=_sesion_y_csrf, muestra_mensajes=True) # (304 si los datos no cambiaron)
 def dashboard_view(request):
     
     # --- 1. Estadísticas para Tarjetas (Cards) ---
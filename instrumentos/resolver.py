@@ -0,0 +1,85 @@
+from django.db import connection
+
+from .models import Instrumento, Mercado
+
+
+# ==========================================================
+#  RESOLVER DE CATÁLOGOS (Instrumento / Mercado por nombre)
+# ==========================================================
+class ResolverCatalogos:
+    """
+    Traduce nombres de Instrumento y Mercado a sus IDs.
+
+    En vez de un 'get_or_create' por fila, se le entregan todos los
+    nombres distintos de un archivo (o lote) con 'precargar':
+    1. Una consulta 'IN' trae los que ya existen.
+    2. Un 'bulk_create' crea los que faltan.
+    Desde ahí los IDs se entregan desde un diccionario en memoria.
+    """
+
+    # (modelo, valores por defecto al crear) -> idénticos a los get_or_create previos
+    CATALOGOS = {
+        'instrumento': (Instrumento, {'tipo': 'Desconocido', 'moneda': 'N/A'}),
+        'mercado': (Mercado, {'pais': 'N/A'}),
+    }
+
+    def __init__(self):
+        self._ids = {'instrumento': {}, 'mercado': {}}
+
+    def precargar(self, instrumentos=(), mercados=()):
+        """
+        Resuelve de una vez todos los nombres recibidos que aún no estén en memoria.
+        """
+        self._resolver('instrumento', instrumentos)
+        self._resolver('mercado', mercados)
+
+    def id_instrumento(self, nombre):
+        if nombre not in self._ids['instrumento']:
+            self._resolver('instrumento', [nombre])
+        return self._ids['instrumento'][nombre]
+
+    def id_mercado(self, nombre):
+        if nombre not in self._ids['mercado']:
+            self._resolver('mercado', [nombre])
+        return self._ids['mercado'][nombre]
+
+    def _resolver(self, catalogo, nombres):
+        modelo, defaults = self.CATALOGOS[catalogo]
+        pk = modelo._meta.pk.attname
+        ids = self._ids[catalogo]
+
+        faltantes = {n for n in nombres if n not in ids}
+        if not faltantes:
+            return
+
+        # 1. Los que ya existen (una sola consulta 'IN')
+        self._cargar_existentes(modelo, pk, ids, faltantes)
+
+        # 2. Los que no existen se crean juntos
+        nuevos = [n for n in faltantes if n not in ids]
+        if nuevos:
+            creados = modelo.objects.bulk_create([modelo(nombre=n, **defaults) for n in nuevos])
+            if connection.features.can_return_rows_from_bulk_insert:
+                ids.update((obj.nombre, obj.pk) for obj in creados)
+            else:
+                # (MySQL no devuelve las PK del bulk_create: volvemos a leerlas)
+                self._cargar_existentes(modelo, pk, ids, nuevos)
+
+    @staticmethod
+    def _cargar_existentes(modelo, pk, ids, nombres):
+        # Si hay nombres repetidos en el catálogo, usamos el de menor ID
+        filas = (
+            modelo.objects.filter(nombre__in=list(nombres))
+            .order_by('-' + pk)
+            .values_list('nombre', pk)
+        )
+        exactos, sin_mayusculas = {}, {}
+        for nombre, id_ in filas:
+            exactos[nombre] = id_
+            # (La collation de MySQL no distingue mayúsculas: 'acn' == 'ACN')
+            sin_mayusculas[nombre.lower()] = id_
+        for nombre in nombres:
+            if nombre in exactos:
+                ids[nombre] = exactos[nombre]
+            elif nombre.lower() in sin_mayusculas:
+                ids[nombre] = sin_mayusculas[nombre.lower()]
@@ -146,6 +146,53 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",  
 ]
 
+# Archivos subidos (ej. CSV de Carga Masiva en espera de un worker)
+MEDIA_ROOT = BASE_DIR / 'media'
+
+
+# ==========================================================
+#  CARGA MASIVA EN SEGUNDO PLANO
+# ==========================================================
+# Si es True, las vistas de Carga Masiva solo encolan el archivo y el
+# comando 'python manage.py procesar_importaciones' lo procesa.
+IMPORTACION_EN_SEGUNDO_PLANO = os.getenv('IMPORTACION_EN_SEGUNDO_PLANO', 'True') == 'True'
+# Carpeta (dentro de MEDIA_ROOT) donde quedan los CSV encolados
+IMPORTACION_DIRECTORIO = 'importaciones'
+# Filas por transacción en la Carga Masiva (ver 'python -m benchmarks.tamano_lote')
+IMPORTACION_TAMANO_LOTE = int(os.getenv('IMPORTACION_TAMANO_LOTE', '1000'))
+# Procesos que validan lotes en paralelo (1 = en el mismo proceso, sin pool)
+IMPORTACION_PROCESOS = int(os.getenv('IMPORTACION_PROCESOS', '1'))
+# (Se pueden correr varios 'procesar_importaciones' a la vez, con archivos
+# distintos: cada lote toma la versión de la tabla pivote recién al final,
+# justo antes del COMMIT, y solo ese paso corto queda en fila entre ellos;
+# ver 'escritura_pivote' en 'calificaciones/pivote.py')
+
+# Calculadora de factores por lotes: máximo de filas por petición
+CALCULADORA_MAX_FILAS = int(os.getenv('CALCULADORA_MAX_FILAS', '100000'))
+
+# Lista de calificaciones: filas por página (se puede cambiar con ?por_pagina=, hasta 500)
+LISTA_POR_PAGINA = int(os.getenv('LISTA_POR_PAGINA', '50'))
+
+# API de calificaciones: máximo de ?page_size= (paginación por cursor)
+API_MAX_POR_PAGINA = int(os.getenv('API_MAX_POR_PAGINA', '5000'))
+# API de calificaciones: máximo de calificaciones por POST a 'bulk/' (creación por lotes)
+API_MAX_LOTE = int(os.getenv('API_MAX_LOTE', '10000'))
+
+# ==========================================================
+#  EXPORTACIÓN EN SEGUNDO PLANO
+# ==========================================================
+# Los archivos (.csv.gz / .zip) los arma 'python manage.py procesar_exportaciones'
+# Carpeta (dentro de MEDIA_ROOT) donde quedan los archivos exportados
+EXPORTACION_DIRECTORIO = os.getenv('EXPORTACION_DIRECTORIO', 'exportaciones')
+# Horas que duran el archivo y su enlace de descarga (después se borra)
+EXPORTACION_VIGENCIA_HORAS = int(os.getenv('EXPORTACION_VIGENCIA_HORAS', '24'))
+
+# Trabajos en segundo plano (importación y exportación): un trabajo 'Procesando'
+# sin aviso de vida del worker por estos minutos se vuelve a encolar (el
+# worker murió), hasta TRABAJOS_MAX_INTENTOS veces; después queda en 'Error'
+TRABAJOS_LATIDO_VENCIDO_MINUTOS = int(os.getenv('TRABAJOS_LATIDO_VENCIDO_MINUTOS', '15'))
+TRABAJOS_MAX_INTENTOS = int(os.getenv('TRABAJOS_MAX_INTENTOS', '3'))
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -158,6 +205,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     # Usar paginación en las vistas de lista
+    # (La de calificaciones es por cursor: ver 'calificaciones/paginacion.py')
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
     
@@ -183,3 +231,25 @@ SIMPLE_JWT = {
     # dentro del token JWT
     'USER_ID_CLAIM': 'user_id',
 }
+
+# ==========================================================
+#  CACHÉ
+# ==========================================================
+# Por defecto, la caché local de cada proceso. Con CACHE_REDIS_URL
+# (ej. 'redis://127.0.0.1:6379/1', requiere el paquete 'redis') la
+# comparten todos los procesos y servidores.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+if os.getenv('CACHE_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.getenv('CACHE_REDIS_URL'),
+    }
+
+# Usuario del token JWT: segundos que queda en caché (ver 'usuarios/principal.py')
+# y qué caché de CACHES se usa
+JWT_PRINCIPAL_TTL = int(os.getenv('JWT_PRINCIPAL_TTL', '60'))
+JWT_PRINCIPAL_CACHE = os.getenv('JWT_PRINCIPAL_CACHE', 'default')
@@ -7,7 +7,7 @@ from calificaciones.views import dashboard_view
 # --- IMPORTACIONES DE JWT (ACTUALIZADAS) ---
 from rest_framework_simplejwt.views import TokenRefreshView
 # Importamos NUESTRA vista de login de API desde la app 'usuarios'
-from usuarios.views import MyTokenObtainPairView
+from usuarios.views import MyTokenObtainPairView, EstadisticasCacheTokenView
 
 
 urlpatterns = [
@@ -24,6 +24,7 @@ urlpatterns = [
     # --- CAMBIO: Apuntamos a nuestra vista personalizada ---
     path('api/token/', MyTokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/cache/', EstadisticasCacheTokenView.as_view(), name='token_cache'),
     path('api/v1/', include('calificaciones.api_urls')),
 
     
@@ -1,6 +1,6 @@
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.settings import api_settings
-from .models import Usuario # ¡Importamos nuestro modelo!
+from .principal import obtener_principal
 
 class CustomJWTAuthentication(JWTAuthentication):
     """
@@ -20,10 +20,6 @@ class CustomJWTAuthentication(JWTAuthentication):
             # (Manejo de error si el token está malformado)
             return None 
 
-        try:
-            # Buscamos en 'Usuario.objects' usando 'id_usuario'
-            user = Usuario.objects.select_related('id_rol', 'id_estado').get(id_usuario=user_id)
-        except Usuario.DoesNotExist:
-            return None
-
-        return user
\ No newline at end of file
+        # Buscamos el 'Usuario' por 'id_usuario': primero en la caché
+        # (ver 'usuarios/principal.py'), y si no está, en la BBDD
+        return obtener_principal(user_id)
@@ -0,0 +1,129 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import DEFERRED
+
+from .models import Usuario, Rol, Estado
+
+
+# ==========================================================
+#  CACHÉ DEL USUARIO DEL TOKEN JWT (el "principal")
+# ==========================================================
+# Cada petición a la API resolvía el usuario del token con una consulta
+# (usuario + rol + estado). Ahora se guardan unos pocos datos del usuario
+# (sin el hash de la contraseña) en la caché de Django por
+# 'JWT_PRINCIPAL_TTL' segundos, con la clave 'jwt_principal:<id_usuario>'.
+#
+# Sirve con la caché local de cada proceso (LocMemCache, la por defecto) y
+# con una compartida (Redis, Memcached): se guarda un dict simple. Cuando
+# un usuario se guarda o se borra (formulario, admin o 'save()' directo) la
+# señal de 'usuarios/signals.py' borra su entrada; el TTL acota lo que
+# quede viejo por otros caminos (ej. un 'update()' por QuerySet).
+PREFIJO_CLAVE = 'jwt_principal'
+
+# Campos de 'Usuario' que se guardan (el resto, como 'contrasena_hash',
+# queda diferido: si alguien lo lee, Django lo consulta en ese momento)
+_CAMPOS = ('id_usuario', 'nombre', 'correo', 'fecha_creacion', 'id_rol_id', 'id_estado_id')
+
+# Aciertos y fallos de la caché en este proceso
+_contadores = {'aciertos': 0, 'fallos': 0}
+_bloqueo = threading.Lock()
+
+
+def _cache():
+    return caches[settings.JWT_PRINCIPAL_CACHE]
+
+
+def clave_principal(id_usuario):
+    return f'{PREFIJO_CLAVE}:{id_usuario}'
+
+
+def _contar(nombre):
+    with _bloqueo:
+        _contadores[nombre] += 1
+
+
+def _a_dict(usuario):
+    datos = {campo: getattr(usuario, campo) for campo in _CAMPOS}
+    datos['rol'] = usuario.id_rol.nombre if usuario.id_rol_id is not None else None
+    datos['estado'] = usuario.id_estado.nombre if usuario.id_estado_id is not None else None
+    return datos
+
+
+def _instancia(modelo, valores):
+    """Instancia de 'modelo' con los campos de 'valores' (los demás, diferidos)."""
+    campos = modelo._meta.concrete_fields
+    return modelo.from_db(
+        'default', [campo.attname for campo in campos],
+        [valores.get(campo.attname, DEFERRED) for campo in campos],
+    )
+
+
+def _desde_dict(datos):
+    """
+    Un 'Usuario' armado sin consultas, con su rol y su estado (solo el
+    nombre) ya cargados: 'is_active', 'is_staff' y 'id_rol.nombre'
+    funcionan igual que con el usuario leído de la BBDD.
+    """
+    usuario = _instancia(Usuario, {campo: datos[campo] for campo in _CAMPOS})
+    if datos['id_rol_id'] is not None:
+        usuario.id_rol = _instancia(Rol, {'id_rol': datos['id_rol_id'], 'nombre': datos['rol']})
+    if datos['id_estado_id'] is not None:
+        usuario.id_estado = _instancia(Estado, {'id_estado': datos['id_estado_id'], 'nombre': datos['estado']})
+    return usuario
+
+
+def obtener_principal(id_usuario):
+    """
+    El 'Usuario' de 'id_usuario', desde la caché si está; si no, desde la
+    BBDD (y queda en la caché). None si el usuario no existe.
+    """
+    cache = _cache()
+    clave = clave_principal(id_usuario)
+    datos = cache.get(clave)
+    if datos is not None:
+        _contar('aciertos')
+        return _desde_dict(datos)
+
+    _contar('fallos')
+    try:
+        usuario = Usuario.objects.select_related('id_rol', 'id_estado').get(id_usuario=id_usuario)
+    except Usuario.DoesNotExist:
+        return None
+    cache.set(clave, _a_dict(usuario), settings.JWT_PRINCIPAL_TTL)
+    return usuario
+
+
+def invalidar_principal(*ids_usuario):
+    """
+    Borra de la caché a estos usuarios. Se borra ya y otra vez al confirmar
+    la transacción: así una petición que los lea entre medio (con los datos
+    de antes del commit) no los deja viejos en la caché.
+    """
+    claves = [clave_principal(id_usuario) for id_usuario in ids_usuario if id_usuario is not None]
+    if not claves:
+        return
+    _cache().delete_many(claves)
+    transaction.on_commit(lambda: _cache().delete_many(claves))
+
+
+def estadisticas_principal():
+    """Aciertos y fallos de la caché en este proceso (y el porcentaje de aciertos)."""
+    with _bloqueo:
+        aciertos, fallos = _contadores['aciertos'], _contadores['fallos']
+    total = aciertos + fallos
+    return {
+        'aciertos': aciertos,
+        'fallos': fallos,
+        'porcentaje_aciertos': round(100 * aciertos / total, 1) if total else None,
+        'ttl': settings.JWT_PRINCIPAL_TTL,
+        'cache': settings.JWT_PRINCIPAL_CACHE,
+        'backend': type(_cache()).__name__,
+    }
+
+
+def reiniciar_estadisticas_principal():
+    with _bloqueo:
+        _contadores['aciertos'] = _contadores['fallos'] = 0
@@ -0,0 +1,28 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import Usuario, Rol, Estado
+from .principal import invalidar_principal
+
+
+@receiver(post_save, sender=Usuario)
+@receiver(post_delete, sender=Usuario)
+def invalidar_principal_usuario(sender, instance, **kwargs):
+    """
+    Todo guardado o borrado de un 'Usuario' (el 'UserForm', el
+    'UsuarioAdmin' o un 'save()' directo) saca su entrada de la caché del
+    token JWT (ver 'usuarios/principal.py'): la próxima petición a la API
+    lo vuelve a leer de la BBDD, con su nuevo rol o estado.
+    """
+    invalidar_principal(instance.pk)
+
+
+@receiver(post_save, sender=Rol)
+@receiver(post_save, sender=Estado)
+def invalidar_principal_catalogo(sender, instance, **kwargs):
+    """
+    La caché guarda el nombre del rol y del estado: si uno cambia (ej. se
+    renombra), se invalidan los usuarios que lo tienen.
+    """
+    campo = 'id_rol' if sender is Rol else 'id_estado'
+    ids = Usuario.objects.filter(**{campo: instance.pk}).values_list('id_usuario', flat=True)
+    invalidar_principal(*ids)
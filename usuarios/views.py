@@ -6,7 +6,11 @@ from .models import Usuario, Rol, Estado
 from .decorators import login_requerido_personalizado, rol_requerido 
 
 from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.exceptions import PermissionDenied
 from .forms import MyTokenObtainPairSerializer
+from .principal import estadisticas_principal
 
 def login_view(request):
     # Si el usuario ya está logueado, lo redirigimos
@@ -150,4 +154,19 @@ class MyTokenObtainPairView(TokenObtainPairView):
     """
     Vista de login para la API que usa nuestro serializer personalizado.
     """
-    serializer_class = MyTokenObtainPairSerializer
\ No newline at end of file
+    serializer_class = MyTokenObtainPairSerializer
+
+
+# ==========================================================
+#  VISTA 7: Estadísticas de la caché del usuario del token (API)
+# ==========================================================
+class EstadisticasCacheTokenView(APIView):
+    """
+    Aciertos y fallos de la caché del usuario del token JWT (ver
+    'usuarios/principal.py') en el proceso que atiende la petición.
+    Solo para Administradores.
+    """
+    def get(self, request):
+        if request.user.id_rol.nombre != 'Administrador':
+            raise PermissionDenied('Solo los Administradores pueden ver las estadísticas.')
+        return Response(estadisticas_principal())